@@ -0,0 +1,108 @@
+''' Measures how many fetches url canonicalization (utils/canonical.py) saves
+on a recorded crawl, and how fast it is with and without its memo cache.
+
+Run from the project root:
+    python benchmarks/bench_canonical.py [--log Logs/Worker.log | --corpus urls.txt]
+
+The recorded crawl is the Worker log of a crawl that used the old
+utils.normalize, whose downloaded urls are read from its "Downloaded ..."
+lines, or a file with one url per line. Every url that canonicalizes to an
+already downloaded page is a fetch saved. Without either, a synthetic crawl
+is used whose links name the same pages with reordered queries, tracking
+and session parameters, uppercase hosts, default ports, index files and dot
+segments. '''
+import os
+import re
+import sys
+import time
+import random
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import normalize
+from utils.canonical import Canonicalizer
+
+
+DOWNLOADED = re.compile(r"Downloaded (\S+), status")
+
+
+def synthetic_crawl(size, seed=0):
+    rand = random.Random(seed)
+    hosts = ["www.ics.uci.edu", "vision.ics.uci.edu", "www.informatics.uci.edu", "www.stat.uci.edu"]
+    pages = list()
+    for page in range(size // 4):
+        host = rand.choice(hosts)
+        path = f"/dept/{rand.choice(['people', 'courses', 'news'])}/{page}"
+        query = [f"id={page}", f"lang={rand.choice(['en', 'es'])}"] if page % 3 == 0 else []
+        pages.append((host, path, query))
+    urls = list()
+    for _ in range(size):
+        host, path, query = rand.choice(pages)
+        query = list(query)
+        rand.shuffle(query)
+        variant = rand.random()
+        if variant < 0.1:
+            host = host.upper()
+        elif variant < 0.2:
+            host += ":443"
+        elif variant < 0.3:
+            path += "/index.html"
+        elif variant < 0.4:
+            path = path.replace("/dept/", "/dept/./x/../")
+        elif variant < 0.5:
+            query.append(f"utm_source={rand.choice(['mail', 'feed'])}")
+        elif variant < 0.6:
+            path += f";jsessionid={rand.getrandbits(32):08X}"
+        elif variant < 0.7:
+            path += "/"
+        urls.append(f"https://{host}{path}" + (f"?{'&'.join(query)}" if query else ""))
+    return urls
+
+
+def load_crawl(log, corpus, size):
+    if log:
+        with open(log) as log_file:
+            return [match.group(1) for match in map(DOWNLOADED.search, log_file) if match]
+    if corpus:
+        with open(corpus) as corpus_file:
+            return [line.strip() for line in corpus_file if line.strip()]
+    return synthetic_crawl(size)
+
+
+def time_per_url(function, urls, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for url in urls:
+            function(url)
+        best = min(best, time.perf_counter() - start)
+    return 1e6 * best / len(urls)
+
+
+def main(log, corpus, size, repeat):
+    urls = load_crawl(log, corpus, size)
+    canonicalizer = Canonicalizer()
+    legacy_pages = {normalize(url) for url in urls}
+    canonical_pages = {canonicalizer.canonicalize(url) for url in urls}
+    print(f"{len(urls)} urls downloaded, {len(legacy_pages)} distinct with "
+          f"utils.normalize, {len(canonical_pages)} distinct canonical urls")
+    saved = len(legacy_pages) - len(canonical_pages)
+    print(f"fetches saved: {saved} ({saved / max(len(legacy_pages), 1):.1%} of the "
+          f"fetches with utils.normalize)")
+
+    print(f"utils.normalize:        {time_per_url(normalize, urls, repeat):6.2f} us/url")
+    print(f"canonicalize, uncached: {time_per_url(canonicalizer.canonicalize, urls, repeat):6.2f} us/url")
+    cached = Canonicalizer()
+    print(f"canonicalize, memoized: {time_per_url(cached, urls, repeat):6.2f} us/url "
+          f"({cached._cached.cache_info().hits / (repeat * len(urls)):.0%} cache hits)")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--log", type=str, default=None)
+    parser.add_argument("--corpus", type=str, default=None)
+    parser.add_argument("--size", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    main(args.log, args.corpus, args.size, args.repeat)
@@ -0,0 +1,291 @@
+''' Runs the whole Crawler offline, against a local stand-in cache server, and
+reports pages/sec, parse ms/page, frontier ops/sec, bytes written to disk and
+peak resident memory.
+
+Run from the project root:
+    python benchmarks/bench_crawl.py [--engine threads] [--pages 2000]
+        [--web pages.pickle] [--output run.json] [--compare baseline.json]
+
+The server runs in its own process and serves a SyntheticWeb (see
+utils/synthetic_web.py), with traps, duplicate mirrors and large pages, or a
+recorded web given with --web. The synthetic web is the same on every run for
+the same --seed, so runs are comparable: --output saves the results as json
+and --compare prints the change of each result against a saved run. The crawl
+runs in a temporary folder with the settings of config.ini, except for the
+options given here, e.g. --set "LOCAL PROPERTIES.STORE=log".
+
+With --recrawl SHARE the web is crawled with [RECRAWL] on, then crawled again
+from the same save file once SHARE of its pages changed (every page is due),
+and the results are those of the re-crawl. '''
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import resource
+import multiprocessing
+from threading import Lock
+from collections import Counter
+from argparse import ArgumentParser
+from configparser import ConfigParser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.config import Config
+from utils.local_cache_server import LocalCacheServer, load_pages
+from utils.synthetic_web import SyntheticWeb
+from crawler import Crawler
+from crawler.frontier import Frontier
+from crawler.worker import Worker
+from crawler.pipeline import ParsePipeline
+from crawler.async_worker import AsyncEngine
+from crawler.recrawl import CHANGED, UNCHANGED
+import scraper
+
+
+# Whether a larger value of each result is better, for --compare
+HIGHER_IS_BETTER = {
+    "pages_per_sec": True, "parse_ms_per_page": False, "frontier_ops_per_sec": True,
+    "disk_bytes_written": False, "peak_rss_mib": False}
+
+
+class TimedFrontier(Frontier):
+    ''' Frontier counting its operations and the time spent in them and its
+    kinds of visits, and ending the crawl after max_pages downloads. '''
+
+    max_pages = 0
+
+    def __init__(self, config, restart):
+        self.stats_lock = Lock()
+        self.operations = 0
+        self.operation_time = 0.0
+        self.pages = 0
+        self.visits = Counter()
+        super().__init__(config, restart)
+
+    def try_get_tbd_url(self):
+        if self.max_pages and self.pages >= self.max_pages:
+            with self.lock:
+                self.ready.notify_all()
+            return None, None
+        return self._timed(super().try_get_tbd_url)
+
+    def add_url(self, url, parent=None, depth=None):
+        return self._timed(super().add_url, url, parent, depth)
+
+    def visited(self, url, resp):
+        visit = super().visited(url, resp)
+        with self.stats_lock:
+            self.visits[visit] += 1
+        return visit
+
+    def mark_url_complete(self, url):
+        self._timed(super().mark_url_complete, url)
+        with self.stats_lock:
+            self.pages += 1
+
+    def _timed(self, operation, *args):
+        start = time.perf_counter()
+        result = operation(*args)
+        elapsed = time.perf_counter() - start
+        with self.stats_lock:
+            self.operations += 1
+            self.operation_time += elapsed
+        return result
+
+
+def start_server(pages):
+    ''' Starts serving pages in a process, returns (server, cache_server). '''
+    context = multiprocessing.get_context("spawn")
+    address_queue, stop_event = context.Queue(), context.Event()
+    process = context.Process(target=serve, args=(pages, address_queue, stop_event))
+    process.start()
+    return (process, address_queue, stop_event), address_queue.get()
+
+
+def stop_server(server):
+    ''' Stops a server from start_server, returns how many requests it had. '''
+    process, address_queue, stop_event = server
+    stop_event.set()
+    requests = address_queue.get()
+    process.join()
+    return requests
+
+
+def serve(pages, address_queue, stop_event):
+    ''' Serves pages from a LocalCacheServer until stop_event is set. '''
+    server = LocalCacheServer(pages)
+    address_queue.put(server.start())
+    stop_event.wait()
+    address_queue.put(len(server.requests))
+    server.stop()
+
+
+def written_bytes():
+    # Bytes this process had written to storage, where the kernel reports it
+    try:
+        with open("/proc/self/io") as io_stats:
+            for line in io_stats:
+                if line.startswith("write_bytes:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def folder_size(folder):
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(folder) for name in names)
+
+
+def make_config(config_file, args, seed_urls, options=()):
+    cparser = ConfigParser()
+    cparser.read(config_file)
+    cparser["LOCAL PROPERTIES"]["THREADCOUNT"] = str(args.threads)
+    cparser["LOCAL PROPERTIES"]["ENGINE"] = args.engine
+    cparser["CRAWLER"]["POLITENESS"] = str(args.delay)
+    cparser["CRAWLER"]["SEEDURL"] = ",".join(seed_urls)
+    for option in list(options) + args.set:
+        name, _, value = option.partition("=")
+        section, _, key = name.rpartition(".")
+        if not cparser.has_section(section):
+            cparser.add_section(section)
+        cparser[section][key] = value
+    return Config(cparser)
+
+
+def parse_time(config, pages, sample):
+    ''' Milliseconds per page to scrape the first sample OK pages crawled. '''
+    contents = list()
+    for url in sorted(scraper.get_analytics().page_lengths)[:sample]:
+        page = pages.get(url)
+        if page is not None and page[0] == 200:
+            contents.append((url, page[1]))
+    scraper.configure(config)
+    start = time.perf_counter()
+    for url, content in contents:
+        scraper.scrape_content(url, content)
+    return 1000 * (time.perf_counter() - start) / max(len(contents), 1)
+
+
+def crawl(config, restart):
+    ''' Crawls with config, returns the frontier and the seconds taken. '''
+    scraper.configure(config)
+    if config.engine == "pipeline":
+        worker_factory = ParsePipeline(config)
+    elif config.engine == "async":
+        worker_factory = AsyncEngine(config)
+    else:
+        worker_factory = Worker
+    start = time.perf_counter()
+    crawler = Crawler(
+        config, restart, frontier_factory=TimedFrontier, worker_factory=worker_factory)
+    crawler.start()
+    return crawler.frontier, time.perf_counter() - start
+
+
+def run(args):
+    config_file = os.path.abspath(args.config_file)
+    if args.web:
+        pages = load_pages(args.web)
+        seed_urls = args.seeds or list(pages)[:1]
+    else:
+        pages = SyntheticWeb(args.hosts, args.host_pages, args.seed)
+        seed_urls = args.seeds or pages.seed_urls
+    options = list()
+    if args.recrawl is not None:
+        options = ["RECRAWL.ENABLED=true", "RECRAWL.INITIALINTERVAL=0", "RECRAWL.MININTERVAL=0"]
+    TimedFrontier.max_pages = args.pages
+
+    server, cache_server = start_server(pages)
+    workdir = tempfile.mkdtemp(prefix="bench_crawl_")
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        config = make_config(config_file, args, seed_urls, options)
+        config.cache_server = cache_server
+        if args.recrawl is not None:
+            # The first crawl saves every page's validators; the re-crawl
+            # runs against the next edition of the web.
+            _, first_elapsed = crawl(config, True)
+            stop_server(server)
+            if not args.web:
+                pages = SyntheticWeb(
+                    args.hosts, args.host_pages, args.seed, edition=1,
+                    changed_share=args.recrawl)
+            server, config.cache_server = start_server(pages)
+        written_before = written_bytes()
+        frontier, elapsed = crawl(config, args.recrawl is None)
+        written_after = written_bytes()
+        results = {
+            "engine": config.engine,
+            "pages": frontier.pages,
+            "seconds": round(elapsed, 3),
+            "pages_per_sec": frontier.pages / elapsed,
+            "parse_ms_per_page": parse_time(config, pages, args.parse_sample),
+            "frontier_ops_per_sec": frontier.operations / max(frontier.operation_time, 1e-9),
+            "disk_bytes_written": (
+                written_after - written_before if written_before is not None
+                else folder_size(workdir)),
+            "peak_rss_mib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        }
+        if args.recrawl is not None:
+            results["full_crawl_seconds"] = round(first_elapsed, 3)
+            results["pages_changed"] = frontier.visits[CHANGED]
+            results["pages_unchanged"] = frontier.visits[UNCHANGED]
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+        results_requests = stop_server(server)
+    results["server_requests"] = results_requests
+    return results
+
+
+def compare(results, baseline):
+    print(f"\nAgainst {baseline.get('engine')} baseline:")
+    for name, higher_is_better in HIGHER_IS_BETTER.items():
+        old, new = baseline.get(name), results[name]
+        if not old:
+            continue
+        change = (new - old) / old
+        better = change > 0 if higher_is_better else change < 0
+        print(f"{name:>22}: {old:14.2f} -> {new:14.2f} "
+              f"({change:+.1%}, {'better' if better else 'worse'})")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--config_file", type=str, default="config.ini")
+    parser.add_argument("--engine", type=str, default="threads",
+                        choices=["threads", "pipeline", "async"])
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--pages", type=int, default=2000,
+                        help="Stop after this many downloads (0 for the whole web).")
+    parser.add_argument("--delay", type=float, default=0.01,
+                        help="Politeness delay per host, in seconds.")
+    parser.add_argument("--hosts", type=int, default=20)
+    parser.add_argument("--host_pages", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--web", type=str, default=None,
+                        help="A recorded web to serve: a pickled dict of pages.")
+    parser.add_argument("--seeds", type=str, nargs="*", default=None)
+    parser.add_argument("--set", type=str, nargs="*", default=[],
+                        help="Other options, as SECTION.KEY=VALUE.")
+    parser.add_argument("--recrawl", type=float, default=None,
+                        help="Re-crawl once this share of the pages changed.")
+    parser.add_argument("--parse_sample", type=int, default=200)
+    parser.add_argument("--output", type=str, default=None)
+    parser.add_argument("--compare", type=str, default=None)
+    args = parser.parse_args()
+
+    results = run(args)
+    for name, value in results.items():
+        print(f"{name:>22}: {value:.2f}" if isinstance(value, float) else f"{name:>22}: {value}")
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2)
+    if args.compare:
+        with open(args.compare) as baseline:
+            compare(results, json.load(baseline))
@@ -0,0 +1,96 @@
+''' Compares the "stream" and "soup" link extractors of
+utils/link_extractor.py.
+
+Run from the project root:
+    python benchmarks/bench_extract.py [--corpus pages/] [--repeat 3]
+
+The corpus is a folder of saved html pages. Without one, synthetic pages are
+generated. Each extractor runs in its own process so that its peak resident
+memory can be reported. '''
+import os
+import sys
+import time
+import random
+import resource
+import subprocess
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.link_extractor import get_extractor
+
+
+def synthetic_corpus(size, seed=0):
+    rand = random.Random(seed)
+    words = ["research", "faculty", "student", "computer", "science", "informatics",
+             "statistics", "course", "the", "and", "of", "seminar", "data", "systems"]
+    pages = []
+    for page_id in range(size):
+        parts = ["<html><head><title>Page</title>"
+                 "<style>body { margin: 0 }</style><script>var x = 1;</script></head><body>"]
+        for paragraph in range(rand.randint(5, 80)):
+            text = " ".join(rand.choice(words) for _ in range(rand.randint(10, 80)))
+            parts.append(f"<div class='c{paragraph}'><p>{text}</p>")
+            for link in range(rand.randint(0, 6)):
+                href = rand.choice([f"/page/{rand.randint(0, 10000)}",
+                                    f"https://www.ics.uci.edu/~u{link}/",
+                                    f"sub/{page_id}.html#top", "mailto:a@uci.edu"])
+                parts.append(f'<a href="{href}">{rand.choice(words)}</a> ')
+            parts.append("</div>")
+        parts.append("</body></html>")
+        pages.append("".join(parts).encode("utf-8"))
+    return pages
+
+
+def load_corpus(corpus_dir, size):
+    if not corpus_dir:
+        return synthetic_corpus(size)
+    pages = []
+    for name in sorted(os.listdir(corpus_dir)):
+        with open(os.path.join(corpus_dir, name), "rb") as page:
+            pages.append(page.read())
+    return pages
+
+
+def run_child(mode, corpus_dir, size, repeat):
+    ''' Times one extractor over the corpus and prints its results. '''
+    pages = load_corpus(corpus_dir, size)
+    extract = get_extractor(mode)
+    corpus_bytes = sum(len(page) for page in pages)
+    before_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    best = float("inf")
+    link_count = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        link_count = 0
+        for page in pages:
+            links, text, canonical = extract("https://www.ics.uci.edu/dir/page", page)
+            link_count += len(links)
+        best = min(best, time.perf_counter() - start)
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"{mode:>6}: {len(pages) / best:8.1f} pages/sec, "
+          f"{corpus_bytes / best / 2 ** 20:6.1f} MiB/sec, {link_count} links, "
+          f"peak rss +{(peak_rss - before_rss) / 1024:.1f} MiB "
+          f"({peak_rss / 1024:.1f} MiB total)")
+
+
+def main(corpus_dir, size, repeat):
+    for mode in ("soup", "stream"):
+        command = [sys.executable, os.path.abspath(__file__), "--child", mode,
+                   "--size", str(size), "--repeat", str(repeat)]
+        if corpus_dir:
+            command += ["--corpus", corpus_dir]
+        subprocess.run(command, check=True)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--corpus", type=str, default=None)
+    parser.add_argument("--size", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--child", type=str, default=None)
+    args = parser.parse_args()
+    if args.child:
+        run_child(args.child, args.corpus, args.size, args.repeat)
+    else:
+        main(args.corpus, args.size, args.repeat)
@@ -0,0 +1,104 @@
+''' Measures decode time and allocations per cache server response for
+utils.response.Response against the original eager Response.
+
+Run from the project root:
+    python benchmarks/bench_response.py [--count 2000] [--error-share 0.3]
+
+Responses are built like the cache server's replies (cbor with a pickled
+requests.Response, and the headers as a plain dict). Three workloads are
+timed: reading only the status, as the crawler does for error pages, reading
+only the headers, as a recrawl does when the ETag or Last-Modified is
+unchanged, and reading the body and decoding it to text for link extraction
+and text storage. '''
+import os
+import sys
+import time
+import pickle
+import random
+import tracemalloc
+from argparse import ArgumentParser
+
+import cbor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.response import Response
+from utils.local_cache_server import make_raw_response
+
+
+class EagerResponse(object):
+    ''' utils.response.Response as it was: unpickles every reply. '''
+    def __init__(self, resp_dict):
+        self.url = resp_dict["url"]
+        self.status = resp_dict["status"]
+        self.error = resp_dict["error"] if "error" in resp_dict else None
+        try:
+            self.raw_response = (
+                pickle.loads(resp_dict["response"])
+                if "response" in resp_dict else
+                None)
+        except TypeError:
+            self.raw_response = None
+
+
+def eager_text(resp):
+    # Both the old extraction and text storage worked from the raw content.
+    if resp.error is None and resp.status == 200:
+        return resp.raw_response.content.decode("utf-8", errors="replace")
+    return ""
+
+
+def lean_text(resp):
+    return resp.text if resp.error is None and resp.status == 200 else ""
+
+
+def make_replies(count, error_share, seed=0):
+    rand = random.Random(seed)
+    replies = []
+    for i in range(count):
+        url = f"https://www.ics.uci.edu/page/{i}"
+        status = rand.choice([404, 500, 403]) if rand.random() < error_share else 200
+        body = ("<html><body>" + "word " * rand.randint(500, 20000) + "</body></html>").encode()
+        raw = make_raw_response(url, status, body, {"Content-Type": "text/html; charset=utf-8"})
+        replies.append(cbor.dumps({
+            "url": url, "status": status,
+            "headers": dict(raw.headers), "response": pickle.dumps(raw)}))
+    return replies
+
+
+def measure(replies, response_class, workload):
+    dicts = [cbor.loads(reply) for reply in replies]
+    start = time.perf_counter()
+    for resp_dict in dicts:
+        workload(response_class(resp_dict))
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    for resp_dict in dicts:
+        workload(response_class(resp_dict))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed / len(dicts), peak
+
+
+def main(count, error_share):
+    replies = make_replies(count, error_share)
+    runs = [
+        ("status only", "eager", EagerResponse, lambda resp: resp.status),
+        ("status only", "lean", Response, lambda resp: resp.status),
+        ("headers only", "eager", EagerResponse, lambda resp: resp.raw_response.headers),
+        ("headers only", "lean", Response, lambda resp: resp.headers),
+        ("body to text", "eager", EagerResponse, eager_text),
+        ("body to text", "lean", Response, lean_text)]
+    for name, label, response_class, workload in runs:
+        per_response, peak = measure(replies, response_class, workload)
+        print(f"{name:>12} {label:>5}: {per_response * 1e6:8.1f} us/response, "
+              f"peak traced memory {peak / 2 ** 20:7.2f} MiB")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--count", type=int, default=2000)
+    parser.add_argument("--error-share", type=float, default=0.3)
+    args = parser.parse_args()
+    main(args.count, args.error_share)
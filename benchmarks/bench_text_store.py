@@ -0,0 +1,92 @@
+''' Compares the page text store with the original Webpage_Text.shelve.
+
+Run from the project root:
+    python benchmarks/bench_text_store.py [--count 2000] [--dir /tmp]
+
+Stores count synthetic pages of text the way the scraper did (open the
+shelve, write, sync and close for every page) and through
+utils.text_store.TextStore, then reports the write latency per page, the
+size on disk and how long reading every text back takes. '''
+import os
+import sys
+import glob
+import time
+import random
+import shelve
+import tempfile
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.text_store import TextStore, TextReader
+
+
+def make_texts(count, seed=0):
+    rand = random.Random(seed)
+    vocabulary = [
+        "".join(rand.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rand.randint(2, 10)))
+        for _ in range(5000)]
+    return [
+        (f"https://www.ics.uci.edu/page/{i}",
+         " ".join(rand.choice(vocabulary) for _ in range(rand.randint(200, 5000))))
+        for i in range(count)]
+
+
+def disk_size(path):
+    return sum(os.path.getsize(name) for name in glob.glob(f"{path}*"))
+
+
+def bench_shelve(texts, path):
+    start = time.perf_counter()
+    for url, text in texts:
+        with shelve.open(path) as text_storage:
+            text_storage[url] = text
+            text_storage.sync()
+    write = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with shelve.open(path) as text_storage:
+        for key in text_storage.keys():
+            text_storage[key]
+    read = time.perf_counter() - start
+    return write, read
+
+
+def bench_store(texts, path):
+    start = time.perf_counter()
+    text_store = TextStore(path)
+    for url, text in texts:
+        text_store[url] = text
+    text_store.close()
+    write = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with TextReader(path) as text_storage:
+        for _ in text_storage.values():
+            pass
+    read = time.perf_counter() - start
+    return write, read
+
+
+def main(count, directory):
+    texts = make_texts(count)
+    raw_size = sum(len(text.encode()) for _, text in texts)
+    print(f"{count} pages, {raw_size / 2 ** 20:.1f} MiB of text")
+    with tempfile.TemporaryDirectory(dir=directory) as workdir:
+        for label, bench, name in [
+                ("shelve", bench_shelve, "Webpage_Text.shelve"),
+                ("text store", bench_store, "Webpage_Text.store")]:
+            path = os.path.join(workdir, name)
+            write, read = bench(texts, path)
+            print(f"{label:>10}: {write / count * 1e3:7.3f} ms/page written, "
+                  f"{disk_size(path) / 2 ** 20:8.2f} MiB on disk, "
+                  f"{read:6.2f} s to read back")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--count", type=int, default=2000)
+    parser.add_argument("--dir", type=str, default=None,
+                        help="Where to write the stores (the system temp folder by default).")
+    args = parser.parse_args()
+    main(args.count, args.dir)
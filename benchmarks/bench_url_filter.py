@@ -0,0 +1,133 @@
+''' Compares utils.url_filter.UrlFilter against the original regex chain
+of scraper.is_valid, checking that both accept exactly the same urls.
+
+Run from the project root:
+    python benchmarks/bench_url_filter.py [--corpus urls.txt] [--repeat 5]
+
+The corpus is one url per line (for example the urls from a Worker log).
+Without one, a synthetic corpus covering the filter's edge cases is used. '''
+import os
+import re
+import sys
+import time
+import random
+from argparse import ArgumentParser
+from urllib.parse import urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.url_filter import UrlFilter, DEFAULT_TRAPS
+
+
+def legacy_is_valid(url):
+    ''' scraper.is_valid as it was before the url filter engine. '''
+    parsed = urlparse(url)
+
+    if parsed.scheme not in ["http", "https"]:
+        return False
+
+    elif not ((re.match(r"^(.+\.)(ics\.uci\.edu)$", parsed.netloc)) or
+              (re.match(r"^(.+\.)(cs\.uci\.edu)$", parsed.netloc)) or
+              (re.match(r"^(.+\.)(informatics\.uci\.edu)$", parsed.netloc)) or
+              (re.match(r"^(.+\.)(stat\.uci\.edu)$", parsed.netloc)) or
+              ((parsed.netloc == "today.uci.edu") and
+               (re.match(r"^(/department/information_computer_sciences/)(.+)$", parsed.path)))):
+        return False
+
+    potential_traps = ["/event/", "/events/", "calendar", "date", "gallery", "image",
+                       "wp-content", "index.php", "upload", "/pdf", "attachment/",
+                       "?replytocom=", "?version=", "?share=", "?redirect=", "?redirect_to=", "?action="]
+    for trap in potential_traps:
+        if trap in url:
+            return False
+
+    return not re.match(
+        r".*\.(css|js|java|r|py|c|m|bmp|gif|jpe?g|ico"
+        + r"|png|tiff?|mid|mp2|mp3|mp4"
+        + r"|wav|avi|mov|mpeg|ram|m4v|mkv|odc|ogg|ogv|pdf"
+        + r"|ps|eps|tex|ppt|pptx|ppsx|ss|scm|txt|doc|docx|xls|xlsx|names"
+        + r"|data|dat|exe|bz2|tar|msi|bin|7z|psd|z|dmg|iso"
+        + r"|epub|dll|cnf|tgz|sha1"
+        + r"|thmx|mso|arff|rtf|jar|csv"
+        + r"|rm|smil|wmv|swf|wma|zip|rar|gz)$", parsed.path.lower())
+
+
+def synthetic_corpus(size, seed=0):
+    rand = random.Random(seed)
+    schemes = ["http"] * 5 + ["https"] * 4 + ["HTTP", "ftp", "mailto", ""]
+    hosts = ["www.ics.uci.edu", "ics.uci.edu", "vision.ics.uci.edu", "a.b.cs.uci.edu",
+             "cs.uci.edu", "www.informatics.uci.edu", "www.stat.uci.edu", ".ics.uci.edu",
+             "..stat.uci.edu", "physics.uci.edu", "www.ics.uci.edu:8080", "today.uci.edu",
+             "evil.com", "ics.uci.edu.evil.com", "WWW.ICS.UCI.EDU", "xcs.uci.edu"]
+    segments = ["", "about", "people", "department", "information_computer_sciences",
+                "research", "~user", "Index.HTML", "a.b", "tar.gz", "PDF", "page.JPEG"]
+    extensions = ["", ".html", ".php", ".pdf", ".PDF", ".tar.gz", ".jpeg", ".jpg",
+                  ".r", ".R", ".zip", ".names", ".txt/", ".css", ".cs", ".Z"]
+    queries = ["", "?a=1", "?replytocom=5", "?share=twitter", "?id=3&date=2020", "?q=calendar"]
+    corpus = []
+    for _ in range(size):
+        host = rand.choice(hosts)
+        if host == "today.uci.edu" and rand.random() < 0.7:
+            path = "/department/information_computer_sciences/" + rand.choice(segments)
+        else:
+            path = "/" + "/".join(rand.choice(segments) for _ in range(rand.randint(0, 4)))
+        if rand.random() < 0.1:
+            path += "/" + rand.choice(DEFAULT_TRAPS).strip("/?")
+        url = f"{rand.choice(schemes)}://{host}{path}{rand.choice(extensions)}{rand.choice(queries)}"
+        if rand.random() < 0.05:
+            url += "#frag"
+        corpus.append(url)
+    return corpus
+
+
+def time_per_url(function, corpus, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for url in corpus:
+            function(url)
+        best = min(best, time.perf_counter() - start)
+    return best / len(corpus)
+
+
+def time_batch(function, corpus, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(corpus)
+        best = min(best, time.perf_counter() - start)
+    return best / len(corpus)
+
+
+def main(corpus_file, size, repeat):
+    if corpus_file:
+        with open(corpus_file, "r") as urls:
+            corpus = [url.strip() for url in urls if url.strip()]
+    else:
+        corpus = synthetic_corpus(size)
+
+    url_filter = UrlFilter()
+
+    # Equivalence check against the original implementation
+    mismatches = [url for url in corpus if legacy_is_valid(url) != url_filter.is_valid(url)]
+    accepted = sum(1 for url in corpus if url_filter.is_valid(url))
+    print(f"{len(corpus)} urls, {accepted} accepted, {len(mismatches)} mismatches.")
+    for url in mismatches[:20]:
+        print(f"  MISMATCH {url}: legacy {legacy_is_valid(url)}, filter {url_filter.is_valid(url)}")
+
+    legacy_time = time_per_url(legacy_is_valid, corpus, repeat)
+    filter_time = time_per_url(url_filter.is_valid, corpus, repeat)
+    batch_time = time_batch(url_filter.filter, corpus, repeat)
+    print(f"legacy is_valid:   {legacy_time * 1e6:.2f} us/url")
+    print(f"UrlFilter.is_valid: {filter_time * 1e6:.2f} us/url ({legacy_time / filter_time:.1f}x)")
+    print(f"UrlFilter.filter:   {batch_time * 1e6:.2f} us/url ({legacy_time / batch_time:.1f}x)")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--corpus", type=str, default=None)
+    parser.add_argument("--size", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    sys.exit(main(args.corpus, args.size, args.repeat))
@@ -1,16 +1,28 @@
 from utils import get_logger
+from utils.metrics import MetricsMonitor
 from crawler.frontier import Frontier
 from crawler.worker import Worker
+import scraper
 
 class Crawler(object):
     def __init__(self, config, restart, frontier_factory=Frontier, worker_factory=Worker):
         self.config = config
         self.logger = get_logger("CRAWLER")
         self.frontier = frontier_factory(config, restart)
+        scraper.set_duplicate_listener(getattr(self.frontier, "report_duplicate", None))
+        scraper.set_canonical_listener(
+            getattr(self.frontier, "canonical_page", None) if config.canonical_rel else None)
+        scraper.set_fingerprint_listener(
+            getattr(self.frontier, "page_fingerprint", None) if config.recrawl else None)
         self.workers = list()
         self.worker_factory = worker_factory
+        self.monitor = MetricsMonitor(config)
 
     def start_async(self):
+        self.monitor.start()
+        if self.monitor.server is not None:
+            host, port = self.monitor.address
+            self.logger.info(f"Serving crawl metrics at http://{host}:{port}/metrics.")
         self.workers = [
             self.worker_factory(worker_id, self.config, self.frontier)
             for worker_id in range(self.config.threads_count)]
@@ -24,3 +36,9 @@ class Crawler(object):
     def join(self):
         for worker in self.workers:
             worker.join()
+        self.frontier.close()
+        self.monitor.stop()
+        scraper.close_text_store()
+        scraper.save_analytics()
+        if scraper.duplicates is not None:
+            self.logger.info(f"Duplicate pages: {scraper.duplicates.report()}.")
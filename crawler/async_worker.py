@@ -0,0 +1,152 @@
+import asyncio
+
+from multiprocessing import get_context
+from concurrent.futures import ProcessPoolExecutor
+from threading import Thread, Lock
+
+from utils.download import AsyncDownloader
+from utils import get_logger, metrics
+from crawler.recrawl import NEW, UNCHANGED
+import scraper
+
+
+class AsyncEngine(object):
+    ''' worker_factory for ENGINE = async in config.ini.
+
+    Runs a single event loop in its own thread, with one pool of
+    PARSEPROCESSES parser processes and one downloader shared by every
+    AsyncWorker, however many THREADCOUNT asks for. The ASYNCTASKS
+    concurrent downloads are split between the workers. '''
+
+    def __init__(self, config):
+        self.config = config
+        self.logger = get_logger("ASYNC", "Worker")
+        # Spawned, not forked, since the crawler is already multithreaded.
+        self.parsers = ProcessPoolExecutor(
+            max_workers=config.parse_processes or None,
+            mp_context=get_context("spawn"),
+            initializer=scraper.configure, initargs=(config,))
+        self.loop = asyncio.new_event_loop()
+        Thread(target=self.loop.run_forever, daemon=True).start()
+        self.downloader = AsyncDownloader(config, self.logger)
+        self.run(self.downloader.__aenter__())
+        self.lock = Lock()
+        self.workers = 0
+
+    def __call__(self, worker_id, config, frontier):
+        with self.lock:
+            self.workers += 1
+        return AsyncWorker(worker_id, config, frontier, self)
+
+    def run(self, coroutine):
+        ''' Runs coroutine on the shared loop and waits for its result. '''
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    def worker_done(self):
+        with self.lock:
+            self.workers -= 1
+            last = not self.workers
+        if last:
+            self.run(self.downloader.__aexit__(None, None, None))
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.parsers.shutdown()
+
+
+class AsyncWorker(Thread):
+    ''' One worker of an AsyncEngine: runs its share of the ASYNCTASKS fetch
+    coroutines on the engine's loop and waits for them to finish.
+
+    A dispatcher takes urls from the frontier without blocking and, when no
+    host is ready, sleeps until the next one is past its politeness delay
+    instead of parking a thread per host. Pages are parsed by
+    scraper.scrape_content in the engine's parser processes. Every call
+    into the frontier and the text storage, which take locks held across
+    disk writes, runs in the loop's thread pool, so a save file sync never
+    stalls the loop. Needs a frontier with try_get_tbd_url. '''
+    poll_interval = 0.5
+
+    def __init__(self, worker_id, config, frontier, engine):
+        self.logger = get_logger(f"Worker-{worker_id}", "Worker")
+        self.config = config
+        self.frontier = frontier
+        self.engine = engine
+        self.parsers = engine.parsers
+        self.downloader = engine.downloader
+        super().__init__(daemon=True)
+
+    def run(self):
+        try:
+            self.engine.run(self._crawl())
+        finally:
+            self.engine.worker_done()
+
+    async def _crawl(self):
+        task_count = max(self.config.async_tasks // self.config.threads_count, 1)
+        self.urls = asyncio.Queue(maxsize=task_count)
+        self.url_done = asyncio.Event()
+        tasks = [asyncio.create_task(self._fetch()) for _ in range(task_count)]
+        await self._dispatch(task_count)
+        await asyncio.gather(*tasks)
+        self.logger.info("Frontier is empty. Stopping Crawler.")
+
+    async def _dispatch(self, task_count):
+        loop = asyncio.get_running_loop()
+        while True:
+            tbd_url, wait = await loop.run_in_executor(None, self.frontier.try_get_tbd_url)
+            if tbd_url is not None:
+                await self.urls.put(tbd_url)
+                continue
+            if wait is None:
+                break
+            # Sleep until the next host is ready, waking early when one of
+            # our urls completes and may have queued new ones.
+            self.url_done.clear()
+            try:
+                await asyncio.wait_for(
+                    self.url_done.wait(), min(wait, self.poll_interval))
+            except asyncio.TimeoutError:
+                pass
+        for _ in range(task_count):
+            await self.urls.put(None)
+
+    async def _fetch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            tbd_url = await self.urls.get()
+            if tbd_url is None:
+                break
+            result = [], None, None, None, None
+            try:
+                resp = await self.downloader.download(tbd_url)
+                self.logger.info(
+                    f"Downloaded {tbd_url}, status <{resp.status}>, "
+                    f"using cache {self.config.cache_server}.")
+                visit = await loop.run_in_executor(None, self._visited, tbd_url, resp)
+                if visit != UNCHANGED and (resp.error is None) and (resp.status == 200):
+                    result, parse_metrics = await loop.run_in_executor(
+                        self.parsers, metrics.collect, scraper.scrape_content,
+                        tbd_url, resp.text)
+                    metrics.merge(parse_metrics)
+            except Exception:
+                metrics.increment("errors.crawl")
+                self.logger.exception(f"Failed to crawl {tbd_url}.")
+            await loop.run_in_executor(None, self._complete, tbd_url, *result)
+            self.url_done.set()
+
+    def _visited(self, url, resp):
+        visit = self.frontier.visited(url, resp)
+        if visit == NEW:
+            scraper.record_download(url)
+        return visit
+
+    def _complete(self, url, scraped_urls, webpage_text, page_analytics,
+                  page_fingerprint, canonical):
+        try:
+            if scraper.is_new_content(url, page_fingerprint, canonical):
+                scraper.store_page_text(url, webpage_text, page_analytics)
+                for scraped_url in scraped_urls:
+                    self.frontier.add_url(scraped_url, url)
+        except Exception:
+            metrics.increment("errors.store")
+            self.logger.exception(f"Failed to store {url}.")
+        self.frontier.mark_url_complete(url)
@@ -1,72 +1,543 @@
-import os
-import shelve
+import math
+import time
 
-from threading import Thread, RLock
+from heapq import heappush, heappop
+from threading import Thread, RLock, Condition
 from queue import Queue, Empty
+from urllib.parse import urlparse
 
-from utils import get_logger, get_urlhash, normalize
+from utils import get_logger, get_urlhash, metrics
+from utils.canonical import Canonicalizer
 from scraper import is_valid
+from crawler.store import open_store, store_exists, remove_store
+from crawler.seen import open_seen_index, url_digest
+from crawler.traps import TrapDetector, CUT, THROTTLE
+from crawler.priority import Priority, Candidate, DEMOTED
+from crawler.robots import RobotsPolicy
+from crawler.recrawl import RecrawlPolicy, NEW
+
+class QueuedUrl(object):
+    ''' A url that is queued or in flight, and what its priority is based
+    on. Only the host heap entry whose score matches score is live. '''
+    __slots__ = ("depth", "inlinks", "score", "queued", "demoted")
+
+    def __init__(self, depth, demoted=False):
+        self.depth = depth
+        self.inlinks = 0
+        self.score = 0.0
+        self.queued = True
+        self.demoted = demoted
 
 class Frontier(object):
     def __init__(self, config, restart):
         self.logger = get_logger("FRONTIER")
         self.config = config
-        self.to_be_downloaded = list()
-        
-        if not os.path.exists(self.config.save_file) and not restart:
+        # Rewrites every url to its canonical form (see utils/canonical.py)
+        # before it is looked up, so each page is queued only once.
+        self.canonical = Canonicalizer.from_config(self.config)
+
+        # Urls waiting to be downloaded, in a heap per host ordered by their
+        # priority (see crawler/priority.py). A host is on host_heap, keyed by
+        # the time it may next be contacted, while it has urls queued and
+        # none in flight, so every host gets its own politeness delay and
+        # workers only wait for the earliest host to come free. Hosts past
+        # their delay wait on ready_hosts, keyed by priority.
+        self.host_queues = dict()
+        self.host_heap = list()
+        self.ready_hosts = list()
+        self.scheduled_hosts = set()
+        self.next_allowed = dict()
+        self.busy_hosts = set()
+        self.in_flight = dict()
+        self.pending = dict()
+        self.host_pages = dict()
+        self.priority = Priority.from_config(self.config)
+        self.pushes = 0
+
+        # All frontier and save file state is guarded by this lock; workers
+        # block on the condition until a host is ready or the crawl is done.
+        self.lock = RLock()
+        self.ready = Condition(self.lock)
+
+        # In memory index of every url in the save file, so that repeated
+        # links are rejected without a lookup on disk.
+        self.seen = open_seen_index(self.config)
+        self.dedup_hits = 0
+        self.store_lookups = 0
+
+        # Set while the save file is streamed in the background on a lazy
+        # resume. Until then the seen index is incomplete, and the pending
+        # urls it loads are validated only when they are dequeued.
+        self.resuming = False
+        self.unvalidated = set()
+        self.added_while_resuming = set()
+
+        # Statistics per host and url pattern that cut off urls that look
+        # like traps, and throttle patterns that yield little, which are
+        # demoted behind the rest of their host's urls.
+        self.traps = TrapDetector.from_config(self.config, self.logger)
+
+        # Each host's robots.txt rules (see crawler/robots.py). Hosts whose
+        # rules are still being downloaded wait in robots_waiting instead of
+        # on host_heap.
+        self.robots = RobotsPolicy(self.config, self) if self.config.robots else None
+        self.robots_waiting = set()
+
+        # Validators and revisit schedule of every completed url, for
+        # re-crawling a save file (see crawler/recrawl.py).
+        self.recrawl = RecrawlPolicy(self.config) if self.config.recrawl else None
+
+        # Queue depths for utils.metrics, read without the lock when a
+        # snapshot is taken.
+        metrics.register_gauge("frontier.queued", lambda: len(self.pending) - len(self.in_flight))
+        metrics.register_gauge("frontier.in_flight", lambda: len(self.in_flight))
+        metrics.register_gauge("frontier.hosts_queued", lambda: len(self.host_queues))
+        metrics.register_gauge("frontier.hosts_waiting", lambda: len(self.host_heap))
+
+        if not store_exists(self.config) and not restart:
             # Save file does not exist, but request to load save.
             self.logger.info(
                 f"Did not find save file {self.config.save_file}, "
                 f"starting from seed.")
-        elif os.path.exists(self.config.save_file) and restart:
+        elif store_exists(self.config) and restart:
             # Save file does exists, but request to start from seed.
             self.logger.info(
                 f"Found save file {self.config.save_file}, deleting it.")
-            os.remove(self.config.save_file)
+            remove_store(self.config)
         # Load existing save file, or create one if it does not exist.
-        self.save = shelve.open(self.config.save_file)
+        self.save = open_store(self.config)
         if restart:
             for url in self.config.seed_urls:
                 self.add_url(url)
+        elif not self.save:
+            for url in self.config.seed_urls:
+                self.add_url(url)
+        elif self.config.resume_mode == "lazy":
+            # Start crawling right away and load the save file as we go.
+            self.resuming = True
+            Thread(target=self._stream_save_file, daemon=True).start()
         else:
             # Set the frontier state with contents of save file.
-            self._parse_save_file()
-            if not self.save:
-                for url in self.config.seed_urls:
-                    self.add_url(url)
+            with self.lock:
+                self._parse_save_file()
 
     def _parse_save_file(self):
-        ''' This function can be overridden for alternate saving techniques. '''
+        ''' This function can be overridden for alternate saving techniques.
+        The backend behind self.save is chosen by STORE in config.ini. '''
         total_count = len(self.save)
         tbd_count = 0
-        for url, completed in self.save.values():
+        revisit_count = 0
+        for urlhash, record in self.save.items():
+            url, completed, depth = unpack_record(record)
+            self.seen.add(url_digest(urlhash))
+            self.traps.restore(url)
+            if completed and self.recrawl is not None and self.recrawl.load(url, record):
+                completed = False
+                revisit_count += 1
             if not completed and is_valid(url):
-                self.to_be_downloaded.append(url)
+                self._enqueue(url, depth)
                 tbd_count += 1
         self.logger.info(
             f"Found {tbd_count} urls to be downloaded from {total_count} "
-            f"total urls discovered.")
+            f"total urls discovered, {revisit_count} of them due for a revisit.")
+
+    def _stream_save_file(self):
+        ''' Lazy alternative to _parse_save_file. Reads the save file a page
+        at a time, only holding the lock while a page is applied. '''
+        start = time.monotonic()
+        total_count = 0
+        tbd_count = 0
+        revisit_count = 0
+        page_size = self.config.resume_page_size
+        records = self.save.iter_items()
+        while True:
+            with self.lock:
+                page_count = 0
+                for urlhash, record in records:
+                    url, completed, depth = unpack_record(record)
+                    # Urls added since startup are already queued.
+                    if urlhash not in self.added_while_resuming:
+                        self.seen.add(url_digest(urlhash))
+                        self.traps.restore(url)
+                        if (completed and self.recrawl is not None
+                                and self.recrawl.load(url, record)):
+                            completed = False
+                            revisit_count += 1
+                        if not completed:
+                            self.unvalidated.add(url)
+                            self._enqueue(url, depth)
+                            tbd_count += 1
+                    page_count += 1
+                    if page_count == page_size:
+                        break
+                total_count += page_count
+                if page_count < page_size:
+                    self.resuming = False
+                    self.added_while_resuming.clear()
+                    self.ready.notify_all()
+            if not self.resuming:
+                break
+            self.logger.info(
+                f"Resuming: loaded {total_count} urls from save file, "
+                f"{tbd_count} to be downloaded.")
+        self.logger.info(
+            f"Found {tbd_count} urls to be downloaded from {total_count} "
+            f"total urls discovered, {revisit_count} of them due for a "
+            f"revisit, in {time.monotonic() - start:.1f}s.")
 
     def get_tbd_url(self):
-        try:
-            return self.to_be_downloaded.pop()
-        except IndexError:
-            return None
+        ''' Blocks until a url whose host is past its politeness delay is
+        available. Returns None once nothing is queued or in flight. '''
+        with self.ready:
+            while True:
+                url, wait = self.try_get_tbd_url()
+                if url is not None or wait is None:
+                    return url
+                self.ready.wait(None if wait == math.inf else wait)
 
-    def add_url(self, url):
-        url = normalize(url)
+    def try_get_tbd_url(self):
+        ''' Non blocking get_tbd_url, for event loops. Returns (url, None)
+        when a url is ready, (None, None) once the crawl is finished, and
+        otherwise (None, wait) with the seconds until the next host frees up
+        (math.inf if that depends on urls in flight). '''
+        with self.lock:
+            while True:
+                url, wait = self._pop_ready_url()
+                if url in self.unvalidated:
+                    self.unvalidated.discard(url)
+                    if not is_valid(url):
+                        # Never fetched, so the host need not wait.
+                        self._release(url, polite=False)
+                        continue
+                if url is not None:
+                    return url, None
+                if self._crawl_finished():
+                    # Wake the other workers so they can stop too.
+                    self.ready.notify_all()
+                    return None, None
+                return None, math.inf if wait is None else wait
+
+    def add_url(self, url, parent=None, depth=None):
+        ''' Adds a url found on the page at parent (None for seeds) unless
+        it was seen before or the trap detector cuts it off. A url that is
+        still queued counts the link as an inlink. depth overrides the depth
+        from parent, for urls found by another shard. '''
+        with metrics.timer("frontier.add"):
+            self._add_url(url, parent, depth)
+
+    def _add_url(self, url, parent, depth):
+        url = self.canonical(url)
         urlhash = get_urlhash(url)
-        if urlhash not in self.save:
-            self.save[urlhash] = (url, False)
-            self.save.sync()
-            self.to_be_downloaded.append(url)
-    
+        with self.lock:
+            if self._seen_before(urlhash):
+                self.dedup_hits += 1
+                metrics.increment("frontier.repeated")
+                queued = self.pending.get(url)
+                if queued is not None and queued.queued:
+                    queued.inlinks += 1
+                    # Rescored at powers of two only, which bounds the stale
+                    # heap entries; inlinks are scored on a log scale.
+                    if not queued.inlinks & (queued.inlinks - 1):
+                        self._push(url, queued)
+                return
+            if self.robots is not None and not self.robots.allowed(url):
+                metrics.increment("frontier.disallowed")
+                return
+            verdict = self.traps.check(url, parent)
+            if verdict == CUT:
+                metrics.increment("frontier.cut")
+                return
+            if verdict == THROTTLE:
+                metrics.increment("frontier.throttled")
+            metrics.increment("frontier.added")
+            if depth is None:
+                depth = self._child_depth(parent)
+            # The depth is saved so that the order survives a restart.
+            self.save[urlhash] = (url, False, depth)
+            self.seen.add(url_digest(urlhash))
+            if self.resuming:
+                self.added_while_resuming.add(urlhash)
+            self._enqueue(url, depth, demote=verdict == THROTTLE)
+
+    def _child_depth(self, parent):
+        parent_url = self.pending.get(parent) if parent is not None else None
+        return parent_url.depth + 1 if parent_url is not None else 0
+
+    def visited(self, url, resp):
+        ''' Called by the workers with the response downloaded for url.
+        Returns NEW for a first visit, and otherwise whether the page
+        CHANGED since the last visit; UNCHANGED pages need not be parsed or
+        stored again. Always NEW unless re-crawling. '''
+        if self.recrawl is None:
+            return NEW
+        with self.lock:
+            previous = self.recrawl.previous.get(url)
+        # Hashing the page is left outside the lock.
+        visit, state = self.recrawl.check(previous, resp)
+        with self.lock:
+            self.recrawl.visits[url] = state
+        metrics.increment(f"recrawl.{visit}")
+        return visit
+
+    def page_fingerprint(self, url, page_fingerprint):
+        ''' Called by the scraper with the fingerprint of every distinct
+        page, to be saved for re-crawls. '''
+        with self.lock:
+            self.recrawl.page_fingerprint(url, page_fingerprint)
+
     def mark_url_complete(self, url):
+        with metrics.timer("frontier.complete"):
+            self._mark_url_complete(url)
+
+    def _mark_url_complete(self, url):
         urlhash = get_urlhash(url)
-        if urlhash not in self.save:
-            # This should not happen.
-            self.logger.error(
-                f"Completed url {url}, but have not seen it before.")
+        with self.lock:
+            if not self._seen_before(urlhash):
+                # This should not happen.
+                self.logger.error(
+                    f"Completed url {url}, but have not seen it before.")
+
+            queued = self.pending.get(url)
+            record = (url, True, queued.depth if queued is not None else 0)
+            if self.recrawl is not None:
+                record += (self.recrawl.completed(url),)
+            self.save[urlhash] = record
+            self.traps.page_done(url)
+            host = self.in_flight.get(url)
+            if host is not None:
+                self.host_pages[host] = self.host_pages.get(host, 0) + 1
+            self._release(url)
+
+    def _skipped_record(self, url, depth):
+        # The record of a url completed without a download, which is never
+        # revisited when re-crawling.
+        record = (url, True, depth)
+        if self.recrawl is not None:
+            record += (self.recrawl.never(url),)
+        return record
+
+    def add_sitemap_urls(self, urls):
+        ''' Adds the valid urls of a sitemap, a level below the seeds, and
+        returns how many there were. The lock is taken per url, so workers
+        are not held up while a large sitemap is added. '''
+        valid_urls = [url for url in urls if is_valid(url)]
+        for url in valid_urls:
+            self.add_url(url, depth=1)
+        return len(valid_urls)
+
+    def canonical_page(self, url, canonical):
+        ''' Called by the scraper for the downloaded page at url declaring
+        another canonical url. Returns False if the canonical url was
+        already downloaded, making the page a duplicate; otherwise the page
+        stands in for it and it is marked complete without a download. '''
+        canonical = self.canonical(canonical)
+        urlhash = get_urlhash(canonical)
+        # Urls are the same page if their hashes are, whatever their scheme.
+        if urlhash == get_urlhash(url) or not is_valid(canonical):
+            return True
+        with self.lock:
+            queued = self.pending.get(url)
+            depth = queued.depth if queued is not None else 0
+            if self._seen_before(urlhash):
+                # It may be queued under another scheme.
+                canonical = self.save[urlhash][0]
+                waiting = self.pending.get(canonical)
+                if waiting is None or not waiting.queued:
+                    return False
+                # Its heap entries are skipped once it leaves pending.
+                self.pending.pop(canonical)
+                depth = waiting.depth
+            else:
+                self.seen.add(url_digest(urlhash))
+            self.save[urlhash] = self._skipped_record(canonical, depth)
+            metrics.increment("frontier.canonical")
+            return True
+
+    def robots_loaded(self, host):
+        ''' Called by the RobotsPolicy, with the lock held, when the rules
+        of host arrive (host is None when it finished reading sitemaps). '''
+        if host is not None and host in self.robots_waiting:
+            # Downloading robots.txt counted as a visit to the host (see
+            # release_host).
+            self.robots_waiting.discard(host)
+            self._schedule(host)
+        if self._crawl_finished():
+            self.ready.notify_all()
+
+    def claim_host(self, host):
+        ''' Called by the RobotsPolicy, with the lock held, before it
+        downloads robots.txt or a sitemap from host. Takes the host like an in flight url
+        and returns 0 if it is idle and past its politeness delay, and
+        otherwise the seconds to wait before trying again. '''
+        if host in self.busy_hosts:
+            return self._delay(host)
+        wait = self.next_allowed.get(host, 0.0) - time.monotonic()
+        if wait > 0:
+            return wait
+        self.busy_hosts.add(host)
+        return 0
+
+    def release_host(self, host):
+        ''' Frees a host taken by claim_host once its download is over. '''
+        self.busy_hosts.discard(host)
+        self.next_allowed[host] = time.monotonic() + self._delay(host)
+        self._schedule(host)
+
+    def report_duplicate(self, url, original):
+        ''' Called by the scraper when the page at url duplicates the page at
+        original; patterns that mostly give duplicates are throttled. '''
+        with self.lock:
+            self.traps.report_duplicate(url, original)
+
+    def close(self):
+        ''' Flushes and closes the save file once the crawl is over. '''
+        if self.robots is not None:
+            self.robots.close()
+        with self.lock:
+            self.save.close()
+        self.logger.info(
+            f"Seen url index: {self.seen.report()}. Rejected "
+            f"{self.dedup_hits} repeated urls with {self.store_lookups} "
+            f"save file lookups. Traps: {self.traps.report()}.")
+
+    def _seen_before(self, urlhash):
+        digest = url_digest(urlhash)
+        if digest not in self.seen:
+            if not self.resuming:
+                return False
+            # The save file is still being streamed into the index.
+            self.store_lookups += 1
+            return urlhash in self.save
+        if self.seen.exact:
+            return True
+        # The index may give false positives; confirm on disk.
+        self.store_lookups += 1
+        return urlhash in self.save
+
+    def _enqueue(self, url, depth, demote=False):
+        queued = self.pending[url] = QueuedUrl(depth, demote)
+        self._push(url, queued)
+
+    def _push(self, url, queued):
+        # Scores the url and adds it to its host's heap. Earlier entries of
+        # the url are left in the heap and skipped when they come up.
+        host = get_host(url)
+        candidate = Candidate(
+            url, host, queued.depth, queued.inlinks,
+            self.traps.pattern_urls(url))
+        queued.score = self.priority.score(candidate)
+        if queued.demoted:
+            queued.score += DEMOTED
+        queue = self.host_queues.get(host)
+        if queue is None:
+            queue = self.host_queues[host] = list()
+        self.pushes += 1
+        heappush(queue, (queued.score, self.pushes, url))
+        self._schedule(host)
+
+    def _schedule(self, host):
+        # Put the host on the heap if it has work and is not already on the
+        # heap or busy with an in flight url.
+        if (host in self.scheduled_hosts or host not in self.host_queues
+                or host in self.busy_hosts):
+            return
+        if self.robots is not None and not self.robots.ready(host, self.host_queues[host][0][2]):
+            self.robots_waiting.add(host)
+            return
+        self.scheduled_hosts.add(host)
+        heappush(self.host_heap, (self.next_allowed.get(host, 0.0), host))
+        # Wake every waiter: a single woken worker that declines the host
+        # would leave the others asleep while it has work.
+        self.ready.notify_all()
+
+    def _pop_ready_url(self):
+        ''' Returns (url, None) for the next polite url, or (None, wait) where
+        wait is the seconds until a host frees up (None if none is queued). '''
+        now = time.monotonic()
+        while self.host_heap and self.host_heap[0][0] <= now:
+            _, host = heappop(self.host_heap)
+            queue = self.host_queues[host]
+            heappush(self.ready_hosts, (
+                queue[0][0] + self.priority.host_score(
+                    self.host_pages.get(host, 0)), host))
+        while self.ready_hosts:
+            _, host = heappop(self.ready_hosts)
+            self.scheduled_hosts.discard(host)
+            if host in self.busy_hosts:
+                # Claimed for a sitemap since it was scheduled; scheduled
+                # again when it is released.
+                continue
+            self.busy_hosts.add(host)
+            url = self._pop_host_url(host)
+            if url is None:
+                self.busy_hosts.discard(host)
+                continue
+            self.in_flight[url] = host
+            return url, None
+        if not self.host_heap:
+            return None, None
+        return None, self.host_heap[0][0] - now
+
+    def _pop_host_url(self, host):
+        # Returns the host's best live url, or None if it only had stale
+        # entries. Urls whose pattern was throttled after they were queued
+        # are demoted when they come up.
+        queue = self.host_queues[host]
+        url = None
+        while queue:
+            score, _, next_url = heappop(queue)
+            queued = self.pending.get(next_url)
+            if queued is None or not queued.queued or queued.score != score:
+                continue
+            if self.robots is not None and not self.robots.allowed(next_url):
+                # Queued before its host's robots.txt arrived; never fetched.
+                self.pending.pop(next_url)
+                self.save[get_urlhash(next_url)] = self._skipped_record(next_url, queued.depth)
+                metrics.increment("frontier.disallowed")
+                continue
+            if not queued.demoted and self.traps.is_throttled(next_url):
+                queued.demoted = True
+                self._push(next_url, queued)
+                continue
+            queued.queued = False
+            url = next_url
+            break
+        if not queue:
+            del self.host_queues[host]
+        return url
+
+    def _release(self, url, polite=True):
+        self.pending.pop(url, None)
+        host = self.in_flight.pop(url, None)
+        if host is None:
+            return
+        self.busy_hosts.discard(host)
+        if polite:
+            self.next_allowed[host] = time.monotonic() + self._delay(host)
+        self._schedule(host)
+        if self._crawl_finished():
+            self.ready.notify_all()
+
+    def _delay(self, host):
+        if self.robots is None:
+            return self.config.time_delay
+        return self.robots.delay(host)
+
+    def _crawl_finished(self):
+        return (not self.host_heap and not self.ready_hosts
+                and not self.in_flight and not self.resuming
+                and not self.robots_waiting
+                and not (self.robots is not None and self.robots.busy()))
+
+
+def unpack_record(record):
+    ''' Returns (url, completed, depth) for a save file record; save files
+    from before depths were saved hold (url, completed). Completed urls
+    may also hold their revisit state (see crawler/recrawl.py). '''
+    if len(record) > 2:
+        return record[0], record[1], record[2]
+    return record[0], record[1], 0
+
 
-        self.save[urlhash] = (url, True)
-        self.save.sync()
+def get_host(url):
+    return urlparse(url).netloc
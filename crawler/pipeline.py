@@ -0,0 +1,160 @@
+import time
+
+from multiprocessing import get_context
+from concurrent.futures import ProcessPoolExecutor
+from threading import Thread, Lock, BoundedSemaphore
+from queue import Queue
+
+from utils.download import download
+from utils import get_logger, metrics
+from crawler.recrawl import NEW, UNCHANGED
+import scraper
+
+
+class ParsePipeline(object):
+    ''' worker_factory for ENGINE = pipeline in config.ini.
+
+    Splits the crawl into stages: Fetcher threads download pages and hand
+    their text, decoded with the response's charset, to a pool of parser
+    processes running scraper.scrape_content, and a single sink thread
+    stores the text, adds the links to the frontier and marks the url
+    complete. At most PARSEQUEUESIZE pages wait to be parsed and
+    PARSEQUEUESIZE results wait for the sink; when either is full the
+    fetchers block. '''
+    stats_interval = 30
+
+    def __init__(self, config):
+        self.config = config
+        self.logger = get_logger("PIPELINE")
+        # Spawned, not forked, since the crawler is already multithreaded.
+        self.pool = ProcessPoolExecutor(
+            max_workers=config.parse_processes or None,
+            mp_context=get_context("spawn"),
+            initializer=scraper.configure, initargs=(config,))
+        self.parse_slots = BoundedSemaphore(config.parse_queue_size)
+        self.results = Queue(maxsize=config.parse_queue_size)
+        self.lock = Lock()
+        self.frontier = None
+        self.fetchers = 0
+        self.downloading = 0
+        self.parsing = 0
+        for stage in ("downloading", "parsing", "results"):
+            metrics.register_gauge(
+                f"pipeline.{stage}", lambda stage=stage: self.stage_depths()[stage])
+
+    def __call__(self, worker_id, config, frontier):
+        with self.lock:
+            if self.frontier is None:
+                self.frontier = frontier
+                Thread(target=self._drain_results, daemon=True).start()
+                Thread(target=self._report_stats, daemon=True).start()
+            self.fetchers += 1
+        return Fetcher(worker_id, config, frontier, self)
+
+    def submit(self, url, content):
+        ''' Queues the decoded text of a downloaded page (resp.text, since the
+        parser only sees <meta> charsets) for parsing, blocking while the
+        parse stage is full. '''
+        self.parse_slots.acquire()
+        with self.lock:
+            self.parsing += 1
+        future = self.pool.submit(metrics.collect, scraper.scrape_content, url, content)
+        future.add_done_callback(lambda future: self._parsed(url, future))
+
+    def skip(self, url):
+        ''' Sends a url that has nothing to parse straight to the sink. '''
+        self.results.put((url, [], None, None, None, None))
+
+    def stage_depths(self):
+        with self.lock:
+            return {
+                "downloading": self.downloading,
+                "parsing": self.parsing,
+                "results": self.results.qsize()}
+
+    def fetcher_done(self):
+        with self.lock:
+            self.fetchers -= 1
+            last = not self.fetchers
+        if last:
+            # The frontier only runs dry once the sink has completed every
+            # url, so nothing is left in the pipeline.
+            self.results.put(None)
+            self.pool.shutdown()
+
+    def _parsed(self, url, future):
+        try:
+            result, parse_metrics = future.result()
+            metrics.merge(parse_metrics)
+        except Exception:
+            metrics.increment("errors.parse")
+            self.logger.exception(f"Failed to parse {url}.")
+            result = [], None, None, None, None
+        self.results.put((url, *result))
+        with self.lock:
+            self.parsing -= 1
+        self.parse_slots.release()
+
+    def _drain_results(self):
+        while True:
+            result = self.results.get()
+            if result is None:
+                break
+            url, scraped_urls, webpage_text, page_analytics, page_fingerprint, canonical = result
+            try:
+                if scraper.is_new_content(url, page_fingerprint, canonical):
+                    scraper.store_page_text(url, webpage_text, page_analytics)
+                    for scraped_url in scraped_urls:
+                        self.frontier.add_url(scraped_url, url)
+            except Exception:
+                metrics.increment("errors.store")
+                self.logger.exception(f"Failed to store {url}.")
+            self.frontier.mark_url_complete(url)
+
+    def _report_stats(self):
+        while self.fetchers:
+            time.sleep(self.stats_interval)
+            depths = self.stage_depths()
+            self.logger.info(
+                f"Queue depths: {depths['downloading']} downloading, "
+                f"{depths['parsing']} parsing, {depths['results']} "
+                f"waiting to be stored.")
+
+
+class Fetcher(Thread):
+    def __init__(self, worker_id, config, frontier, pipeline):
+        self.logger = get_logger(f"Worker-{worker_id}", "Worker")
+        self.config = config
+        self.frontier = frontier
+        self.pipeline = pipeline
+        super().__init__(daemon=True)
+
+    def run(self):
+        while True:
+            tbd_url = self.frontier.get_tbd_url()
+            if not tbd_url:
+                self.logger.info("Frontier is empty. Stopping Crawler.")
+                break
+            try:
+                with self.pipeline.lock:
+                    self.pipeline.downloading += 1
+                try:
+                    resp = download(tbd_url, self.config, self.logger)
+                finally:
+                    with self.pipeline.lock:
+                        self.pipeline.downloading -= 1
+                self.logger.info(
+                    f"Downloaded {tbd_url}, status <{resp.status}>, "
+                    f"using cache {self.config.cache_server}.")
+                visit = self.frontier.visited(tbd_url, resp)
+                if visit == NEW:
+                    scraper.record_download(tbd_url)
+                if visit != UNCHANGED and (resp.error is None) and (resp.status == 200):
+                    self.pipeline.submit(tbd_url, resp.text)
+                else:
+                    self.pipeline.skip(tbd_url)
+            except Exception:
+                metrics.increment("errors.crawl")
+                self.logger.exception(f"Failed to crawl {tbd_url}.")
+                self.pipeline.skip(tbd_url)
+        self.pipeline.fetcher_done()
@@ -0,0 +1,55 @@
+import math
+
+from collections import namedtuple
+
+
+# What a scorer knows about a queued url: how many links it is from a seed,
+# how many other pages linked to it while it waited, and how many urls its
+# url pattern has had (see crawler.traps).
+Candidate = namedtuple("Candidate", ["url", "host", "depth", "inlinks", "pattern_urls"])
+
+# Added to the score of urls whose pattern the trap detector throttles, so
+# they come after every other url of their host.
+DEMOTED = 1e9
+
+SCORERS = dict()
+
+
+def register_scorer(name, scorer):
+    ''' Makes scorer(candidate) -> float usable as name in PRIORITY in
+    config.ini. Lower scores are downloaded first. '''
+    SCORERS[name] = scorer
+
+
+register_scorer("depth", lambda candidate: candidate.depth)
+register_scorer("inlinks", lambda candidate: -math.log1p(candidate.inlinks))
+register_scorer("novelty", lambda candidate: math.log1p(candidate.pattern_urls))
+
+
+class Priority(object):
+    ''' Orders the frontier. Every queued url is scored with a weighted sum
+    of registered scorers, and each host downloads its lowest scoring url
+    first. Among the hosts that are past their politeness delay, the one
+    with the lowest best score, plus host_weight times the log of the pages
+    already downloaded from it, goes first, so no host crowds the others
+    out. '''
+
+    def __init__(self, weights=None, host_weight=1.0):
+        weights = dict(weights or {"depth": 1.0, "inlinks": 1.0, "novelty": 0.5})
+        for name in weights:
+            if name not in SCORERS:
+                raise ValueError(f"Unknown PRIORITY scorer {name}.")
+        self.components = [(SCORERS[name], weight) for name, weight in weights.items() if weight]
+        self.host_weight = host_weight
+
+    @classmethod
+    def from_config(cls, config):
+        weights = dict(config.priority)
+        host_weight = weights.pop("host", 0.0)
+        return cls(weights, host_weight)
+
+    def score(self, candidate):
+        return sum(weight * scorer(candidate) for scorer, weight in self.components)
+
+    def host_score(self, host_pages):
+        return self.host_weight * math.log1p(host_pages)
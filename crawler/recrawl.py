@@ -0,0 +1,134 @@
+import time
+
+from hashlib import blake2b
+from collections import namedtuple
+
+from scraper import remember_page
+
+
+# What a download of a url was, for the workers: its first visit, or a
+# revisit whose page changed or did not change since the last visit.
+NEW = "new"
+CHANGED = "changed"
+UNCHANGED = "unchanged"
+
+# The revisit state saved with a completed url: the status of its last
+# visit, the ETag, Last-Modified and content hash of its last OK response,
+# the text fingerprint of its page if it was a distinct page (see
+# utils/fingerprint.py), the seconds between visits and the (wall clock)
+# time it is due again.
+Revisit = namedtuple(
+    "Revisit", ["status", "etag", "modified", "digest", "fingerprint", "interval", "due"])
+# The state of a url completed without a download, because robots.txt
+# disallows it or a page naming it as its rel=canonical url stood in for
+# it: never due.
+NEVER = Revisit(None, None, None, None, None, None, None)
+
+
+class RecrawlPolicy(object):
+    ''' When to revisit the urls of an earlier crawl, and whether their
+    pages changed, for ENABLED = true in the [RECRAWL] section of
+    config.ini.
+
+    Every completed url is saved with its Revisit state. When the crawler
+    resumes a save file, the completed urls that are due are queued again,
+    and the fingerprints of all the pages go back into the scraper's
+    duplicate index, so that copies of pages not parsed again are still
+    found. A revisit whose response has the same ETag or Last-Modified as the last
+    OK response, or failing that the same content hash, is UNCHANGED, and
+    its page is neither parsed nor stored again. The interval of a url
+    doubles every time its page is unchanged and halves every time it
+    changed, between MININTERVAL and MAXINTERVAL seconds, so pages are
+    revisited about as often as they change.
+
+    The cache server only takes the url, so responses cannot be made
+    conditional: validators save the hashing, and unchanged pages the
+    parsing and storage. The state is guarded by the frontier's lock. '''
+
+    def __init__(self, config):
+        self.initial_interval = config.recrawl_initial_interval
+        self.min_interval = config.recrawl_min_interval
+        self.max_interval = config.recrawl_max_interval
+        # The Revisit state of the urls queued again, and the new state of
+        # the urls downloaded but not completed yet
+        self.previous = dict()
+        self.visits = dict()
+
+    def load(self, url, record):
+        ''' Loads the save file record of a completed url, and returns
+        whether it is due for a revisit, remembering its state if it is.
+        Urls crawled without recrawling have no state, and are due right
+        away; urls saved with the NEVER state are never due. '''
+        previous = revisit_state(record)
+        if previous is not None and previous.fingerprint is not None:
+            checksum, page_simhash = previous.fingerprint
+            remember_page(url, (bytes.fromhex(checksum), page_simhash))
+        if previous is not None and (previous.due is None or previous.due > time.time()):
+            return False
+        if previous is not None:
+            self.previous[url] = previous
+        return True
+
+    def check(self, previous, resp):
+        ''' Returns the kind of visit resp is after the previous visit
+        (None for none) and the new Revisit state. Runs outside the lock. '''
+        etag = modified = digest = fingerprint = None
+        if previous is not None:
+            etag, modified, digest = previous.etag, previous.modified, previous.digest
+            fingerprint = previous.fingerprint
+        if resp.error is None and resp.status == 200:
+            headers = resp.headers
+            new_etag, new_modified = headers.get("ETag"), headers.get("Last-Modified")
+            if not ((new_etag and new_etag == etag) or (new_modified and new_modified == modified)):
+                digest = blake2b(resp.content, digest_size=16).hexdigest()
+            unchanged = previous is not None and digest == previous.digest
+            etag, modified = new_etag, new_modified
+        else:
+            unchanged = previous is not None and resp.status in (304, previous.status)
+        status = 200 if resp.status == 304 else resp.status
+        # Pages parsed again report their new fingerprint.
+        if previous is None:
+            return NEW, self._state(
+                status, etag, modified, digest, None, self.initial_interval)
+        if unchanged:
+            return UNCHANGED, self._state(
+                status, etag, modified, digest, fingerprint,
+                min(previous.interval * 2, self.max_interval))
+        return CHANGED, self._state(
+            status, etag, modified, digest, None,
+            max(previous.interval / 2, self.min_interval))
+
+    def page_fingerprint(self, url, page_fingerprint):
+        ''' Records the fingerprint of the distinct page downloaded at url. '''
+        state = self.visits.get(url)
+        if state is not None:
+            checksum, page_simhash = page_fingerprint
+            self.visits[url] = state._replace(fingerprint=(checksum.hex(), page_simhash))
+
+    def completed(self, url):
+        ''' The state to save for a completed url; urls that failed before
+        they were checked keep their interval. '''
+        previous = self.previous.pop(url, None)
+        state = self.visits.pop(url, None)
+        if state is None and previous is None:
+            state = self._state(None, None, None, None, None, self.initial_interval)
+        elif state is None:
+            state = previous._replace(due=time.time() + previous.interval)
+        return tuple(state)
+
+    def never(self, url):
+        ''' The state to save for a url completed without a download. '''
+        self.previous.pop(url, None)
+        self.visits.pop(url, None)
+        return tuple(NEVER)
+
+    def _state(self, status, etag, modified, digest, fingerprint, interval):
+        return Revisit(
+            status, etag, modified, digest, fingerprint, interval, time.time() + interval)
+
+
+def revisit_state(record):
+    ''' The Revisit state of a save file record, None if it has none. '''
+    if len(record) > 3 and record[3] is not None:
+        return Revisit(*record[3])
+    return None
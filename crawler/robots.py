@@ -0,0 +1,302 @@
+import re
+import gzip
+import time
+
+from io import BytesIO
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+from xml.etree.ElementTree import iterparse, ParseError
+
+from utils import get_logger, metrics
+from utils.download import download
+
+
+# Marks the end of a rule in a RobotsRules trie; never a path character.
+END = None
+
+
+class RobotsRules(object):
+    ''' The rules of one host's robots.txt for our user agent.
+
+    Plain path prefixes are compiled into a character trie, so a url is
+    matched in one walk over its path however many rules there are; the
+    few rules with * or $ wildcards are regexes. As in RFC 9309, the
+    longest matching rule wins and allow wins ties. '''
+
+    def __init__(self, rules=(), crawl_delay=None, sitemaps=()):
+        self.trie = dict()
+        # (regex, length, allow) of the wildcard rules
+        self.patterns = list()
+        self.crawl_delay = crawl_delay
+        self.sitemaps = list(sitemaps)
+        for path, allow in rules:
+            self.add_rule(path, allow)
+
+    @classmethod
+    def parse(cls, text, user_agent):
+        ''' Parses robots.txt text, keeping the group of the user agent
+        named in user_agent most specifically, or else the * group. '''
+        agent = user_agent.lower()
+        groups = list()
+        sitemaps = list()
+        group = None
+        in_agents = False
+        for line in text.splitlines():
+            field, _, value = line.split("#", 1)[0].partition(":")
+            field, value = field.strip().lower(), value.strip()
+            if field == "user-agent":
+                if not in_agents:
+                    group = (list(), list(), list())
+                    groups.append(group)
+                    in_agents = True
+                group[0].append(value.lower())
+                continue
+            in_agents = False
+            if field == "sitemap" and value:
+                sitemaps.append(value)
+            elif group is None:
+                continue
+            elif field in ("allow", "disallow") and value:
+                group[1].append((value, field == "allow"))
+            elif field == "crawl-delay":
+                try:
+                    group[2].append(float(value))
+                except ValueError:
+                    pass
+        best, best_length = None, -1
+        for agents, rules, delays in groups:
+            for name in agents:
+                length = 0 if name == "*" else len(name) if name and name in agent else -1
+                if length > best_length:
+                    best, best_length = (rules, delays), length
+        if best is None:
+            return cls(sitemaps=sitemaps)
+        rules, delays = best
+        return cls(rules, delays[0] if delays else None, sitemaps)
+
+    def add_rule(self, path, allow):
+        if "*" in path or path.endswith("$"):
+            anchored = path.endswith("$")
+            body = path[:-1] if anchored else path
+            regex = ".*".join(re.escape(part) for part in body.split("*"))
+            self.patterns.append((re.compile(regex + ("$" if anchored else "")), len(path), allow))
+            return
+        node = self.trie
+        for char in path:
+            child = node.get(char)
+            if child is None:
+                child = node[char] = dict()
+            node = child
+        node[END] = allow or node.get(END, False)
+
+    def allowed(self, path):
+        ''' Whether the path (with its query) may be crawled. '''
+        best_length, best_allow = 0, True
+        node = self.trie
+        for i, char in enumerate(path):
+            node = node.get(char)
+            if node is None:
+                break
+            allow = node.get(END)
+            if allow is not None:
+                best_length, best_allow = i + 1, allow
+        for regex, length, allow in self.patterns:
+            if (length > best_length or (length == best_length and allow)) and regex.match(path):
+                best_length, best_allow = length, allow
+        return best_allow
+
+
+# The rules of hosts without a robots.txt
+ALLOW_ALL = RobotsRules()
+
+
+class RobotsCache(object):
+    ''' The RobotsRules of at most size hosts, evicting the least recently
+    used. Rules older than ttl seconds are still used, but are stale: the
+    caller should fetch them again. Not thread safe. '''
+
+    def __init__(self, size=10000, ttl=86400.0):
+        self.size = size
+        self.ttl = ttl
+        # host -> (fetched, rules)
+        self.hosts = OrderedDict()
+
+    def get(self, host):
+        ''' Returns (rules, stale), or (None, True) for an unknown host. '''
+        entry = self.hosts.get(host)
+        if entry is None:
+            return None, True
+        self.hosts.move_to_end(host)
+        fetched, rules = entry
+        return rules, time.monotonic() - fetched > self.ttl
+
+    def put(self, host, rules):
+        self.hosts[host] = (time.monotonic(), rules)
+        self.hosts.move_to_end(host)
+        if len(self.hosts) > self.size:
+            self.hosts.popitem(last=False)
+
+
+class RobotsPolicy(object):
+    ''' What the frontier may crawl of each host according to its
+    robots.txt, for ENABLED = true in the [ROBOTS] section of config.ini.
+
+    A host's robots.txt is downloaded through the cache server, like any
+    page, by a pool of threads before any other url of the host: the
+    frontier holds the host back until its rules are known (hosts without
+    a robots.txt may crawl everything). Disallowed urls are never queued,
+    and a Crawl-delay longer than POLITENESS (up to MAXDELAY) slows
+    down the host. Then the sitemaps it lists are streamed in, taking the
+    host from the frontier for each download like a url, and up to
+    SITEMAPURLS of their urls per host are added to the frontier.
+
+    The state is guarded by the frontier's lock; only downloads and parsing
+    happen outside it. '''
+
+    def __init__(self, config, frontier):
+        self.config = config
+        self.frontier = frontier
+        self.logger = get_logger("ROBOTS", "FRONTIER")
+        self.cache = RobotsCache(config.robots_cache_size, config.robots_ttl)
+        self.max_delay = config.robots_max_delay
+        self.sitemap_urls = config.robots_sitemap_urls
+        # Hosts whose robots.txt is being downloaded
+        self.fetching = set()
+        # Downloads of robots.txt and sitemaps not finished yet
+        self.pending = 0
+        self.pool = ThreadPoolExecutor(
+            config.robots_threads, thread_name_prefix="robots")
+
+    def allowed(self, url):
+        ''' Whether url may be crawled by the rules known so far; urls of
+        hosts whose rules are unknown are checked again when dequeued. '''
+        parsed = urlparse(url)
+        rules, _ = self.cache.get(parsed.netloc)
+        if rules is None:
+            return True
+        path = parsed.path or "/"
+        if parsed.query:
+            path = f"{path}?{parsed.query}"
+        return rules.allowed(path)
+
+    def ready(self, host, url):
+        ''' Whether the rules of host are known, fetching them if they are
+        unknown or stale; stale rules are used until the new ones arrive. '''
+        rules, stale = self.cache.get(host)
+        if stale and host not in self.fetching:
+            self.fetching.add(host)
+            self.pending += 1
+            self.pool.submit(self._fetch, host, urlparse(url).scheme or "https")
+        return rules is not None
+
+    def delay(self, host):
+        rules, _ = self.cache.get(host)
+        if rules is None or rules.crawl_delay is None:
+            return self.config.time_delay
+        return max(self.config.time_delay, min(rules.crawl_delay, self.max_delay))
+
+    def busy(self):
+        return self.pending > 0
+
+    def close(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+    def _fetch(self, host, scheme):
+        # Stale rules are downloaded again while the host is being crawled,
+        # so robots.txt takes the host like the sitemaps do.
+        rules = ALLOW_ALL
+        self._claim_host(host)
+        try:
+            resp = download(f"{scheme}://{host}/robots.txt", self.config)
+            metrics.increment(f"robots.status.{resp.status}")
+            if resp.error is None and resp.status == 200:
+                rules = RobotsRules.parse(resp.text, self.config.user_agent)
+        except Exception:
+            self.logger.exception(f"Failed to get the robots.txt of {host}.")
+        with self.frontier.lock:
+            self.cache.put(host, rules)
+            self.fetching.discard(host)
+            self.frontier.release_host(host)
+            self.frontier.robots_loaded(host)
+        try:
+            if self.sitemap_urls:
+                self._read_sitemaps(host, rules.sitemaps)
+        finally:
+            with self.frontier.lock:
+                self.pending -= 1
+                self.frontier.robots_loaded(None)
+
+    def _read_sitemaps(self, host, sitemaps):
+        # Sitemap indexes may list more sitemaps; each is read once. Each
+        # download takes the host from the frontier like a url would, so it
+        # keeps to the host's delay and never overlaps a worker's download.
+        to_read = list(sitemaps)
+        read = set()
+        added = 0
+        while to_read and added < self.sitemap_urls:
+            sitemap = to_read.pop(0)
+            if sitemap in read or urlparse(sitemap).netloc != host:
+                continue
+            read.add(sitemap)
+            self._claim_host(host)
+            try:
+                resp = download(sitemap, self.config)
+            finally:
+                with self.frontier.lock:
+                    self.frontier.release_host(host)
+            metrics.increment("robots.sitemaps")
+            if resp.error is not None or resp.status != 200:
+                continue
+            batch = list()
+            try:
+                for kind, loc in iter_sitemap(resp.content):
+                    if kind == "sitemap":
+                        to_read.append(loc)
+                        continue
+                    batch.append(loc)
+                    if len(batch) == 1000 or added + len(batch) >= self.sitemap_urls:
+                        added += self.frontier.add_sitemap_urls(batch)
+                        batch = list()
+                        if added >= self.sitemap_urls:
+                            break
+            except ParseError:
+                self.logger.warning(f"Could not parse the sitemap {sitemap}.")
+            if batch:
+                added += self.frontier.add_sitemap_urls(batch)
+        if added:
+            self.logger.info(f"Added {added} urls from the sitemaps of {host}.")
+
+    def _claim_host(self, host):
+        # Waits until the frontier hands over host; downloads from it must be
+        # followed by frontier.release_host.
+        while True:
+            with self.frontier.lock:
+                wait = self.frontier.claim_host(host)
+            if not wait:
+                return
+            time.sleep(wait)
+
+
+def iter_sitemap(content):
+    ''' Streams ("url", loc) for each page of a sitemap and ("sitemap", loc)
+    for each sitemap of a sitemap index, gzipped or not, without building
+    the whole tree. '''
+    source = BytesIO(content)
+    if content[:2] == b"\x1f\x8b":
+        source = gzip.GzipFile(fileobj=source)
+    root = kind = None
+    for event, element in iterparse(source, events=("start", "end")):
+        tag = element.tag.rsplit("}", 1)[-1]
+        if event == "start":
+            if root is None:
+                root = element
+            elif tag in ("url", "sitemap"):
+                kind = tag
+            continue
+        if tag == "loc" and kind is not None and element.text:
+            yield kind, element.text.strip()
+        elif tag in ("url", "sitemap"):
+            # Drop the entries read so far, so memory stays flat.
+            root.clear()
+            kind = None
@@ -0,0 +1,163 @@
+import math
+
+from array import array
+
+
+def url_digest(urlhash):
+    ''' Truncates a get_urlhash hexdigest to a non zero 8 byte integer. '''
+    return int(urlhash[:16], 16) or 1
+
+
+def open_seen_index(config):
+    ''' Creates the in memory seen url index chosen by SEENINDEX in
+    config.ini. '''
+    if config.seen_index == "hashset":
+        return DigestSet()
+    if config.seen_index == "bloom":
+        return BloomFilter(config.seen_capacity, config.seen_error_rate)
+    if config.seen_index == "none":
+        return NoIndex()
+    raise ValueError(f"Unknown SEENINDEX {config.seen_index}.")
+
+
+class DigestSet(object):
+    ''' Open addressing hash set of 8 byte url digests in a flat array.
+
+    Membership is exact up to collisions of the truncated hash, so the
+    frontier trusts it without looking at the save file. '''
+    exact = True
+
+    def __init__(self, capacity=1 << 12, max_load=0.7):
+        self.max_load = max_load
+        self.slots = array("Q", bytes(8 * _power_of_two(capacity)))
+        self.mask = len(self.slots) - 1
+        self.count = 0
+
+    def __contains__(self, digest):
+        slots, mask = self.slots, self.mask
+        i = digest & mask
+        while True:
+            slot = slots[i]
+            if slot == digest:
+                return True
+            if slot == 0:
+                return False
+            i = (i + 1) & mask
+
+    def __len__(self):
+        return self.count
+
+    def add(self, digest):
+        if self.count + 1 > self.max_load * len(self.slots):
+            self._grow()
+        if self._insert(digest):
+            self.count += 1
+
+    def memory_bytes(self):
+        return self.slots.itemsize * len(self.slots)
+
+    def report(self):
+        return (
+            f"hash set of {self.count} digests in "
+            f"{self.memory_bytes() / 2 ** 20:.1f} MiB "
+            f"(load {self.count / len(self.slots):.2f}), estimated false "
+            f"positive rate {self.count / 2 ** 64:.2e}")
+
+    def _insert(self, digest):
+        slots, mask = self.slots, self.mask
+        i = digest & mask
+        while True:
+            slot = slots[i]
+            if slot == digest:
+                return False
+            if slot == 0:
+                slots[i] = digest
+                return True
+            i = (i + 1) & mask
+
+    def _grow(self):
+        old_slots = self.slots
+        self.slots = array("Q", bytes(16 * len(old_slots)))
+        self.mask = len(self.slots) - 1
+        for digest in old_slots:
+            if digest:
+                self._insert(digest)
+
+
+class BloomFilter(object):
+    ''' Fixed size Bloom filter over 8 byte url digests.
+
+    Memory is bounded by capacity and error_rate. A miss means the url was
+    never seen; a hit may be a false positive, so the frontier confirms hits
+    against the save file. '''
+    exact = False
+
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.bit_count = max(8, int(
+            -capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(
+            self.bit_count / capacity * math.log(2)))
+        self.bits = bytearray((self.bit_count + 7) // 8)
+        self.count = 0
+
+    def __contains__(self, digest):
+        bits = self.bits
+        for position in self._positions(digest):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    def __len__(self):
+        return self.count
+
+    def add(self, digest):
+        bits = self.bits
+        for position in self._positions(digest):
+            bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def memory_bytes(self):
+        return len(self.bits)
+
+    def false_positive_rate(self):
+        return (1 - math.exp(
+            -self.hash_count * self.count / self.bit_count)) ** self.hash_count
+
+    def report(self):
+        return (
+            f"bloom filter of {self.count}/{self.capacity} digests in "
+            f"{self.memory_bytes() / 2 ** 20:.1f} MiB with "
+            f"{self.hash_count} hashes, estimated false positive rate "
+            f"{self.false_positive_rate():.2e}")
+
+    def _positions(self, digest):
+        # Double hashing: derive every probe from the two halves of the
+        # digest instead of hashing the url again.
+        low, high = digest & 0xFFFFFFFF, (digest >> 32) | 1
+        for i in range(self.hash_count):
+            yield (low + i * high) % self.bit_count
+
+
+class NoIndex(object):
+    ''' Disables the index: every url is looked up in the save file. '''
+    exact = False
+
+    def __contains__(self, digest):
+        return True
+
+    def __len__(self):
+        return 0
+
+    def add(self, digest):
+        pass
+
+    def memory_bytes(self):
+        return 0
+
+    def report(self):
+        return "no seen url index"
+
+
+def _power_of_two(n):
+    return 1 << max(3, (n - 1).bit_length())
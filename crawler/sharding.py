@@ -0,0 +1,282 @@
+import copy
+
+from bisect import bisect
+from hashlib import blake2b
+from threading import Thread, Lock, Event
+from multiprocessing.connection import Listener, Client
+
+from utils import get_logger, get_urlhash, metrics
+from crawler.frontier import Frontier, get_host
+from crawler.seen import DigestSet, url_digest
+
+
+class ShardRing(object):
+    ''' Consistent hash ring assigning every host to one of count shards.
+    Each shard has replicas points on the ring, so hosts spread evenly and
+    only about 1/count of them move when a shard is added. '''
+
+    def __init__(self, count, replicas=64):
+        self.count = count
+        points = sorted(
+            (_hash(f"shard-{shard}-{replica}"), shard)
+            for shard in range(count) for replica in range(replicas))
+        self.points = [point for point, _ in points]
+        self.shards = [shard for _, shard in points]
+
+    def owner(self, host):
+        i = bisect(self.points, _hash(host)) % len(self.points)
+        return self.shards[i]
+
+
+def _hash(key):
+    return int.from_bytes(blake2b(key.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def parse_shard(value):
+    ''' Parses the launcher's --shard i/N into (i, N). '''
+    index, _, count = value.partition("/")
+    index, count = int(index), int(count)
+    if not 0 <= index < count:
+        raise ValueError(f"Shard {value} is not of the form i/N with 0 <= i < N.")
+    return index, count
+
+
+def configure_shard(config, index, count):
+    ''' Returns a copy of config for shard index of count: its own save
+    file, page text store, analytics index and metrics snapshot, and only
+    the seeds it owns. '''
+    if len(config.shard_addresses) != count:
+        raise ValueError(
+            f"[SHARDS] ADDRESSES lists {len(config.shard_addresses)} "
+            f"addresses for {count} shards.")
+    config = copy.copy(config)
+    config.shard_index = index
+    config.shard_count = count
+    suffix = f".shard{index}of{count}"
+    config.save_file += suffix
+    config.text_store_file += suffix
+    config.analytics_file += suffix
+    if config.metrics_file:
+        config.metrics_file += suffix
+    ring = ShardRing(count)
+    config.seed_urls = [
+        url for url in config.seed_urls if ring.owner(get_host(url)) == index]
+    return config
+
+
+class ShardedFrontier(Frontier):
+    ''' frontier_factory for crawling with --shard i/N.
+
+    The hosts are split between N crawler processes with a ShardRing, so
+    every host has exactly one owner and is crawled politely by it alone.
+    Urls of hosts owned by other shards are forwarded to them in batches
+    through a ShardLink instead of being queued.
+
+    The crawl only ends once every shard is idle with nothing in transit:
+    each shard counts the urls it sent to and received from every other
+    shard, and the shards exchange these counts with their idle state. When
+    every shard is idle and the sent and received counts agree, on two
+    rounds in a row with no change, no shard can get more work. '''
+
+    def __init__(self, config, restart):
+        self.ring = ShardRing(config.shard_count)
+        self.shard = config.shard_index
+        # Urls already forwarded, so each is only sent once. Always exact,
+        # whatever SEENINDEX is: a url wrongly taken as forwarded is lost.
+        self.forwarded = DigestSet()
+        self.done = False
+        self.link = ShardLink(self, config)
+        super().__init__(config, restart)
+        self.link.start()
+
+    def add_url(self, url, parent=None, depth=None):
+        url = self.canonical(url)
+        owner = self.ring.owner(get_host(url))
+        if owner == self.shard:
+            super().add_url(url, parent, depth)
+            return
+        digest = url_digest(get_urlhash(url))
+        with self.lock:
+            if digest in self.forwarded:
+                return
+            self.forwarded.add(digest)
+            self.link.forward(owner, url, self._child_depth(parent))
+        metrics.increment("shard.forwarded")
+
+    def canonical_page(self, url, canonical):
+        # Canonical urls of other shards' hosts are left to them.
+        if self.ring.owner(get_host(self.canonical(canonical))) != self.shard:
+            return True
+        return super().canonical_page(url, canonical)
+
+    def add_forwarded(self, shard, urls):
+        ''' Adds a batch of (url, depth) forwarded by another shard. '''
+        with self.lock:
+            for url, depth in urls:
+                super().add_url(url, depth=depth)
+            self.link.received[shard] += len(urls)
+        metrics.increment("shard.received", len(urls))
+
+    def is_idle(self):
+        with self.lock:
+            return super()._crawl_finished() and not self.link.buffered()
+
+    def finish(self):
+        with self.lock:
+            self.done = True
+            self.ready.notify_all()
+
+    def close(self):
+        self.link.stop()
+        super().close()
+
+    def _crawl_finished(self):
+        return self.done and super()._crawl_finished()
+
+
+class ShardLink(object):
+    ''' The connections of one shard to the others, over
+    multiprocessing.connection at the addresses in [SHARDS] ADDRESSES.
+
+    Forwarded urls are buffered per shard and sent by a single thread when
+    batch_size are waiting or every interval seconds, when the idle state
+    and counts are also sent to every shard and checked for the end of the
+    crawl. Connections to shards that are not up yet are retried.
+
+    The buffers and counts are guarded by the frontier's lock, but nothing
+    is sent while holding it: two shards sending to each other while
+    holding their locks could each wait for the other to receive. '''
+
+    def __init__(self, frontier, config):
+        self.frontier = frontier
+        self.logger = get_logger(f"SHARD-{config.shard_index}", "SHARD")
+        self.shard = config.shard_index
+        self.count = config.shard_count
+        self.addresses = config.shard_addresses
+        self.authkey = config.shard_authkey.encode("utf-8")
+        self.batch_size = config.shard_batch_size
+        self.interval = config.shard_interval
+        self.buffers = [list() for _ in range(self.count)]
+        self.sent = [0] * self.count
+        self.received = [0] * self.count
+        self.statuses = [None] * self.count
+        self.last_round = None
+        self.connections = [None] * self.count
+        self.send_lock = Lock()
+        self.wake = Event()
+        self.running = True
+        self.listener = Listener(self.addresses[self.shard], authkey=self.authkey)
+
+    def start(self):
+        Thread(target=self._accept, daemon=True).start()
+        Thread(target=self._run, daemon=True).start()
+
+    def forward(self, shard, url, depth):
+        ''' Buffers a url for shard; called with the frontier lock held. '''
+        buffer = self.buffers[shard]
+        buffer.append((url, depth))
+        if len(buffer) >= self.batch_size:
+            self.wake.set()
+
+    def buffered(self):
+        return any(self.buffers)
+
+    def stop(self):
+        self.running = False
+        self.listener.close()
+        with self.send_lock:
+            for connection in self.connections:
+                if connection is not None:
+                    connection.close()
+
+    def _accept(self):
+        while self.running:
+            try:
+                connection = self.listener.accept()
+            except OSError:
+                break
+            Thread(target=self._receive, args=(connection,), daemon=True).start()
+
+    def _receive(self, connection):
+        while self.running:
+            try:
+                message = connection.recv()
+            except (EOFError, OSError):
+                break
+            kind, shard, body = message
+            if kind == "urls":
+                self.frontier.add_forwarded(shard, body)
+            elif kind == "status":
+                self.statuses[shard] = body
+            elif kind == "done":
+                self.logger.info(f"Shard {shard} found the crawl finished.")
+                self.frontier.finish()
+        connection.close()
+
+    def _run(self):
+        while self.running and not self.frontier.done:
+            self.wake.wait(self.interval)
+            self.wake.clear()
+            self._flush()
+            # Only this thread sends urls, so none are between the buffers
+            # and the sent counts here.
+            with self.frontier.lock:
+                idle = self.frontier.is_idle()
+                status = (idle, tuple(self.sent), tuple(self.received))
+            self.statuses[self.shard] = status
+            for shard in range(self.count):
+                if shard != self.shard:
+                    self._send(shard, ("status", self.shard, status))
+            if self._all_done():
+                self.logger.info("Every shard is idle, finishing the crawl.")
+                for shard in range(self.count):
+                    if shard != self.shard:
+                        self._send(shard, ("done", self.shard, None))
+                self.frontier.finish()
+
+    def _all_done(self):
+        statuses = tuple(self.statuses)
+        if None in statuses or not all(idle for idle, _, _ in statuses):
+            self.last_round = None
+            return False
+        for sender, (_, sent, _) in enumerate(statuses):
+            for receiver, (_, _, received) in enumerate(statuses):
+                if sent[receiver] != received[sender]:
+                    self.last_round = None
+                    return False
+        done = statuses == self.last_round
+        self.last_round = statuses
+        return done
+
+    def _flush(self):
+        with self.frontier.lock:
+            batches = self.buffers
+            self.buffers = [list() for _ in range(self.count)]
+        for shard, urls in enumerate(batches):
+            if not urls:
+                continue
+            sent = self._send(shard, ("urls", self.shard, urls))
+            with self.frontier.lock:
+                if sent:
+                    self.sent[shard] += len(urls)
+                else:
+                    self.buffers[shard][:0] = urls
+
+    def _send(self, shard, message):
+        with self.send_lock:
+            connection = self.connections[shard]
+            if connection is None:
+                try:
+                    connection = self.connections[shard] = Client(
+                        self.addresses[shard], authkey=self.authkey)
+                except OSError:
+                    # Not up yet; the buffer is kept and retried.
+                    return False
+            try:
+                connection.send(message)
+                return True
+            except OSError:
+                self.logger.warning(f"Lost the connection to shard {shard}.")
+                connection.close()
+                self.connections[shard] = None
+                return False
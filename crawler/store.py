@@ -0,0 +1,209 @@
+import os
+import json
+import shelve
+import time
+
+
+def open_store(config):
+    ''' Opens the frontier save file with the backend chosen by STORE in
+    config.ini. '''
+    if config.store_backend == "shelve":
+        return ShelveStore(config.save_file)
+    if config.store_backend == "log":
+        return LogStore(
+            config.save_file, config.store_sync_count,
+            config.store_sync_interval, config.store_compact_interval)
+    raise ValueError(f"Unknown STORE backend {config.store_backend}.")
+
+
+def store_files(config):
+    ''' Returns the files on disk that make up the save file. '''
+    if config.store_backend == "log":
+        return [config.save_file, LogStore.journal_path(config.save_file)]
+    return [config.save_file]
+
+
+def store_exists(config):
+    return os.path.exists(config.save_file)
+
+
+def remove_store(config):
+    for path in store_files(config):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+class ShelveStore(object):
+    ''' The original save file: a shelve that is synced on every write. '''
+    def __init__(self, save_file):
+        self.save = shelve.open(save_file)
+
+    def __contains__(self, key):
+        return key in self.save
+
+    def __getitem__(self, key):
+        return self.save[key]
+
+    def __setitem__(self, key, value):
+        self.save[key] = value
+        self.save.sync()
+
+    def __len__(self):
+        return len(self.save)
+
+    def values(self):
+        return self.save.values()
+
+    def items(self):
+        return self.save.items()
+
+    def iter_items(self):
+        ''' Streams the records of the keys present when it starts. The keys
+        are listed first: walking the dbm with firstkey/nextkey while the
+        crawl inserts into it may skip or repeat keys. '''
+        for key in list(self.save.keys()):
+            yield key, self.save[key]
+
+    def __bool__(self):
+        db = self.save.dict
+        if hasattr(db, "firstkey"):
+            return db.firstkey() is not None
+        return len(self.save) > 0
+
+    def sync(self):
+        self.save.sync()
+
+    def close(self):
+        self.save.close()
+
+
+class LogStore(object):
+    ''' Keeps the save file in memory and persists it as a snapshot plus an
+    append-only journal of json records.
+
+    Writes are buffered and group-committed (written and fsynced together)
+    once sync_count records are pending or sync_interval seconds have passed
+    since the last commit. Every compact_interval seconds the journal is
+    folded into a new snapshot. On open the snapshot is loaded and the
+    journal replayed on top of it; a torn record at the end of the journal
+    from a crash is dropped.
+
+    Not thread safe on its own; the frontier serializes access to it. '''
+
+    def __init__(self, save_file, sync_count=256, sync_interval=1.0,
+                 compact_interval=600.0):
+        self.save_file = save_file
+        self.sync_count = sync_count
+        self.sync_interval = sync_interval
+        self.compact_interval = compact_interval
+        self.data = dict()
+        self.pending = list()
+
+        if not os.path.exists(self.save_file):
+            # Create an empty snapshot so that the save file exists on disk.
+            self._write_snapshot()
+        self._load(self.save_file, repair=False)
+        self.journal_records = self._load(
+            self.journal_path(self.save_file), repair=True)
+        self.journal = open(self.journal_path(self.save_file), "a")
+        self.last_sync = time.monotonic()
+        self.last_compact = self.last_sync
+
+    @staticmethod
+    def journal_path(save_file):
+        return f"{save_file}.journal"
+
+    def __contains__(self, key):
+        return key in self.data
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+    def __setitem__(self, key, value):
+        self.data[key] = value
+        self.pending.append(json.dumps([key, value]))
+        if (len(self.pending) >= self.sync_count
+                or time.monotonic() - self.last_sync >= self.sync_interval):
+            self.sync()
+
+    def __len__(self):
+        return len(self.data)
+
+    def values(self):
+        return self.data.values()
+
+    def items(self):
+        return self.data.items()
+
+    def iter_items(self):
+        # Iterate over a copy of the keys, the crawl keeps adding to data.
+        for key in list(self.data):
+            yield key, self.data[key]
+
+    def __bool__(self):
+        return bool(self.data)
+
+    def sync(self):
+        ''' Group-commits the pending records, compacting if it is due. '''
+        self._commit()
+        self.last_sync = time.monotonic()
+        if (self.journal_records
+                and self.last_sync - self.last_compact >= self.compact_interval):
+            self.compact()
+
+    def compact(self):
+        ''' Writes the current state as a new snapshot and empties the
+        journal. '''
+        self._commit()
+        self._write_snapshot()
+        self.journal.close()
+        self.journal = open(self.journal_path(self.save_file), "w")
+        self.journal_records = 0
+        self.last_compact = time.monotonic()
+
+    def close(self):
+        self._commit()
+        self.journal.close()
+
+    def _commit(self):
+        if self.pending:
+            self.journal.write("\n".join(self.pending) + "\n")
+            self.journal.flush()
+            os.fsync(self.journal.fileno())
+            self.journal_records += len(self.pending)
+            self.pending.clear()
+
+    def _write_snapshot(self):
+        tmp_file = f"{self.save_file}.tmp"
+        with open(tmp_file, "w") as snapshot:
+            for key, value in self.data.items():
+                snapshot.write(json.dumps([key, value]) + "\n")
+            snapshot.flush()
+            os.fsync(snapshot.fileno())
+        os.replace(tmp_file, self.save_file)
+
+    def _load(self, path, repair):
+        ''' Applies the records in path to the in memory state and returns
+        how many were read. With repair, a torn record is cut off the end of
+        the file; snapshots are replaced atomically so they never need it. '''
+        if not os.path.exists(path):
+            return 0
+        count = 0
+        offset = 0
+        with open(path, "rb+") as records:
+            for line in records:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("Unterminated record.")
+                    key, value = json.loads(line)
+                except ValueError:
+                    if not repair:
+                        raise ValueError(
+                            f"{path} is not a log store save file.")
+                    # Torn write from a crash, drop it and everything after.
+                    records.truncate(offset)
+                    break
+                self.data[key] = tuple(value)
+                offset += len(line)
+                count += 1
+        return count
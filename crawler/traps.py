@@ -0,0 +1,190 @@
+from collections import OrderedDict, Counter
+from urllib.parse import urlparse
+
+from utils import url_pattern
+
+
+# Verdicts of TrapDetector.check
+ALLOW, THROTTLE, CUT = "allow", "throttle", "cut"
+
+
+class PatternStats(object):
+    ''' What the frontier knows about the urls of one url pattern. '''
+    __slots__ = ("urls", "pages", "new_links", "duplicates", "query_values")
+
+    def __init__(self):
+        self.urls = 0
+        self.pages = 0
+        self.new_links = 0
+        self.duplicates = 0
+        # Hashes of the values seen for each query parameter, each set
+        # capped just past the budget.
+        self.query_values = dict()
+
+
+class TrapDetector(object):
+    ''' Decides, from the urls the frontier has seen, whether a new url looks
+    like part of a crawler trap, replacing hand written trap rules.
+
+    A url is cut off when its path is deeper than max_depth segments or
+    repeats a segment more than max_repeats times, when its host has had
+    host_budget urls, or when its url pattern (see utils.url_pattern) has
+    had pattern_budget urls. It is throttled (queued behind the rest of its
+    host's urls) once its pattern has had half its budget, has a query
+    parameter with more than query_values distinct values, yields fewer
+    than min_yield new links per page over its first yield_pages pages, or
+    mostly gave duplicate pages (see report_duplicate).
+
+    Statistics are kept for at most max_patterns patterns and as many
+    hosts, evicting the least recently seen; an evicted pattern is no
+    longer throttled. When the frontier resumes a save file, restore counts
+    its urls against their budgets again, but the yield and duplicate
+    statistics start over. A budget of 0 is unlimited. Not thread safe; the
+    frontier serializes access to it. '''
+
+    def __init__(self, max_depth=12, max_repeats=3, host_budget=0,
+                 pattern_budget=2000, query_values=100, min_yield=0.1,
+                 yield_pages=50, duplicate_limit=5, max_patterns=100000,
+                 logger=None):
+        self.max_depth = max_depth
+        self.max_repeats = max_repeats
+        self.host_budget = host_budget
+        self.pattern_budget = pattern_budget
+        self.query_values = query_values
+        self.min_yield = min_yield
+        self.yield_pages = yield_pages
+        self.duplicate_limit = duplicate_limit
+        self.max_patterns = max_patterns
+        self.logger = logger
+        self.patterns = OrderedDict()
+        self.host_urls = OrderedDict()
+        self.throttled = dict()
+        self.cut_reasons = Counter()
+
+    @classmethod
+    def from_config(cls, config, logger=None):
+        return cls(
+            config.trap_max_depth, config.trap_max_repeats,
+            config.trap_host_budget, config.trap_pattern_budget,
+            config.trap_query_values, config.trap_min_yield,
+            config.trap_yield_pages, config.duplicate_pattern_limit,
+            config.trap_max_patterns, logger)
+
+    def check(self, url, parent=None):
+        ''' Returns ALLOW, THROTTLE or CUT for a url the frontier has not seen
+        before, found on the page at parent, and records it. '''
+        if parent is not None:
+            self._stats(url_pattern(parent)).new_links += 1
+        parsed = urlparse(url)
+        segments = [segment for segment in parsed.path.split("/") if segment]
+        if self.max_depth and len(segments) > self.max_depth:
+            return self._cut("path too deep")
+        if self.max_repeats and segments:
+            counts = dict()
+            for segment in segments:
+                counts[segment] = counts.get(segment, 0) + 1
+            if max(counts.values()) > self.max_repeats:
+                return self._cut("repeated path segments")
+        host_urls = self.host_urls.get(parsed.netloc, 0)
+        if self.host_budget and host_urls >= self.host_budget:
+            return self._cut("host budget spent")
+
+        pattern = url_pattern(url)
+        stats = self._stats(pattern)
+        if self.pattern_budget and stats.urls >= self.pattern_budget:
+            return self._cut("pattern budget spent")
+        self._count_host(parsed.netloc)
+        stats.urls += 1
+        if pattern in self.throttled:
+            return THROTTLE
+        if self.pattern_budget and 2 * stats.urls > self.pattern_budget:
+            return self._throttle(url, pattern, "half of its budget spent")
+        if self.query_values and parsed.query:
+            for part in parsed.query.split("&"):
+                name, _, value = part.partition("=")
+                values = stats.query_values.setdefault(name, set())
+                if len(values) <= self.query_values:
+                    values.add(hash(value))
+                if len(values) > self.query_values:
+                    return self._throttle(
+                        url, pattern, f"over {self.query_values} values of {name}")
+        return ALLOW
+
+    def restore(self, url):
+        ''' Counts a url of a resumed save file against the budgets of its
+        host and pattern. '''
+        self._count_host(urlparse(url).netloc)
+        self._stats(url_pattern(url)).urls += 1
+
+    def page_done(self, url):
+        ''' Counts a downloaded page of url's pattern, throttling the pattern
+        if its pages yield too few new links. '''
+        pattern = url_pattern(url)
+        stats = self._stats(pattern)
+        stats.pages += 1
+        if (self.min_yield and stats.pages == self.yield_pages
+                and stats.new_links < self.min_yield * stats.pages):
+            self._throttle(
+                url, pattern,
+                f"{stats.new_links} new links from {stats.pages} pages")
+
+    def report_duplicate(self, url, original):
+        ''' Counts a page of url's pattern that duplicated the page at
+        original, throttling the pattern once it has duplicate_limit
+        duplicates making up half of its pages. '''
+        pattern = url_pattern(url)
+        stats = self._stats(pattern)
+        stats.duplicates += 1
+        # The url itself is only counted by page_done after this.
+        pages = stats.pages + 1
+        if (pattern not in self.throttled
+                and stats.duplicates >= self.duplicate_limit
+                and 2 * stats.duplicates >= pages):
+            self._throttle(
+                url, pattern,
+                f"{stats.duplicates} of {pages} pages were duplicates, "
+                f"e.g. of {original}")
+
+    def pattern_urls(self, url):
+        ''' How many urls the pattern of url has had, for crawler.priority. '''
+        stats = self.patterns.get(url_pattern(url))
+        return stats.urls if stats is not None else 0
+
+    def is_throttled(self, url):
+        return bool(self.throttled) and url_pattern(url) in self.throttled
+
+    def report(self):
+        cuts = ", ".join(
+            f"{count} {reason}" for reason, count in self.cut_reasons.most_common())
+        return (
+            f"cut off {sum(self.cut_reasons.values())} urls ({cuts or 'none'}), "
+            f"throttled {len(self.throttled)} url patterns, tracking "
+            f"{len(self.patterns)} patterns")
+
+    def _stats(self, pattern):
+        stats = self.patterns.get(pattern)
+        if stats is None:
+            stats = self.patterns[pattern] = PatternStats()
+            if len(self.patterns) > self.max_patterns:
+                evicted, _ = self.patterns.popitem(last=False)
+                self.throttled.pop(evicted, None)
+        else:
+            self.patterns.move_to_end(pattern)
+        return stats
+
+    def _count_host(self, host):
+        # Popped and put back, so that the host becomes the most recent.
+        self.host_urls[host] = self.host_urls.pop(host, 0) + 1
+        if len(self.host_urls) > self.max_patterns:
+            self.host_urls.popitem(last=False)
+
+    def _cut(self, reason):
+        self.cut_reasons[reason] += 1
+        return CUT
+
+    def _throttle(self, url, pattern, reason):
+        if pattern not in self.throttled:
+            self.throttled[pattern] = reason
+            if self.logger is not None:
+                self.logger.info(f"Throttling urls like {url}: {reason}.")
+        return THROTTLE
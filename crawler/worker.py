@@ -1,9 +1,9 @@
 from threading import Thread
 
 from utils.download import download
-from utils import get_logger
-from scraper import scraper
-import time
+from utils import get_logger, metrics
+from scraper import scraper, record_download
+from crawler.recrawl import NEW, UNCHANGED
 
 
 class Worker(Thread):
@@ -15,16 +15,27 @@ class Worker(Thread):
         
     def run(self):
         while True:
+            # Blocks until some host is past its politeness delay, so the
+            # worker never has to sleep between downloads itself.
             tbd_url = self.frontier.get_tbd_url()
             if not tbd_url:
                 self.logger.info("Frontier is empty. Stopping Crawler.")
                 break
-            resp = download(tbd_url, self.config, self.logger)
-            self.logger.info(
-                f"Downloaded {tbd_url}, status <{resp.status}>, "
-                f"using cache {self.config.cache_server}.")
-            scraped_urls = scraper(tbd_url, resp)
-            for scraped_url in scraped_urls:
-                self.frontier.add_url(scraped_url)
+            try:
+                resp = download(tbd_url, self.config, self.logger)
+                self.logger.info(
+                    f"Downloaded {tbd_url}, status <{resp.status}>, "
+                    f"using cache {self.config.cache_server}.")
+                visit = self.frontier.visited(tbd_url, resp)
+                if visit == NEW:
+                    record_download(tbd_url)
+                # Unchanged pages of a re-crawl were already scraped.
+                if visit != UNCHANGED:
+                    scraped_urls = scraper(tbd_url, resp)
+                    for scraped_url in scraped_urls:
+                        self.frontier.add_url(scraped_url, tbd_url)
+            except Exception:
+                metrics.increment("errors.crawl")
+                self.logger.exception(f"Failed to crawl {tbd_url}.")
+            # Always release the url, otherwise its host stays busy forever.
             self.frontier.mark_url_complete(tbd_url)
-            time.sleep(self.config.time_delay)
@@ -1,17 +1,48 @@
 from configparser import ConfigParser
 from argparse import ArgumentParser
 
-from utils.server_registration import get_cache_server
+from utils.local_cache_server import get_local_cache_server, load_pages
+from utils.synthetic_web import SyntheticWeb
 from utils.config import Config
 from crawler import Crawler
+from crawler.worker import Worker
+from crawler.pipeline import ParsePipeline
+from crawler.async_worker import AsyncEngine
+from crawler.frontier import Frontier
+from crawler.sharding import ShardedFrontier, parse_shard, configure_shard
+import scraper
 
 
-def main(config_file, restart):
+def main(config_file, restart, shard=None, offline=None):
     cparser = ConfigParser()
     cparser.read(config_file)
     config = Config(cparser)
-    config.cache_server = get_cache_server(config, restart)
-    crawler = Crawler(config, restart)
+    frontier_factory = Frontier
+    pages = None
+    if offline == "synthetic":
+        pages = SyntheticWeb()
+        config.seed_urls = pages.seed_urls
+    elif offline is not None:
+        pages = load_pages(offline)
+    if shard is not None:
+        config = configure_shard(config, *parse_shard(shard))
+        frontier_factory = ShardedFrontier
+    scraper.configure(config)
+    if pages is not None:
+        config.cache_server = get_local_cache_server(pages)
+    else:
+        # Imported here so that offline crawls do not need spacetime.
+        from utils.server_registration import get_cache_server
+        config.cache_server = get_cache_server(config, restart)
+    if config.engine == "pipeline":
+        worker_factory = ParsePipeline(config)
+    elif config.engine == "async":
+        worker_factory = AsyncEngine(config)
+    else:
+        worker_factory = Worker
+    crawler = Crawler(
+        config, restart, frontier_factory=frontier_factory,
+        worker_factory=worker_factory)
     crawler.start()
 
 
@@ -19,5 +50,12 @@ if __name__ == "__main__":
     parser = ArgumentParser()
     parser.add_argument("--restart", action="store_true", default=False)
     parser.add_argument("--config_file", type=str, default="config.ini")
+    parser.add_argument(
+        "--shard", type=str, default=None,
+        help="Crawl as shard i of N (written i/N) of a sharded crawl.")
+    parser.add_argument(
+        "--offline", type=str, default=None,
+        help="Crawl a local stand-in cache server instead of the real one, "
+             "serving a recorded web (a pickled dict of pages) or 'synthetic'.")
     args = parser.parse_args()
-    main(args.config_file, args.restart)
+    main(args.config_file, args.restart, args.shard, args.offline)
@@ -1,18 +1,18 @@
-import shelve
 import re
 
+from utils.text_store import TextReader
+
 def longestPage():
-    shelf = shelve.open("Webpage_Text.shelve")
+    text_storage = TextReader("Webpage_Text.store")
     longest_page = ""
     longest_page_count = 0
-    keys = shelf.keys()
-    for key in keys:
-        words = re.split(r"[\s\-–]", shelf[key])
+    for url, webpage_text in text_storage.items():
+        words = re.split(r"[\s\-–]", webpage_text)
         word_count = len(words)
         if word_count > longest_page_count:
             longest_page_count = word_count
-            longest_page = key
-    shelf.close()
+            longest_page = url
+    text_storage.close()
     return longest_page
 
 if __name__ == '__main__':
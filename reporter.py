@@ -1,9 +1,20 @@
-import shelve
 import re
-from collections import defaultdict
+import heapq
+from collections import defaultdict, Counter
+from functools import lru_cache
+from multiprocessing import get_context
 import enchant
 from urllib.parse import urlparse
 import os
+import argparse
+
+from utils.analytics import AnalyticsIndex
+from utils.text_store import TextReader
+
+
+# A "Downloaded <url>, status <...>" record of the Worker log, with the URL as its group. Other lines, such
+# as the tracebacks of failed crawls, are skipped
+DOWNLOADED_RECORD = re.compile(r"^\S+ \S+ - \S+ - \w+ - Downloaded (\S+?),? ")
 
 
 def get_number_of_downloaded_urls(worker_log: os.path) -> int:
@@ -15,71 +26,134 @@ def get_number_of_downloaded_urls(worker_log: os.path) -> int:
 
         # Loop through the lines in the Worker log
         for next_line in log_text:
-            # Split the line accord to its whitespace
-            line_parts = next_line.split()
-
-            # If the 7th part of the line is "Downloaded", that marks a unique URL as being downloaded,
-            # so increment the amount by 1
-            if line_parts[7] == "Downloaded":
+            # A "Downloaded" record marks a unique URL as being downloaded, so increment the amount by 1
+            if DOWNLOADED_RECORD.match(next_line) is not None:
                 url_count += 1
 
     # Return the number of unique URLs crawled
     return url_count
 
 
-def get_common_words(text_storage: shelve.DbfilenameShelf, amount_of_common_words: int) -> [(str, int)]:
-    stop_words = set() # To hold the set of stop words
-    word_frequencies = defaultdict(int) # To hold the amount of occurrences for non-stop words
+# Words are the runs of characters between whitespace, dashes, and hyphens
+WORD = re.compile(r"[^\s\-–]+")
 
-    # Enchant setup adapted from their tutorial: https://pyenchant.github.io/pyenchant/tutorial.html
-    dictionary = enchant.Dict("en_US") # To validate words
+# The special characters removed from the words (if any), and what a word must be made of once they are removed
+SPECIAL_CHARACTERS = str.maketrans("", "", ".,?:!;()[]{}\"")
+ALPHABETICAL_WORD = re.compile(r"[a-zA-Z']+")
 
-    # Open up the stop_words file and read in the set of stop words
-    with open("stop_words.txt", "r") as file_input_stream:
-        for next_word in file_input_stream:
-            stop_words.add(next_word.rstrip())
+# The number of webpages sent to a word counting process at a time
+SHARD_SIZE = 64
 
-    # Loop through the text for each webpage
-    for next_webpage_text in text_storage.values():
+# To validate words, opened in each process that counts words
+dictionary = None
 
-        # Split the webpage according to all whitespace, dashes, and hyphens
-        for next_word in re.split(r"[\s\-–]", next_webpage_text):
+# To hold the set of stop words in each process that counts words
+stop_words = frozenset()
 
-            # Remove special characters from the words (if any)
-            next_word = re.sub(r"[.,?:!;()\[\]{}\"]", "", next_word)
 
-            # If the next word contains only alphabetical characters (and some special characters),
-            # is a recognizable English word, and is not a stop word, increment its frequency
-            if (re.match(r"^[a-zA-Z']+$", next_word) is not None) and \
-               dictionary.check(next_word) and \
-               (next_word.lower() not in stop_words):
-                word_frequencies[next_word.lower()] += 1
-
-    # Sort the words according to their frequency in descending order and return them
-    words_in_descending_frequency = \
-        [(next_word, frequency) for next_word, frequency in sorted(word_frequencies.items(), key=lambda x: (-x[1]))]
+def load_stop_words() -> frozenset:
+    # Open up the stop_words file and read in the set of stop words
+    with open("stop_words.txt", "r") as file_input_stream:
+        return frozenset(next_word.rstrip() for next_word in file_input_stream)
 
-    return words_in_descending_frequency[:amount_of_common_words]
 
+def start_word_counter(shared_stop_words: frozenset) -> None:
+    global dictionary, stop_words
 
-def get_longest_page(shelf: shelve.DbfilenameShelf) -> (str, int):
+    # Enchant setup adapted from their tutorial: https://pyenchant.github.io/pyenchant/tutorial.html
+    dictionary = enchant.Dict("en_US")
+    stop_words = shared_stop_words
+    is_counted_word.cache_clear()
+
+
+@lru_cache(maxsize=1 << 20)
+def is_counted_word(word: str) -> bool:
+    # Whether a word is a recognizable English word and is not a stop word. Every occurrence of a word asks the
+    # same question, so the dictionary is only checked once per distinct word
+    return dictionary.check(word) and (word.lower() not in stop_words)
+
+
+def count_words(word_counts: Counter) -> Counter:
+    # Turn the counts of the raw words into the counts of the lowercase words that get_common_words reports
+    word_frequencies = Counter()
+    for next_word, frequency in word_counts.items():
+
+        # Remove special characters from the word (if any)
+        next_word = next_word.translate(SPECIAL_CHARACTERS)
+
+        # If the word contains only alphabetical characters (and some special characters), is a recognizable
+        # English word, and is not a stop word, add its frequency
+        if (ALPHABETICAL_WORD.fullmatch(next_word) is not None) and is_counted_word(next_word):
+            word_frequencies[next_word.lower()] += frequency
+
+    return word_frequencies
+
+
+def count_shard(webpage_texts: [str]) -> Counter:
+    # The map step: count every raw word of a shard of webpages at once, then look at each distinct word once
+    word_counts = Counter()
+    for next_webpage_text in webpage_texts:
+        word_counts.update(WORD.findall(next_webpage_text))
+    return count_words(word_counts)
+
+
+def shards(webpage_texts, shard_size: int):
+    # Split the webpage texts into lists of shard_size webpages
+    shard = []
+    for next_webpage_text in webpage_texts:
+        shard.append(next_webpage_text)
+        if len(shard) == shard_size:
+            yield shard
+            shard = []
+    if shard:
+        yield shard
+
+
+def get_common_words(text_storage: TextReader, amount_of_common_words: int,
+                     processes: int = None) -> [(str, int)]:
+    # Count the words of the webpages in shards spread over a pool of processes (all cores by default), then
+    # reduce the counts of every shard into one
+    shared_stop_words = load_stop_words()
+    word_frequencies = Counter()
+    if processes == 1:
+        start_word_counter(shared_stop_words)
+        for next_shard in shards(text_storage.values(), SHARD_SIZE):
+            word_frequencies.update(count_shard(next_shard))
+    else:
+        with get_context("spawn").Pool(processes, initializer=start_word_counter,
+                                       initargs=(shared_stop_words,)) as pool:
+            for shard_frequencies in pool.imap_unordered(count_shard, shards(text_storage.values(), SHARD_SIZE)):
+                word_frequencies.update(shard_frequencies)
+
+    # Only the most frequent words are needed, so keep them in a heap instead of sorting every word
+    return heapq.nlargest(amount_of_common_words, word_frequencies.items(), key=lambda x: x[1])
+
+
+def get_common_words_from_index(index: AnalyticsIndex, amount_of_common_words: int) -> [(str, int)]:
+    # The index already holds how often each alphabetical word occurred (with its case kept), so each
+    # distinct word only needs to be spell checked once instead of once per occurrence
+    start_word_counter(load_stop_words())
+    word_frequencies = count_words(index.word_counts)
+    return heapq.nlargest(amount_of_common_words, word_frequencies.items(), key=lambda x: x[1])
+
+
+def get_longest_page(text_storage: TextReader) -> (str, int):
     # To hold the longest page and its number of words
     longest_page = ""
     longest_page_count = 0
 
-    # Get all urls from the shelve and loop through them
-    keys = shelf.keys()
-    for key in keys:
+    # Stream the urls and their text from the page text store
+    for url, webpage_text in text_storage.items():
 
         # Get the words for the current url and count its words
-        words = re.split(r"[\s\-–]", shelf[key])
+        words = re.split(r"[\s\-–]", webpage_text)
         word_count = len(words)
 
         # If the amount of words for this url is more than the previous longest page, update the longest page and
         # word amount
         if word_count > longest_page_count:
             longest_page_count = word_count
-            longest_page = key
+            longest_page = url
 
     # Return the longest page and its word amount as a 2-tuple
     return longest_page, longest_page_count
@@ -111,44 +185,59 @@ def get_ics_subdomains(worker_log: os.path) -> [(str, int)]:
         # Loop through each line of the Worker log
         for next_line in log_text:
 
-            # Split the line according to its whitespace
-            line_parts = next_line.split()
-
-            # If the part at index 7 is Downloaded, then the part at index 8 is the URL
-            # If the URL is a subdomain of ics.uci.edu, increment that subdomain's frequency
-            if (line_parts[7] == "Downloaded") and ("ics.uci.edu" in line_parts[8]):
-                ics_subdomain(line_parts[8])
+            # If the line is a "Downloaded" record of a URL that is a subdomain of ics.uci.edu, increment that
+            # subdomain's frequency
+            record = DOWNLOADED_RECORD.match(next_line)
+            if (record is not None) and ("ics.uci.edu" in record.group(1)):
+                ics_subdomain(record.group(1))
 
     # Sort the list of subdomains and their frequencies into alphabetical order
     return sorted(subdomain_dict.items())
 
 
-if __name__ == "__main__":
-    # Construct the local path for the Worker log file
-    worker_log = os.path.join("Logs", "Worker.log")
-
-    # Open the shelve that houses the URLs and their human-readable text
-    with shelve.open("Webpage_Text.shelve") as text_storage:
-        # Calculate the number of unique urls found by the crawler (the number of urls downloaded by the Worker)
-        unique_urls_found = get_number_of_downloaded_urls(worker_log)
-
-        # Calculate the 50 most common words among all downloaded webpages
-        most_common_words = get_common_words(text_storage, 50)
+def print_report(unique_urls_found, most_common_words, longest_page, longest_page_count, ics_subdomains):
+    # Print the results
+    print(f"{unique_urls_found} unique pages were found by our crawler.")
+    print(f'\nThe longest page was "{longest_page}" with {longest_page_count} words.')
 
-        # Calculate the longest downloaded webpages (by word amount)
-        longest_page, longest_page_count = get_longest_page(text_storage)
+    print("\nThe 50 most common words and their frequencies are:")
+    for next_common_word, next_frequency in most_common_words:
+        print(f"{next_common_word}, {next_frequency:}")
 
-        # Calculate all subdomains found under ics.uci.edu
-        ics_subdomains = get_ics_subdomains(worker_log)
+    print("\nThe subdomains found under ics.uci.edu and the number of unique pages detected for each is:")
+    for next_subdomain, next_page_amount in ics_subdomains:
+        print(f"http://{next_subdomain}.ics.uci.edu, {next_page_amount}")
 
-        # Print the results
-        print(f"{unique_urls_found} unique pages were found by our crawler.")
-        print(f'\nThe longest page was "{longest_page}" with {longest_page_count} words.')
 
-        print("\nThe 50 most common words and their frequencies are:")
-        for next_common_word, next_frequency in most_common_words:
-            print(f"{next_common_word}, {next_frequency:}")
-
-        print("\nThe subdomains found under ics.uci.edu and the number of unique pages detected for each is:")
-        for next_subdomain, next_page_amount in ics_subdomains:
-            print(f"http://{next_subdomain}.ics.uci.edu, {next_page_amount}")
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--index", type=str, nargs="+", default=["analytics.index"],
+                        help="The analytics index written by the crawler (ANALYTICS in config.ini), or the "
+                             "index of every shard of a sharded crawl.")
+    parser.add_argument("--rescan", action="store_true", default=False,
+                        help="Rescan the Worker log and the page text store instead of using the index.")
+    parser.add_argument("--text", type=str, default="Webpage_Text.store",
+                        help="The page text store written by the crawler (TEXTSTORE in config.ini).")
+    parser.add_argument("--processes", type=int, default=None,
+                        help="The number of processes counting words when rescanning (all cores by default).")
+    args = parser.parse_args()
+
+    if args.rescan:
+        # Construct the local path for the Worker log file
+        worker_log = os.path.join("Logs", "Worker.log")
+
+        # Open the page text store that houses the URLs and their human-readable text
+        with TextReader(args.text) as text_storage:
+            print_report(get_number_of_downloaded_urls(worker_log),
+                         get_common_words(text_storage, 50, args.processes),
+                         *get_longest_page(text_storage),
+                         get_ics_subdomains(worker_log))
+    else:
+        # Everything the report needs was counted by the crawler as it went
+        index = AnalyticsIndex()
+        for next_index in args.index:
+            index.merge(AnalyticsIndex.load(next_index))
+        print_report(index.downloaded,
+                     get_common_words_from_index(index, 50),
+                     *index.longest_page(),
+                     sorted(index.ics_subdomains.items()))
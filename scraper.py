@@ -1,12 +1,72 @@
 import re
-from urllib.parse import urlparse, urldefrag
-from bs4 import BeautifulSoup
-import shelve
+import time
+from threading import Lock, RLock
+
+from utils.url_filter import UrlFilter
+from utils.link_extractor import get_extractor
+from utils.analytics import AnalyticsIndex
+from utils.text_store import TextStore
+from utils.fingerprint import fingerprint, DuplicateIndex
+from utils import metrics
+
+
+# The compiled url filter used by is_valid, replaced by configure() when the
+# config file has its own [FILTER] rules
+url_filter = UrlFilter()
+
+# Takes (url, content) and returns the page's links and text, chosen by
+# EXTRACTOR in the config file
+extract = get_extractor("stream")
+
+# The page text store (see utils/text_store.py), kept open for the whole crawl. It is opened on the
+# first page stored, so that parser processes never open it
+text_store_file = "Webpage_Text.store"
+text_store_buffer_size = 1 << 20
+text_store = None
+text_store_lock = Lock()
+
+# The fingerprints of the pages crawled so far (see utils/fingerprint.py). Pages that duplicate one
+# of them are not stored and their links are not followed, and the frontier is told about them
+duplicates = DuplicateIndex()
+duplicates_lock = Lock()
+duplicate_listener = None
+
+# Called with (url, canonical) for pages declaring another url as their canonical url (set by the
+# crawler to the frontier's canonical_page when RELCANONICAL is on); False means the page is a duplicate
+canonical_listener = None
+
+# Called with (url, fingerprint) for every distinct page (set by the crawler to the frontier's
+# page_fingerprint when re-crawling, see crawler/recrawl.py)
+fingerprint_listener = None
+
+# The analytics index that reporter.py reads (see utils/analytics.py). It is only loaded from the
+# ANALYTICS file once something is recorded, so that parser processes never load it
+analytics_file = "analytics.index"
+analytics_save_interval = 60
+analytics = None
+analytics_saved = time.monotonic()
+analytics_lock = RLock()
+# Copies of the index are written out under their own lock, so that workers never wait for the pickling.
+# analytics_written is when the last copy written was taken, so that an older copy never replaces it
+analytics_write_lock = Lock()
+analytics_written = 0.0
+
+
+def configure(config):
+    global url_filter, extract, analytics_file, analytics_save_interval, text_store_file, text_store_buffer_size, \
+        duplicates
+    url_filter = UrlFilter.from_config(config)
+    extract = get_extractor(config.extractor)
+    duplicates = DuplicateIndex(config.duplicate_bits) if config.duplicate_bits >= 0 else None
+    text_store_file = config.text_store_file
+    text_store_buffer_size = config.text_store_buffer_size
+    analytics_file = config.analytics_file
+    analytics_save_interval = config.analytics_save_interval
 
 
 def scraper(url, resp):
     links = extract_next_links(url, resp)
-    return [link for link in links if is_valid(link)]
+    return filter_links(links)
 
 
 def extract_next_links(url, resp):
@@ -14,70 +74,199 @@ def extract_next_links(url, resp):
 
     # Check and ensure the url response was valid (no errors nor non-OK status)
     if (resp.error is None) and (resp.status == 200):
-        # BeautifulSoup setup adapted from their Quick Start https://www.crummy.com/software/BeautifulSoup/bs4/doc/
+        url_list, webpage_text, page_fingerprint, canonical = parse_page(url, resp.text)
+        if not is_new_content(url, page_fingerprint, canonical):
+            return []
+        store_page_text(url, webpage_text)
 
-        # Initiate the HTML parser for the downloaded webpage
-        soup = BeautifulSoup(resp.raw_response.content, "lxml") # Requires lxml parser library
+    # Return the defragmented list of links
+    return url_list
 
-        # Scrape all human-readable text from the webpage
-        webpage_text = soup.get_text()
 
-        # If the webpage contains a significant amount of content (at least 200 words),
-        # store the text in the text storage shelve, and associate it with the current URL
-        if has_substantial_information(webpage_text, 200):
-            with shelve.open("Webpage_Text.shelve") as text_storage:
-                text_storage[url] = webpage_text
-                text_storage.sync()
+def scrape_content(url, content):
+    # The scraper for an already downloaded OK page, split from storing its text so that it can
+    # run in a separate process (see crawler/pipeline.py). Returns the valid links, the text
+    # to store (if any), the page's analytics to merge into the crawler's index, and its fingerprint
+    # and canonical url for is_new_content
+    url_list, webpage_text, page_fingerprint, canonical = parse_page(url, content)
+    page_analytics = AnalyticsIndex.for_page(url, webpage_text) if webpage_text is not None else None
+    return filter_links(url_list), webpage_text, page_analytics, page_fingerprint, canonical
 
-        # Loop through <a> tags in the HTML
-        for next_attribute in soup.find_all('a'):
-            # Get the link from the <a> tag
-            next_link = next_attribute.get('href')
 
-            # If the link is valid, add it to the list
-            if next_link is not None:
-                url_list.append(urldefrag(next_link)[0].strip()) # Defrag and strip the link before adding to the list
+def filter_links(url_list):
+    # Keep only the valid links (see is_valid), counting how many were found and filtered out
+    with metrics.timer("filter"):
+        valid_urls = url_filter.filter(url_list)
+    metrics.increment("links.found", len(url_list))
+    metrics.increment("links.filtered", len(url_list) - len(valid_urls))
+    return valid_urls
 
-    # Return the filtered list of links
-    return url_list
+
+def parse_page(url, content):
+    # The content is the page's bytes or its already decoded text (resp.text)
+
+    # Parse the downloaded webpage for its links (resolved against the page url in the
+    # "stream" extractor), all of its human-readable text and its <link rel="canonical"> url, if
+    # any (see utils/link_extractor.py)
+    with metrics.timer("parse"):
+        url_list, webpage_text, canonical = extract(url, content)
+
+    # Fingerprint all of the text, so that short duplicate pages are caught too
+    with metrics.timer("fingerprint"):
+        page_fingerprint = fingerprint(webpage_text) if duplicates is not None else None
+
+    # Only keep the text if the webpage contains a significant amount of content (at least 200 words)
+    if not has_substantial_information(webpage_text, 200):
+        webpage_text = None
+
+    return url_list, webpage_text, page_fingerprint, canonical
+
+
+def is_new_content(url, page_fingerprint, canonical=None):
+    # A page whose canonical url was already crawled is a copy of that page, and otherwise it stands
+    # in for its canonical url, which the canonical listener (the frontier) then never downloads
+    if canonical is not None and canonical_listener is not None and not canonical_listener(url, canonical):
+        metrics.increment("pages.canonical_duplicate")
+        return False
+
+    # Check the page's fingerprint against every page crawled so far. Duplicate (and near duplicate)
+    # pages are reported to the duplicate listener (the frontier) and should not be stored or followed
+    if page_fingerprint is None:
+        return True
+    with duplicates_lock:
+        original = duplicates.add(url, page_fingerprint)
+    # A page that changed since an earlier crawl is not a duplicate of its old self
+    if original is None or original == url:
+        if fingerprint_listener is not None:
+            fingerprint_listener(url, page_fingerprint)
+        return True
+    metrics.increment("pages.duplicate")
+    if duplicate_listener is not None:
+        duplicate_listener(url, original)
+    return False
+
+
+def set_duplicate_listener(listener):
+    # listener(url, original) is called for every duplicate page found
+    global duplicate_listener
+    duplicate_listener = listener
+
+
+def set_canonical_listener(listener):
+    # listener(url, canonical) is called for every page with a canonical url, see is_new_content
+    global canonical_listener
+    canonical_listener = listener
+
+
+def set_fingerprint_listener(listener):
+    # listener(url, fingerprint) is called for every distinct page, see is_new_content
+    global fingerprint_listener
+    fingerprint_listener = listener
+
+
+def remember_page(url, page_fingerprint):
+    # Add a page crawled before to the duplicate index, so that a re-crawl finds the duplicates of
+    # pages it does not parse again
+    if duplicates is not None:
+        with duplicates_lock:
+            duplicates.add(url, page_fingerprint)
+
+
+def store_page_text(url, webpage_text, page_analytics=None):
+    # Store the text in the page text store, and associate it with the current URL
+    if webpage_text is not None:
+        # A page stored again changed since an earlier crawl; its old text is read back first, to take
+        # its word counts out of the analytics index
+        store = get_text_store()
+        with analytics_lock:
+            stored_before = url in get_analytics().page_lengths
+        previous_text = store[url] if stored_before and url in store else ""
+        with metrics.timer("store"):
+            store[url] = webpage_text
+        metrics.increment("pages.stored")
+
+        # Add the page's word counts to the analytics index
+        if page_analytics is None:
+            page_analytics = AnalyticsIndex.for_page(url, webpage_text)
+        with analytics_lock:
+            if stored_before:
+                analytics.forget_page(url, previous_text)
+            analytics.merge(page_analytics)
+            snapshot = analytics_snapshot_if_due()
+        write_analytics(snapshot)
+
+
+def get_text_store():
+    global text_store
+    with text_store_lock:
+        if text_store is None:
+            text_store = TextStore(text_store_file, text_store_buffer_size)
+        return text_store
+
+
+def close_text_store():
+    # Write out the page texts still buffered by the page text store (done once the crawl ends)
+    global text_store
+    with text_store_lock:
+        if text_store is not None:
+            text_store.close()
+            text_store = None
+
+
+def record_download(url):
+    # Count a downloaded url (and its ics.uci.edu subdomain) in the analytics index
+    with analytics_lock:
+        get_analytics().record_download(url)
+        snapshot = analytics_snapshot_if_due()
+    write_analytics(snapshot)
+
+
+def get_analytics():
+    global analytics
+    if analytics is None:
+        analytics = AnalyticsIndex.load(analytics_file)
+    return analytics
+
+
+def analytics_snapshot_if_due():
+    # Called with analytics_lock held: a copy of the analytics index to write_analytics, if a save is due
+    if time.monotonic() - analytics_saved >= analytics_save_interval:
+        return analytics_snapshot()
+    return None
+
+
+def analytics_snapshot():
+    global analytics_saved
+    with analytics_lock:
+        analytics_saved = time.monotonic()
+        return (analytics_saved, analytics.copy()) if analytics is not None else None
+
+
+def write_analytics(snapshot):
+    # Write a copy of the analytics index to the ANALYTICS file, outside analytics_lock
+    global analytics_written
+    if snapshot is None:
+        return
+    taken, index = snapshot
+    with analytics_write_lock:
+        if taken >= analytics_written:
+            index.save(analytics_file)
+            analytics_written = taken
+
+
+def save_analytics():
+    # Write the analytics index to the ANALYTICS file (done periodically and once the crawl ends)
+    write_analytics(analytics_snapshot())
 
 
 def is_valid(url):
     try:
-        parsed = urlparse(url)
-
-        if parsed.scheme not in ["http", "https"]:
-            return False
-
-        # Ensure the url is within one of the valid domains and paths
-        elif not ((re.match(r"^(.+\.)(ics\.uci\.edu)$", parsed.netloc)) or
-                  (re.match(r"^(.+\.)(cs\.uci\.edu)$", parsed.netloc)) or
-                  (re.match(r"^(.+\.)(informatics\.uci\.edu)$", parsed.netloc)) or
-                  (re.match(r"^(.+\.)(stat\.uci\.edu)$", parsed.netloc)) or
-                  ((parsed.netloc == "today.uci.edu") and
-                   (re.match(r"^(/department/information_computer_sciences/)(.+)$", parsed.path)))):
-            return False
-
-        # Ensure potential traps are not included in the url
-        potential_traps = ["/event/", "/events/", "calendar", "date", "gallery", "image",
-                           "wp-content", "index.php", "upload", "/pdf", "attachment/",
-                           "?replytocom=", "?version=", "?share=", "?redirect=", "?redirect_to=", "?action="]
-        for trap in potential_traps:
-            if trap in url:
-                return False
-
-        return not re.match(
-            r".*\.(css|js|java|r|py|c|m|bmp|gif|jpe?g|ico"
-            + r"|png|tiff?|mid|mp2|mp3|mp4"
-            + r"|wav|avi|mov|mpeg|ram|m4v|mkv|odc|ogg|ogv|pdf"
-            + r"|ps|eps|tex|ppt|pptx|ppsx|ss|scm|txt|doc|docx|xls|xlsx|names"
-            + r"|data|dat|exe|bz2|tar|msi|bin|7z|psd|z|dmg|iso"
-            + r"|epub|dll|cnf|tgz|sha1"
-            + r"|thmx|mso|arff|rtf|jar|csv"
-            + r"|rm|smil|wmv|swf|wma|zip|rar|gz)$", parsed.path.lower())
+        # Checks the scheme, the allowed domains and paths, potential traps and
+        # non-webpage extensions (see utils/url_filter.py)
+        return url_filter.is_valid(url)
 
     except TypeError:
-        print ("TypeError for ", parsed)
+        print ("TypeError for ", url)
         raise
 
 
@@ -0,0 +1,55 @@
+import os
+import sys
+import tempfile
+import unittest
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.analytics import AnalyticsIndex
+import scraper
+
+URL = "https://www.ics.uci.edu/news"
+OTHER = "https://www.ics.uci.edu/people"
+
+
+class AnalyticsTest(unittest.TestCase):
+    def setUp(self):
+        # The scraper keeps its text store and analytics index in the working directory.
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+        scraper.analytics = None
+
+    def tearDown(self):
+        scraper.close_text_store()
+        scraper.analytics = None
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def test_changed_page_replaces_its_counts(self):
+        scraper.store_page_text(URL, "old news about robots and robots")
+        scraper.store_page_text(OTHER, "faculty and students")
+        # A re-crawl stores the page again after it changed.
+        scraper.store_page_text(URL, "new news about vision")
+        expected = AnalyticsIndex.for_page(OTHER, "faculty and students")
+        expected.merge(AnalyticsIndex.for_page(URL, "new news about vision"))
+        index = scraper.get_analytics()
+        self.assertEqual(index.word_counts, expected.word_counts)
+        self.assertEqual(index.page_lengths, expected.page_lengths)
+        self.assertNotIn("robots", index.word_counts)
+
+    def test_saved_copy(self):
+        scraper.record_download(URL)
+        scraper.store_page_text(URL, "news about robots")
+        scraper.save_analytics()
+        # Changes after the save are not in the file.
+        scraper.store_page_text(OTHER, "faculty")
+        saved = AnalyticsIndex.load(scraper.analytics_file)
+        self.assertEqual(saved.downloaded, 1)
+        self.assertEqual(saved.word_counts, Counter({"news": 1, "about": 1, "robots": 1}))
+        self.assertEqual(list(saved.page_lengths), [URL])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+import os
+import sys
+import tempfile
+import unittest
+from configparser import ConfigParser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.config import Config
+from crawler.frontier import Frontier
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PAGE = "http://www.ics.uci.edu/about"
+OTHER = "http://www.ics.uci.edu/people"
+
+
+class CanonicalPageTest(unittest.TestCase):
+    def setUp(self):
+        # The frontier logs to Logs/ and saves to SAVE in the working directory.
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+        self.frontier = Frontier(self.make_config(), True)
+
+    def make_config(self, recrawl=False):
+        cparser = ConfigParser()
+        cparser.read(os.path.join(ROOT, "config.ini"))
+        cparser["CRAWLER"]["SEEDURL"] = f"{PAGE},{OTHER}"
+        cparser["LOCAL PROPERTIES"]["STORE"] = "log"
+        cparser["ROBOTS"]["ENABLED"] = "false"
+        if recrawl:
+            cparser["RECRAWL"]["ENABLED"] = "true"
+            cparser["RECRAWL"]["INITIALINTERVAL"] = "0"
+            cparser["RECRAWL"]["MININTERVAL"] = "0"
+        return Config(cparser)
+
+    def tearDown(self):
+        self.frontier.close()
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def download(self):
+        url = self.frontier.get_tbd_url()
+        self.frontier.mark_url_complete(url)
+        return url
+
+    def test_https_self_canonical(self):
+        # An http page naming its own https url is the same page.
+        self.assertEqual(self.download(), PAGE)
+        self.assertTrue(self.frontier.canonical_page(PAGE, PAGE.replace("http:", "https:")))
+
+    def test_canonical_queued_under_other_scheme(self):
+        # The page stands in for its canonical url, queued as http.
+        self.assertEqual(self.download(), PAGE)
+        self.assertTrue(self.frontier.canonical_page(PAGE, OTHER.replace("http:", "https:")))
+        self.assertNotIn(OTHER, self.frontier.pending)
+        self.assertIsNone(self.frontier.get_tbd_url())
+
+    def test_canonical_already_downloaded(self):
+        self.assertEqual(self.download(), PAGE)
+        self.assertEqual(self.download(), OTHER)
+        self.assertFalse(self.frontier.canonical_page(OTHER, PAGE))
+
+    def test_canonical_not_revisited(self):
+        # Re-crawling revisits the page but not the url it stood in for.
+        self.frontier.close()
+        self.frontier = Frontier(self.make_config(recrawl=True), True)
+        self.assertEqual(self.download(), PAGE)
+        self.assertTrue(self.frontier.canonical_page(PAGE, OTHER))
+        self.frontier.close()
+        self.frontier = Frontier(self.make_config(recrawl=True), False)
+        self.assertEqual(sorted(self.frontier.pending), [PAGE])
+
+
+if __name__ == "__main__":
+    unittest.main()
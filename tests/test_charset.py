@@ -0,0 +1,106 @@
+import os
+import sys
+import pickle
+import asyncio
+import tempfile
+import unittest
+from threading import Lock
+from types import SimpleNamespace
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+
+from utils.response import Response
+from crawler import pipeline
+from crawler.async_worker import AsyncWorker
+from crawler.recrawl import NEW
+import scraper
+
+
+URL = "https://www.ics.uci.edu/~ru/"
+# A KOI8-R page whose charset is only in the Content-Type header: decoded
+# without it (utf-8, then windows-1252) its text comes out garbled.
+WORDS = "Информатика и вычислительная техника"
+# With enough latin words (200) for its text to be kept.
+PAGE = (f"<html><body><h1>{WORDS}</h1><p>{'computer science ' * 100}</p>"
+        f"<a href='/a'>a</a></body></html>").encode("koi8-r")
+
+
+def koi8_response():
+    raw_response = requests.Response()
+    raw_response.status_code = 200
+    raw_response.headers["Content-Type"] = "text/html; charset=koi8-r"
+    raw_response._content = PAGE
+    return Response({"url": URL, "status": 200, "response": pickle.dumps(raw_response)})
+
+
+class OneUrlFrontier(object):
+    def __init__(self):
+        self.urls = [URL]
+
+    def get_tbd_url(self):
+        return self.urls.pop() if self.urls else None
+
+    def visited(self, url, resp):
+        return NEW
+
+
+class CharsetTest(unittest.TestCase):
+    def setUp(self):
+        # The workers log to Logs/ in the working directory.
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def test_header_charset(self):
+        resp = koi8_response()
+        self.assertIn(WORDS, resp.text)
+        _, webpage_text, _, _, _ = scraper.scrape_content(URL, resp.text)
+        self.assertIn(WORDS, webpage_text)
+        _, webpage_text, _, _, _ = scraper.scrape_content(URL, resp.content)
+        self.assertNotIn(WORDS, webpage_text)
+
+    def test_pipeline_parses_text(self):
+        submitted = list()
+        parse_pipeline = SimpleNamespace(
+            lock=Lock(), downloading=0, submit=lambda url, content: submitted.append(content),
+            skip=lambda url: None, fetcher_done=lambda: None)
+        config = SimpleNamespace(cache_server=None)
+        with mock.patch.object(pipeline, "download", lambda url, config, logger: koi8_response()), \
+                mock.patch.object(scraper, "record_download"):
+            pipeline.Fetcher(0, config, OneUrlFrontier(), parse_pipeline).run()
+        self.assertEqual(len(submitted), 1)
+        self.assertIn(WORDS, scraper.scrape_content(URL, submitted[0])[1])
+
+    def test_async_parses_text(self):
+        async def download(url):
+            return koi8_response()
+
+        # parsers=None parses in the loop's default thread pool.
+        engine = SimpleNamespace(parsers=None, downloader=SimpleNamespace(download=download))
+        config = SimpleNamespace(cache_server=None)
+        worker = AsyncWorker(0, config, OneUrlFrontier(), engine)
+        completed = list()
+        worker._complete = lambda url, scraped_urls, webpage_text, *result: completed.append(webpage_text)
+
+        async def fetch_one():
+            worker.urls = asyncio.Queue()
+            worker.url_done = asyncio.Event()
+            await worker.urls.put(URL)
+            await worker.urls.put(None)
+            await worker._fetch()
+
+        with mock.patch.object(scraper, "record_download"):
+            asyncio.run(fetch_one())
+        self.assertEqual(len(completed), 1)
+        self.assertIn(WORDS, completed[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+import os
+import sys
+import time
+import tempfile
+import unittest
+from collections import defaultdict
+from configparser import ConfigParser
+from urllib.parse import urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.config import Config
+from utils.local_cache_server import LocalCacheServer
+from utils.synthetic_web import SyntheticWeb
+from crawler import Crawler
+from crawler.frontier import Frontier
+import scraper
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+POLITENESS = 0.1
+
+
+class TimedCacheServer(LocalCacheServer):
+    ''' Records when each url was requested. '''
+
+    def __init__(self, pages):
+        super().__init__(pages)
+        self.times = list()
+
+    def respond(self, url, user_agent):
+        with self.lock:
+            self.times.append((time.monotonic(), url))
+        return super().respond(url, user_agent)
+
+
+class StoppingFrontier(Frontier):
+    ''' Hands out max_urls urls, then stops the crawl as if it was killed. '''
+    max_urls = None
+
+    def __init__(self, config, restart):
+        self.handed_out = list()
+        super().__init__(config, restart)
+
+    def try_get_tbd_url(self):
+        with self.lock:
+            if self.max_urls is not None and len(self.handed_out) >= self.max_urls:
+                return None, None
+            url, wait = super().try_get_tbd_url()
+            if url is not None:
+                self.handed_out.append(url)
+            return url, wait
+
+
+class CrawlTest(unittest.TestCase):
+    def setUp(self):
+        # The crawler keeps its save file, logs, text store and analytics
+        # index in the working directory.
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+        self.web = SyntheticWeb(hosts=2, pages_per_host=15)
+        self.server = TimedCacheServer(self.web)
+        self.cache_server = self.server.start()
+        scraper.analytics = None
+
+    def tearDown(self):
+        self.server.stop()
+        scraper.analytics = None
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def crawl(self, restart, max_urls=None):
+        cparser = ConfigParser()
+        cparser.read(os.path.join(ROOT, "config.ini"))
+        cparser["CRAWLER"]["SEEDURL"] = ",".join(self.web.seed_urls)
+        cparser["CRAWLER"]["POLITENESS"] = str(POLITENESS)
+        cparser["LOCAL PROPERTIES"]["THREADCOUNT"] = "4"
+        cparser["LOCAL PROPERTIES"]["STORE"] = "log"
+        cparser["BUDGETS"]["PATTERNBUDGET"] = "10"
+        cparser["METRICS"]["SNAPSHOT"] = ""
+        config = Config(cparser)
+        config.cache_server = self.cache_server
+        scraper.configure(config)
+        StoppingFrontier.max_urls = max_urls
+        crawler = Crawler(config, restart, frontier_factory=StoppingFrontier)
+        crawler.start()
+        return crawler.frontier.handed_out
+
+    def test_politeness(self):
+        self.crawl(True)
+        last = dict()
+        gaps = defaultdict(list)
+        for requested, url in sorted(self.server.times):
+            host = urlparse(url).netloc
+            if host in last:
+                gaps[host].append(requested - last[host])
+            last[host] = requested
+        self.assertIn("h0.ics.uci.edu", gaps)
+        for host, host_gaps in gaps.items():
+            self.assertGreater(min(host_gaps), 0.8 * POLITENESS, host)
+
+    def test_resume_skips_completed_urls(self):
+        first = self.crawl(True, max_urls=10)
+        self.assertEqual(len(first), 10)
+        requested = len(self.server.times)
+        second = self.crawl(False)
+        self.assertTrue(second)
+        self.assertEqual(set(first) & set(second), set())
+        resumed_urls = {url for _, url in self.server.times[requested:]}
+        self.assertEqual(set(first) & resumed_urls, set())
+
+
+if __name__ == "__main__":
+    unittest.main()
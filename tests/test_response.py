@@ -0,0 +1,48 @@
+import os
+import sys
+import pickle
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.response import Response
+from utils.local_cache_server import make_raw_response
+
+URL = "https://www.ics.uci.edu/page"
+HEADERS = {"Content-Type": "text/html; charset=koi8-r", "ETag": "\"v1\""}
+PAGE = "<html><body>Информатика</body></html>".encode("koi8-r")
+
+
+def reply(status=200, with_headers=True):
+    raw_response = make_raw_response(URL, status, PAGE, HEADERS)
+    resp_dict = {"url": URL, "status": status, "response": pickle.dumps(raw_response)}
+    if with_headers:
+        resp_dict["headers"] = dict(raw_response.headers)
+    return resp_dict
+
+
+class ResponseTest(unittest.TestCase):
+    def test_headers_leave_body_pickled(self):
+        resp = Response(reply())
+        self.assertEqual(resp.headers.get("etag"), "\"v1\"")
+        self.assertIsNotNone(resp._payload)
+        self.assertIsNone(resp._raw_response)
+        # The charset comes from the headers, the body is unpickled once.
+        self.assertIn("Информатика", resp.text)
+        self.assertIsNone(resp._payload)
+
+    def test_headers_from_pickled_response(self):
+        # A reply with only the pickled response, as the real cache server's.
+        resp = Response(reply(with_headers=False))
+        self.assertEqual(resp.headers.get("ETag"), "\"v1\"")
+        self.assertIn("Информатика", resp.text)
+
+    def test_error_reply(self):
+        resp = Response({"url": URL, "status": 604, "error": "not in the cache"})
+        self.assertEqual(resp.headers.get("Content-Type"), None)
+        self.assertEqual(resp.content, b"")
+        self.assertEqual(resp.text, "")
+
+
+if __name__ == "__main__":
+    unittest.main()
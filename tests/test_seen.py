@@ -0,0 +1,102 @@
+import os
+import sys
+import random
+import tempfile
+import unittest
+from configparser import ConfigParser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import get_urlhash
+from utils.config import Config
+from crawler.frontier import Frontier
+from crawler.seen import DigestSet, BloomFilter, url_digest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def random_digests(count, seed):
+    rand = random.Random(seed)
+    return [rand.getrandbits(64) or 1 for _ in range(count)]
+
+
+class DigestSetTest(unittest.TestCase):
+    def test_add_and_contains(self):
+        digests = DigestSet()
+        for digest in (1, 2, 3, 2):
+            digests.add(digest)
+        self.assertEqual(len(digests), 3)
+        self.assertIn(2, digests)
+        self.assertNotIn(4, digests)
+
+    def test_colliding_slots(self):
+        # Digests with the same low bits probe the same slots.
+        digests = DigestSet(capacity=8)
+        for high in range(1, 6):
+            digests.add(high << 32)
+        self.assertTrue(all(high << 32 in digests for high in range(1, 6)))
+        self.assertNotIn(6 << 32, digests)
+
+    def test_grow(self):
+        digests = DigestSet(capacity=8)
+        added = random_digests(10000, 0)
+        for digest in added:
+            digests.add(digest)
+        self.assertEqual(len(digests), len(set(added)))
+        self.assertLessEqual(len(digests), digests.max_load * len(digests.slots))
+        self.assertTrue(all(digest in digests for digest in added))
+        self.assertFalse(any(digest in digests for digest in random_digests(10000, 1)))
+
+
+class BloomFilterTest(unittest.TestCase):
+    def test_false_positive_rate(self):
+        error_rate = 0.01
+        bloom = BloomFilter(20000, error_rate)
+        added = random_digests(20000, 0)
+        for digest in added:
+            bloom.add(digest)
+        self.assertTrue(all(digest in bloom for digest in added))
+        others = random_digests(50000, 1)
+        measured = sum(digest in bloom for digest in others) / len(others)
+        self.assertLess(measured, 1.5 * error_rate)
+        self.assertAlmostEqual(bloom.false_positive_rate(), error_rate, delta=error_rate / 2)
+
+
+class BloomHitTest(unittest.TestCase):
+    def setUp(self):
+        # The frontier logs to Logs/ and saves to SAVE in the working directory.
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+        cparser = ConfigParser()
+        cparser.read(os.path.join(ROOT, "config.ini"))
+        cparser["CRAWLER"]["SEEDURL"] = "https://www.ics.uci.edu/a"
+        cparser["LOCAL PROPERTIES"]["STORE"] = "log"
+        cparser["LOCAL PROPERTIES"]["SEENINDEX"] = "bloom"
+        cparser["LOCAL PROPERTIES"]["SEENCAPACITY"] = "1000"
+        cparser["ROBOTS"]["ENABLED"] = "false"
+        self.frontier = Frontier(Config(cparser), True)
+
+    def tearDown(self):
+        self.frontier.close()
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def test_false_positive_confirmed_in_store(self):
+        url = "https://www.ics.uci.edu/b"
+        # A false positive: the filter has the url, the save file does not.
+        self.frontier.seen.add(url_digest(get_urlhash(url)))
+        lookups = self.frontier.store_lookups
+        self.frontier.add_url(url)
+        self.assertIn(url, self.frontier.pending)
+        self.assertEqual(self.frontier.store_lookups, lookups + 1)
+
+    def test_hit_in_store(self):
+        url = "https://www.ics.uci.edu/a"
+        self.frontier.add_url(url)
+        self.assertEqual(self.frontier.dedup_hits, 1)
+        self.assertEqual(len(self.frontier.pending), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+import os
+import sys
+import socket
+import tempfile
+import unittest
+from collections import Counter
+from configparser import ConfigParser
+from multiprocessing import get_context
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.config import Config
+from utils.local_cache_server import LocalCacheServer
+from utils.synthetic_web import SyntheticWeb
+from crawler.sharding import ShardRing
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SHARDS = 3
+
+
+def free_port():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+def crawl_shard(index, options, cache_server):
+    # Runs in its own process, like launch.py --shard index/SHARDS.
+    from crawler import Crawler
+    from crawler.sharding import ShardedFrontier, configure_shard
+    import scraper
+
+    cparser = ConfigParser()
+    cparser.read(os.path.join(ROOT, "config.ini"))
+    for (section, key), value in options.items():
+        cparser[section][key] = value
+    config = Config(cparser)
+    config.cache_server = cache_server
+    config = configure_shard(config, index, SHARDS)
+    scraper.configure(config)
+    Crawler(config, True, frontier_factory=ShardedFrontier).start()
+
+
+class ShardingTest(unittest.TestCase):
+    def setUp(self):
+        # The shards keep their save files, logs, text stores and analytics
+        # indexes in the working directory.
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def test_every_url_downloaded_once(self):
+        web = SyntheticWeb(hosts=6, pages_per_host=15)
+        server = LocalCacheServer(web)
+        cache_server = server.start()
+        addresses = ", ".join(f"127.0.0.1:{free_port()}" for _ in range(SHARDS))
+        options = {
+            ("CRAWLER", "SEEDURL"): ",".join(web.seed_urls),
+            ("CRAWLER", "POLITENESS"): "0.05",
+            ("LOCAL PROPERTIES", "THREADCOUNT"): "4",
+            ("LOCAL PROPERTIES", "STORE"): "log",
+            ("BUDGETS", "PATTERNBUDGET"): "10",
+            ("METRICS", "SNAPSHOT"): "",
+            ("SHARDS", "ADDRESSES"): addresses,
+            ("SHARDS", "INTERVAL"): "0.1",
+        }
+        context = get_context("spawn")
+        shards = [
+            context.Process(target=crawl_shard, args=(index, options, cache_server))
+            for index in range(SHARDS)]
+        for shard in shards:
+            shard.start()
+        for shard in shards:
+            shard.join(120)
+        server.stop()
+        self.assertEqual([shard.exitcode for shard in shards], [0] * SHARDS)
+
+        # Each host has one owner, so no url (robots.txt included) is
+        # downloaded twice, and the hosts that are not seeds were reached
+        # through links forwarded between the shards.
+        requests = Counter(url for url, _ in server.requests)
+        self.assertEqual([url for url, count in requests.items() if count > 1], [])
+        for host in web.hosts:
+            self.assertIn(f"https://{host}/robots.txt", requests)
+            self.assertTrue(any(url.startswith(f"https://{host}/page/") for url in requests), host)
+        ring = ShardRing(SHARDS)
+        self.assertEqual({ring.owner(host) for host in web.hosts}, set(range(SHARDS)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.text_store import TextStore, TextReader
+
+URL = "https://www.ics.uci.edu/news"
+
+
+class TextStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "Webpage_Text.store")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_empty_file(self):
+        open(self.path, "wb").close()
+        with TextReader(self.path) as reader:
+            self.assertEqual(len(reader), 0)
+            self.assertEqual(list(reader.items()), [])
+            self.assertNotIn(URL, reader)
+
+    def test_before_first_flush(self):
+        store = TextStore(self.path, flush_interval=60)
+        store[URL] = "news about robots"
+        with TextReader(self.path) as reader:
+            self.assertEqual(len(reader), 0)
+        store.close()
+        with TextReader(self.path) as reader:
+            self.assertEqual(dict(reader.items()), {URL: "news about robots"})
+
+    def test_store_again(self):
+        store = TextStore(self.path, flush_interval=60)
+        store[URL] = "old news"
+        self.assertEqual(store[URL], "old news")
+        store[URL] = "new news"
+        self.assertEqual(store[URL], "new news")
+        store.close()
+        with TextReader(self.path) as reader:
+            self.assertEqual(reader[URL], "new news")
+
+
+if __name__ == "__main__":
+    unittest.main()
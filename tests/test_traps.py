@@ -0,0 +1,81 @@
+import os
+import sys
+import time
+import tempfile
+import unittest
+from configparser import ConfigParser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.config import Config
+from crawler.frontier import Frontier
+from crawler.traps import TrapDetector, ALLOW, THROTTLE, CUT
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class TrapDetectorTest(unittest.TestCase):
+    def test_throttled_patterns_evicted_with_their_stats(self):
+        traps = TrapDetector(pattern_budget=4, max_patterns=2)
+        for number in range(3):
+            traps.check(f"https://a.ics.uci.edu/news/{number}")
+        self.assertTrue(traps.is_throttled("https://a.ics.uci.edu/news/9"))
+        traps.check("https://a.ics.uci.edu/people/x/1")
+        traps.check("https://a.ics.uci.edu/courses/x/y/1")
+        self.assertEqual(len(traps.patterns), 2)
+        self.assertFalse(traps.is_throttled("https://a.ics.uci.edu/news/9"))
+        self.assertEqual(traps.throttled, dict())
+
+    def test_host_urls_bounded(self):
+        traps = TrapDetector(max_patterns=3)
+        for host in range(10):
+            traps.check(f"https://h{host}.ics.uci.edu/")
+        self.assertEqual(list(traps.host_urls), [f"h{host}.ics.uci.edu" for host in (7, 8, 9)])
+
+    def test_restore(self):
+        traps = TrapDetector(host_budget=4, pattern_budget=4)
+        for number in range(3):
+            traps.restore(f"https://a.ics.uci.edu/news/{number}")
+        self.assertEqual(traps.check("https://a.ics.uci.edu/news/3"), THROTTLE)
+        self.assertEqual(traps.check("https://a.ics.uci.edu/"), CUT)
+        self.assertEqual(traps.check("https://b.ics.uci.edu/"), ALLOW)
+
+
+class ResumeBudgetTest(unittest.TestCase):
+    def setUp(self):
+        # The frontier logs to Logs/ and saves to SAVE in the working directory.
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def make_config(self, resume_mode):
+        cparser = ConfigParser()
+        cparser.read(os.path.join(ROOT, "config.ini"))
+        cparser["CRAWLER"]["SEEDURL"] = "https://www.ics.uci.edu/a,https://www.ics.uci.edu/b"
+        cparser["LOCAL PROPERTIES"]["STORE"] = "log"
+        cparser["LOCAL PROPERTIES"]["RESUME"] = resume_mode
+        cparser["ROBOTS"]["ENABLED"] = "false"
+        cparser["BUDGETS"]["HOSTBUDGET"] = "3"
+        return Config(cparser)
+
+    def test_host_budget_survives_resume(self):
+        for resume_mode in ("eager", "lazy"):
+            frontier = Frontier(self.make_config(resume_mode), True)
+            frontier.add_url("https://www.ics.uci.edu/c")
+            frontier.close()
+            frontier = Frontier(self.make_config(resume_mode), False)
+            # Lazy resumes load the save file in the background.
+            while frontier.resuming:
+                time.sleep(0.01)
+            frontier.add_url("https://www.ics.uci.edu/d")
+            self.assertNotIn("https://www.ics.uci.edu/d", frontier.pending)
+            self.assertEqual(len(frontier.pending), 3)
+            frontier.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+import os
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from utils.url_filter import UrlFilter
+# The original regex chain of scraper.is_valid and the edge case corpus
+from bench_url_filter import legacy_is_valid, synthetic_corpus
+
+EDGE_CASES = [
+    "https://www.ics.uci.edu/about",
+    "https://ics.uci.edu/about",
+    "http://WWW.ICS.UCI.EDU/about",
+    "HTTP://www.ics.uci.edu/about",
+    "ftp://www.ics.uci.edu/about",
+    "https://www.ics.uci.edu:8080/about",
+    "https://.ics.uci.edu/about",
+    "https://ics.uci.edu.evil.com/about",
+    "https://xcs.uci.edu/about",
+    "https://physics.uci.edu/about",
+    "https://today.uci.edu/department/information_computer_sciences/news",
+    "https://today.uci.edu/department/information_computer_sciences/",
+    "https://today.uci.edu/department/other/news",
+    "https://www.ics.uci.edu/events/talk",
+    "https://www.ics.uci.edu/news?replytocom=5",
+    "https://www.ics.uci.edu/news?id=3&date=2020",
+    "https://www.ics.uci.edu/paper.PDF",
+    "https://www.ics.uci.edu/data.tar.gz",
+    "https://www.ics.uci.edu/script.R",
+    "https://www.ics.uci.edu/notes.txt/",
+    "https://www.ics.uci.edu/page.html#frag",
+]
+
+
+class UrlFilterTest(unittest.TestCase):
+    def test_same_as_legacy_is_valid(self):
+        # A fixed corpus, so that a change to the filter that accepts or
+        # rejects different urls fails here.
+        url_filter = UrlFilter()
+        corpus = EDGE_CASES + synthetic_corpus(20000, seed=0)
+        mismatches = [url for url in corpus if legacy_is_valid(url) != url_filter.is_valid(url)]
+        self.assertEqual(mismatches, [])
+        accepted = [url for url in corpus if url_filter.is_valid(url)]
+        self.assertGreater(len(accepted), 500)
+        self.assertEqual(list(url_filter.filter(corpus)), accepted)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,4 +1,5 @@
 import os
+import re
 import logging
 from hashlib import sha256
 from urllib.parse import urlparse
@@ -33,3 +34,14 @@ def normalize(url):
     if url.endswith("/"):
         return url.rstrip("/")
     return url
+
+
+NUMBERS = re.compile(r"\d+")
+
+def url_pattern(url):
+    ''' Groups urls that differ only in numbers and query values, e.g.
+    every day of a calendar: the host and path with each run of digits
+    replaced by 0, and the sorted names of the query parameters. '''
+    parsed = urlparse(url)
+    names = sorted({part.split("=", 1)[0] for part in parsed.query.split("&") if part})
+    return f"{parsed.netloc}{NUMBERS.sub('0', parsed.path)}?{'&'.join(names)}"
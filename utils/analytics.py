@@ -0,0 +1,127 @@
+import os
+import re
+import pickle
+
+from collections import Counter
+from urllib.parse import urlparse
+
+
+# The tokenization used by reporter.py on the stored webpage text
+WORD_SEPARATORS = re.compile(r"[\s\-–]")
+SPECIAL_CHARACTERS = re.compile(r"[.,?:!;()\[\]{}\"]")
+ALPHABETICAL_WORD = re.compile(r"^[a-zA-Z']+$")
+
+
+class AnalyticsIndex(object):
+    ''' The statistics reporter.py needs, kept up to date as pages are
+    crawled so that the report never rescans the logs or the page text.
+
+    downloaded counts every download and ics_subdomains the downloads per
+    subdomain of ics.uci.edu, as reporter.py counted the "Downloaded" lines
+    of the Worker log. word_counts counts every alphabetical word of the
+    stored pages, with its case kept so that the report can spell check
+    each distinct word once, and page_lengths holds each stored page's
+    word count.
+
+    Indexes built in different processes (one per page in the parser
+    processes) are combined with merge; the caller makes sure a page is only
+    merged once, and takes out the old text of a page stored again (after
+    it changed on a re-crawl) with forget_page. '''
+
+    def __init__(self):
+        self.downloaded = 0
+        self.ics_subdomains = Counter()
+        self.word_counts = Counter()
+        self.page_lengths = dict()
+
+    @classmethod
+    def for_page(cls, url, webpage_text):
+        index = cls()
+        index.record_page(url, webpage_text)
+        return index
+
+    @classmethod
+    def load(cls, path):
+        if not os.path.exists(path):
+            return cls()
+        with open(path, "rb") as index_file:
+            return pickle.load(index_file)
+
+    def save(self, path):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as index_file:
+            pickle.dump(self, index_file)
+        os.replace(tmp_path, path)
+
+    def record_download(self, url):
+        self.downloaded += 1
+        subdomain = ics_subdomain(url)
+        if subdomain:
+            self.ics_subdomains[subdomain] += 1
+
+    def record_page(self, url, webpage_text):
+        if url in self.page_lengths:
+            # The text of a page is only stored once.
+            return
+        self.page_lengths[url], word_counts = page_words(webpage_text)
+        self.word_counts.update(word_counts)
+
+    def forget_page(self, url, webpage_text):
+        ''' Takes out the counts of the text recorded for url. '''
+        if self.page_lengths.pop(url, None) is None:
+            return
+        _, word_counts = page_words(webpage_text)
+        self.word_counts.subtract(word_counts)
+        for word in word_counts:
+            if self.word_counts[word] <= 0:
+                del self.word_counts[word]
+
+    def copy(self):
+        index = AnalyticsIndex()
+        index.downloaded = self.downloaded
+        index.ics_subdomains = Counter(self.ics_subdomains)
+        index.word_counts = Counter(self.word_counts)
+        index.page_lengths = dict(self.page_lengths)
+        return index
+
+    def merge(self, other):
+        self.downloaded += other.downloaded
+        self.ics_subdomains.update(other.ics_subdomains)
+        self.word_counts.update(other.word_counts)
+        self.page_lengths.update(other.page_lengths)
+
+    def longest_page(self):
+        if not self.page_lengths:
+            return "", 0
+        return max(self.page_lengths.items(), key=lambda page: page[1])
+
+
+def page_words(webpage_text):
+    ''' Returns the length in words of a page's text and the counts of its
+    alphabetical words. '''
+    words = WORD_SEPARATORS.split(webpage_text)
+    word_counts = Counter()
+    for next_word in words:
+        next_word = SPECIAL_CHARACTERS.sub("", next_word)
+        if ALPHABETICAL_WORD.match(next_word) is not None:
+            word_counts[next_word] += 1
+    return len(words), word_counts
+
+
+def ics_subdomain(url):
+    ''' Returns the ics.uci.edu subdomain of url, or None, the way
+    reporter.get_ics_subdomains did. '''
+    if "ics.uci.edu" not in url:
+        return None
+    hostname = urlparse(url).hostname
+    if hostname is None:
+        return None
+    subdomain = hostname.split(".ics.uci.edu")[0]
+
+    # If the subdomain has an additional www. attached to it, remove it
+    if "www." in subdomain:
+        subdomain = subdomain[4:]
+
+    if subdomain and (subdomain != "www"):
+        return subdomain
+    return None
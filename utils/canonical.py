@@ -0,0 +1,114 @@
+import re
+
+from functools import lru_cache
+from urllib.parse import urlsplit, urlunsplit
+
+
+DEFAULT_PORTS = {"http": "80", "https": "443"}
+
+# Query parameters that only track the visitor or carry a session, so they
+# never change the page. A trailing * matches any parameter with the prefix.
+STRIP_PARAMS = [
+    "utm_*", "gclid", "fbclid", "msclkid", "yclid", "dclid", "igshid",
+    "mc_cid", "mc_eid", "_ga", "_gl", "jsessionid", "phpsessid",
+    "aspsessionid*", "sid", "sessionid", "session_id", "cfid", "cftoken"]
+
+# Directory index files, dropped so that /dir/index.html is /dir
+INDEX_FILES = ["index.html", "index.htm", "index.php", "default.htm", "default.aspx"]
+
+# Session ids some servers put in the path, e.g. /page;jsessionid=0A1B
+PATH_SESSION = re.compile(r";(?:jsessionid|phpsessid|sid)=[^/?#]*", re.IGNORECASE)
+
+
+class Canonicalizer(object):
+    ''' Rewrites urls that name the same page into a single form, so the
+    frontier queues and downloads each page once.
+
+    Every rule can be switched off in the [CANONICAL] section of
+    config.ini (lists left out use the defaults above): lowercasing the host, dropping default ports, resolving
+    . and .. path segments, dropping index files, stripping the session and
+    tracking parameters in strip_params (and path session ids) and sorting
+    the remaining query parameters. The fragment and a trailing slash are
+    always dropped, as utils.normalize did. Results are memoized for the
+    last cache_size urls, since the same links recur on page after page.
+
+    Call it like a function: canonicalizer(url) -> url. '''
+
+    def __init__(self, lowercase_host=True, default_ports=True, dot_segments=True,
+                 index_files=INDEX_FILES, strip_params=STRIP_PARAMS, sort_query=True,
+                 cache_size=1 << 16):
+        self.lowercase_host = lowercase_host
+        self.default_ports = default_ports
+        self.dot_segments = dot_segments
+        index_files = INDEX_FILES if index_files is None else index_files
+        strip_params = STRIP_PARAMS if strip_params is None else strip_params
+        self.index_files = tuple(f"/{name}" for name in index_files)
+        strip_params = [name.lower() for name in strip_params]
+        self.strip_names = frozenset(name for name in strip_params if not name.endswith("*"))
+        self.strip_prefixes = tuple(name[:-1] for name in strip_params if name.endswith("*"))
+        self.sort_query = sort_query
+        self._cached = lru_cache(maxsize=cache_size)(self.canonicalize)
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            config.canonical_lowercase_host, config.canonical_default_ports,
+            config.canonical_dot_segments, config.canonical_index_files,
+            config.canonical_strip_params, config.canonical_sort_query,
+            config.canonical_cache_size)
+
+    def __call__(self, url):
+        return self._cached(url)
+
+    def canonicalize(self, url):
+        ''' The canonical form of url, without the cache. '''
+        scheme, netloc, path, query, _ = urlsplit(url.strip())
+        scheme = scheme.lower()
+        if self.lowercase_host:
+            netloc = netloc.lower()
+        if self.default_ports:
+            host, _, port = netloc.rpartition(":")
+            if host and port == DEFAULT_PORTS.get(scheme):
+                netloc = host
+        if self.strip_names or self.strip_prefixes:
+            path = PATH_SESSION.sub("", path)
+        if self.dot_segments and "." in path:
+            path = remove_dot_segments(path)
+        if self.index_files and path.endswith(self.index_files):
+            path = path[:path.rindex("/") + 1]
+        if query:
+            query = self._canonical_query(query)
+        path = path.rstrip("/")
+        return urlunsplit((scheme, netloc, path, query, ""))
+
+    def _canonical_query(self, query):
+        parameters = list()
+        for parameter in query.split("&"):
+            if not parameter:
+                continue
+            name = parameter.split("=", 1)[0].lower()
+            if name in self.strip_names or (
+                    self.strip_prefixes and name.startswith(self.strip_prefixes)):
+                continue
+            parameters.append(parameter)
+        if self.sort_query:
+            # Sorted by name only, so repeated parameters keep their order.
+            parameters.sort(key=lambda parameter: parameter.split("=", 1)[0])
+        return "&".join(parameters)
+
+
+def remove_dot_segments(path):
+    ''' Resolves . and .. segments as in RFC 3986 section 5.2.4. '''
+    segments = path.split("/")
+    output = list()
+    for segment in segments:
+        if segment == ".":
+            continue
+        if segment == "..":
+            if len(output) > 1:
+                output.pop()
+            continue
+        output.append(segment)
+    if segments[-1] in (".", ".."):
+        output.append("")
+    return "/".join(output)
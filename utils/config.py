@@ -9,11 +9,119 @@ class Config(object):
         assert re.match(r"^[a-zA-Z0-9_ ,]+$", self.user_agent), "User agent should not have any special characters outside '_', ',' and 'space'"
         self.threads_count = int(config["LOCAL PROPERTIES"]["THREADCOUNT"])
         self.save_file = config["LOCAL PROPERTIES"]["SAVE"]
+        self.store_backend = config["LOCAL PROPERTIES"].get("STORE", "shelve").strip()
+        self.store_sync_count = int(config["LOCAL PROPERTIES"].get("STORESYNCCOUNT", "256"))
+        self.store_sync_interval = float(config["LOCAL PROPERTIES"].get("STORESYNCINTERVAL", "1.0"))
+        self.store_compact_interval = float(config["LOCAL PROPERTIES"].get("STORECOMPACTINTERVAL", "600"))
+        self.seen_index = config["LOCAL PROPERTIES"].get("SEENINDEX", "hashset").strip()
+        self.seen_capacity = int(config["LOCAL PROPERTIES"].get("SEENCAPACITY", "10000000"))
+        self.seen_error_rate = float(config["LOCAL PROPERTIES"].get("SEENERRORRATE", "0.001"))
+        self.resume_mode = config["LOCAL PROPERTIES"].get("RESUME", "eager").strip()
+        self.resume_page_size = int(config["LOCAL PROPERTIES"].get("RESUMEPAGESIZE", "1000"))
+        self.extractor = config["LOCAL PROPERTIES"].get("EXTRACTOR", "stream").strip()
+        self.engine = config["LOCAL PROPERTIES"].get("ENGINE", "threads").strip()
+        self.parse_processes = int(config["LOCAL PROPERTIES"].get("PARSEPROCESSES", "0"))
+        self.parse_queue_size = int(config["LOCAL PROPERTIES"].get("PARSEQUEUESIZE", "64"))
+        self.async_tasks = int(config["LOCAL PROPERTIES"].get("ASYNCTASKS", "1000"))
+        self.priority = [
+            (name.strip(), float(weight))
+            for name, _, weight in (
+                item.partition(":") for item in _list_option(
+                    config["LOCAL PROPERTIES"], "PRIORITY")
+                or ["depth:1", "inlinks:1", "novelty:0.5", "host:1"])]
+        self.duplicate_bits = int(config["LOCAL PROPERTIES"].get("DUPLICATEBITS", "3"))
+        self.duplicate_pattern_limit = int(config["LOCAL PROPERTIES"].get("DUPLICATEPATTERNLIMIT", "5"))
+        self.text_store_file = config["LOCAL PROPERTIES"].get("TEXTSTORE", "Webpage_Text.store").strip()
+        self.text_store_buffer_size = int(config["LOCAL PROPERTIES"].get("TEXTBUFFERSIZE", "1048576"))
+        self.analytics_file = config["LOCAL PROPERTIES"].get("ANALYTICS", "analytics.index").strip()
+        self.analytics_save_interval = float(config["LOCAL PROPERTIES"].get("ANALYTICSSAVEINTERVAL", "60"))
 
         self.host = config["CONNECTION"]["HOST"]
         self.port = int(config["CONNECTION"]["PORT"])
+        self.download_connect_timeout = float(config["CONNECTION"].get("CONNECTTIMEOUT", "5"))
+        self.download_timeout = float(config["CONNECTION"].get("TIMEOUT", "60"))
+        self.download_retries = int(config["CONNECTION"].get("RETRIES", "3"))
+        self.download_backoff = float(config["CONNECTION"].get("BACKOFF", "0.5"))
+        self.download_pool_size = int(config["CONNECTION"].get("POOLSIZE", "16"))
 
         self.seed_urls = config["CRAWLER"]["SEEDURL"].split(",")
         self.time_delay = float(config["CRAWLER"]["POLITENESS"])
 
-        self.cache_server = None
\ No newline at end of file
+        # Optional url filter rules, see utils/url_filter.py for the defaults.
+        filter_rules = config["FILTER"] if config.has_section("FILTER") else dict()
+        self.filter_domains = _list_option(filter_rules, "DOMAINS")
+        self.filter_path_domains = _list_option(filter_rules, "PATHDOMAINS")
+        self.filter_traps = _list_option(filter_rules, "TRAPS")
+        self.filter_extensions = _list_option(filter_rules, "EXTENSIONS")
+
+        trap_rules = config["BUDGETS"] if config.has_section("BUDGETS") else dict()
+        self.trap_max_depth = int(trap_rules.get("MAXDEPTH", "12"))
+        self.trap_max_repeats = int(trap_rules.get("MAXREPEATS", "3"))
+        self.trap_host_budget = int(trap_rules.get("HOSTBUDGET", "0"))
+        self.trap_pattern_budget = int(trap_rules.get("PATTERNBUDGET", "2000"))
+        self.trap_query_values = int(trap_rules.get("QUERYVALUES", "100"))
+        self.trap_min_yield = float(trap_rules.get("MINYIELD", "0.1"))
+        self.trap_yield_pages = int(trap_rules.get("YIELDPAGES", "50"))
+        self.trap_max_patterns = int(trap_rules.get("MAXPATTERNS", "100000"))
+
+        shard_rules = config["SHARDS"] if config.has_section("SHARDS") else dict()
+        self.shard_addresses = [
+            (address.rpartition(":")[0], int(address.rpartition(":")[2]))
+            for address in _list_option(shard_rules, "ADDRESSES") or []]
+        self.shard_authkey = shard_rules.get("AUTHKEY", "spacetime-crawler")
+        self.shard_batch_size = int(shard_rules.get("BATCHSIZE", "256"))
+        self.shard_interval = float(shard_rules.get("INTERVAL", "0.5"))
+        self.shard_index = 0
+        self.shard_count = 1
+
+        canonical_rules = config["CANONICAL"] if config.has_section("CANONICAL") else dict()
+        self.canonical_lowercase_host = _bool_option(canonical_rules, "LOWERCASEHOST", True)
+        self.canonical_default_ports = _bool_option(canonical_rules, "DEFAULTPORTS", True)
+        self.canonical_dot_segments = _bool_option(canonical_rules, "DOTSEGMENTS", True)
+        self.canonical_index_files = _list_option(canonical_rules, "INDEXFILES")
+        self.canonical_strip_params = _list_option(canonical_rules, "STRIPPARAMS")
+        self.canonical_sort_query = _bool_option(canonical_rules, "SORTQUERY", True)
+        self.canonical_rel = _bool_option(canonical_rules, "RELCANONICAL", True)
+        self.canonical_cache_size = int(canonical_rules.get("CACHESIZE", "65536"))
+
+        robot_rules = config["ROBOTS"] if config.has_section("ROBOTS") else dict()
+        self.robots = _bool_option(robot_rules, "ENABLED", True)
+        self.robots_ttl = float(robot_rules.get("TTL", "86400"))
+        self.robots_cache_size = int(robot_rules.get("CACHESIZE", "10000"))
+        self.robots_threads = int(robot_rules.get("THREADS", "4"))
+        self.robots_max_delay = float(robot_rules.get("MAXDELAY", "10"))
+        self.robots_sitemap_urls = int(robot_rules.get("SITEMAPURLS", "50000"))
+
+        recrawl_rules = config["RECRAWL"] if config.has_section("RECRAWL") else dict()
+        self.recrawl = _bool_option(recrawl_rules, "ENABLED", False)
+        self.recrawl_initial_interval = float(recrawl_rules.get("INITIALINTERVAL", "86400"))
+        self.recrawl_min_interval = float(recrawl_rules.get("MININTERVAL", "3600"))
+        self.recrawl_max_interval = float(recrawl_rules.get("MAXINTERVAL", "2592000"))
+
+        metric_rules = config["METRICS"] if config.has_section("METRICS") else dict()
+        metrics_address = metric_rules.get("ADDRESS", "").strip()
+        self.metrics_address = (
+            (metrics_address.rpartition(":")[0], int(metrics_address.rpartition(":")[2]))
+            if metrics_address else None)
+        self.metrics_file = metric_rules.get("SNAPSHOT", "metrics.json").strip()
+        self.metrics_interval = float(metric_rules.get("INTERVAL", "10"))
+        self.profile = _bool_option(metric_rules, "PROFILE", False)
+        self.profile_interval = float(metric_rules.get("PROFILEINTERVAL", "0.01"))
+
+        self.cache_server = None
+
+
+def _list_option(section, key):
+    ''' Parses a comma or newline separated option, None if it is unset. '''
+    value = section.get(key)
+    if value is None:
+        return None
+    return [item.strip() for item in re.split(r"[,\n]", value) if item.strip()]
+
+
+def _bool_option(section, key, default):
+    ''' Parses a true/false option, default if it is unset. '''
+    value = section.get(key)
+    if value is None:
+        return default
+    return value.strip().lower() in ("true", "yes", "on", "1")
@@ -1,18 +1,139 @@
 import requests
 import cbor
 import time
+import asyncio
+
+from threading import local
+from urllib.parse import urlparse
+from requests.adapters import HTTPAdapter
 
 from utils.response import Response
+from utils import metrics
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+# Status reported when the cache server could not be reached at all.
+CONNECTION_ERROR_STATUS = 599
+
+# Every thread keeps its own session (requests sessions are not thread safe),
+# which keeps its connections to the cache server alive between downloads.
+_sessions = local()
+
+
+def get_session(config):
+    session = getattr(_sessions, "session", None)
+    if session is None:
+        session = requests.Session()
+        session.mount("http://", HTTPAdapter(
+            pool_connections=1, pool_maxsize=config.download_pool_size))
+        _sessions.session = session
+    return session
+
 
 def download(url, config, logger=None):
+    started = time.perf_counter()
+    resp = _download(url, config, logger)
+    _record_metrics(url, resp, started)
+    return resp
+
+
+def _download(url, config, logger):
     host, port = config.cache_server
-    resp = requests.get(
-        f"http://{host}:{port}/",
-        params=[("q", f"{url}"), ("u", f"{config.user_agent}")])
-    if resp:
-        return Response(cbor.loads(resp.content))
-    logger.error(f"Spacetime Response error {resp} with url {url}.")
+    session = get_session(config)
+    for attempt in range(config.download_retries + 1):
+        if attempt:
+            metrics.increment("download.retries")
+            time.sleep(config.download_backoff * 2 ** (attempt - 1))
+        try:
+            resp = session.get(
+                f"http://{host}:{port}/",
+                params=[("q", f"{url}"), ("u", f"{config.user_agent}")],
+                timeout=(config.download_connect_timeout, config.download_timeout))
+        except requests.RequestException as error:
+            status, reason = CONNECTION_ERROR_STATUS, repr(error)
+            continue
+        if resp:
+            return Response(cbor.loads(resp.content))
+        status, reason = resp.status_code, resp
+        if status < 500:
+            # The request itself was refused, retrying will not help.
+            break
+    return _error_response(url, status, reason, logger)
+
+
+class AsyncDownloader(object):
+    ''' Downloads with many requests in flight from a single thread.
+
+    Uses one aiohttp session (up to DOWNLOADPOOLSIZE connections to the cache
+    server) when aiohttp is installed, and otherwise runs download() in the
+    event loop's default thread pool. Use as an async context manager. '''
+
+    def __init__(self, config, logger=None):
+        self.config = config
+        self.logger = logger
+        self.session = None
+
+    async def __aenter__(self):
+        if aiohttp is not None:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.config.download_pool_size),
+                timeout=aiohttp.ClientTimeout(
+                    sock_connect=self.config.download_connect_timeout,
+                    sock_read=self.config.download_timeout))
+        return self
+
+    async def __aexit__(self, *exc_info):
+        if self.session is not None:
+            await self.session.close()
+
+    async def download(self, url):
+        if self.session is None:
+            return await asyncio.get_running_loop().run_in_executor(
+                None, download, url, self.config, self.logger)
+        started = time.perf_counter()
+        resp = await self._download(url)
+        _record_metrics(url, resp, started)
+        return resp
+
+    async def _download(self, url):
+        host, port = self.config.cache_server
+        for attempt in range(self.config.download_retries + 1):
+            if attempt:
+                metrics.increment("download.retries")
+                await asyncio.sleep(
+                    self.config.download_backoff * 2 ** (attempt - 1))
+            try:
+                async with self.session.get(
+                        f"http://{host}:{port}/",
+                        params=[("q", f"{url}"), ("u", f"{self.config.user_agent}")]) as resp:
+                    content = await resp.read()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as error:
+                status, reason = CONNECTION_ERROR_STATUS, repr(error)
+                continue
+            if resp.status < 400:
+                return Response(cbor.loads(content))
+            status, reason = resp.status, f"<Response [{resp.status}]>"
+            if status < 500:
+                break
+        return _error_response(url, status, reason, self.logger)
+
+
+def _record_metrics(url, resp, started):
+    ''' Records a download's time, status and host in utils.metrics. '''
+    metrics.observe("download", time.perf_counter() - started)
+    metrics.increment(f"status.{resp.status}")
+    if resp.error is not None:
+        metrics.increment("errors.download")
+    metrics.host_download(urlparse(url).netloc)
+
+
+def _error_response(url, status, reason, logger):
+    if logger:
+        logger.error(f"Spacetime Response error {reason} with url {url}.")
     return Response({
-        "error": f"Spacetime Response error {resp} with url {url}.",
-        "status": resp.status_code,
+        "error": f"Spacetime Response error {reason} with url {url}.",
+        "status": status,
         "url": url})
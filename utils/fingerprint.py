@@ -0,0 +1,112 @@
+from hashlib import blake2b
+from functools import lru_cache
+from collections import Counter
+
+
+# Pages with fewer words than this only get an exact checksum; a SimHash of
+# a handful of words matches too many unrelated pages.
+MIN_SIMHASH_WORDS = 20
+
+
+def fingerprint(text):
+    ''' Returns the (checksum, simhash) of a page's text, or None if it has
+    no words. The checksum ignores differences in whitespace; simhash is a
+    64 bit SimHash of the page's words weighted by their counts, or None for
+    short pages. '''
+    words = text.split() if text else None
+    if not words:
+        return None
+    text = " ".join(words)
+    checksum = blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+    if len(words) < MIN_SIMHASH_WORDS:
+        return checksum, None
+    return checksum, simhash(Counter(text.lower().split()))
+
+
+@lru_cache(maxsize=1 << 16)
+def word_hash(word):
+    # Most words recur on page after page, so their hashes are cached.
+    return blake2b(word.encode("utf-8", "surrogatepass"), digest_size=8).digest()
+
+
+# For each bit, a bytes.translate table mapping every byte value to that bit
+BIT_TABLES = [bytes((byte >> bit) & 1 for byte in range(256)) for bit in range(8)]
+
+
+def simhash(word_counts):
+    # Rather than adding every word's weight to 64 bit columns one bit at a
+    # time in Python, lay the word hashes (repeated by weight) out as bytes
+    # and count the set bits of each column with translate and count.
+    hashes = b"".join(word_hash(word) * count for word, count in word_counts.items())
+    total = len(hashes) // 8
+    value = 0
+    for position in range(8):
+        column_bytes = hashes[position::8]
+        for bit, bit_table in enumerate(BIT_TABLES):
+            if 2 * column_bytes.translate(bit_table).count(1) > total:
+                value |= 1 << (8 * position + bit)
+    return value
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count("1")
+
+
+class DuplicateIndex(object):
+    ''' Finds pages whose text was already seen.
+
+    Exact duplicates are found by checksum. Near duplicates, pages whose
+    SimHashes differ in at most max_distance bits, are found with the
+    pigeonhole scheme of Manku et al.: the 64 bits are cut into
+    max_distance + 1 blocks and a table per block maps the block's value to
+    the fingerprints that have it, since two fingerprints that close must
+    agree on at least one whole block. A lookup only compares against the
+    fingerprints sharing a block instead of every page. max_distance = 0
+    only finds exact duplicates.
+
+    Not thread safe; the scraper serializes access to it. '''
+
+    def __init__(self, max_distance=3):
+        self.max_distance = max_distance
+        self.checksums = dict()
+        # (shift, mask) of each block
+        self.blocks = list()
+        if max_distance > 0:
+            bounds = [64 * i // (max_distance + 1) for i in range(max_distance + 2)]
+            self.blocks = [
+                (start, (1 << (end - start)) - 1)
+                for start, end in zip(bounds, bounds[1:])]
+        self.tables = [dict() for _ in self.blocks]
+        self.exact_duplicates = 0
+        self.near_duplicates = 0
+
+    def add(self, url, page_fingerprint):
+        ''' Records the page at url. Returns the url of the page it
+        duplicates, in which case it is not recorded, or None. '''
+        checksum, page_simhash = page_fingerprint
+        original = self.checksums.get(checksum)
+        if original is not None:
+            self.exact_duplicates += 1
+            return original
+        if page_simhash is not None:
+            original = self._find_near(page_simhash)
+            if original is not None:
+                self.near_duplicates += 1
+                return original
+        self.checksums[checksum] = url
+        if page_simhash is not None:
+            for (shift, mask), table in zip(self.blocks, self.tables):
+                table.setdefault((page_simhash >> shift) & mask, []).append((page_simhash, url))
+        return None
+
+    def _find_near(self, page_simhash):
+        for (shift, mask), table in zip(self.blocks, self.tables):
+            for other, url in table.get((page_simhash >> shift) & mask, ()):
+                if hamming_distance(page_simhash, other) <= self.max_distance:
+                    return url
+        return None
+
+    def report(self):
+        return (
+            f"{len(self.checksums)} distinct pages, {self.exact_duplicates} "
+            f"exact and {self.near_duplicates} near duplicates skipped")
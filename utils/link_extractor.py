@@ -0,0 +1,145 @@
+import re
+import codecs
+from urllib.parse import urljoin, urldefrag
+
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+    from html.parser import HTMLParser
+
+
+def get_extractor(name):
+    ''' Returns the extract(url, content) -> (links, text, canonical) function
+    chosen by EXTRACTOR in config.ini, where canonical is the absolute url of
+    the page's <link rel="canonical">, or None. '''
+    if name == "stream":
+        return stream_extract
+    if name == "soup":
+        return soup_extract
+    raise ValueError(f"Unknown EXTRACTOR {name}.")
+
+
+# A charset declared in a <meta> tag near the start of the document.
+_META_CHARSET = re.compile(rb"""<meta[^>]+charset=["']?([a-zA-Z0-9_.:-]+)""", re.IGNORECASE)
+
+
+def decode_html(content, encoding=None):
+    ''' Decodes a page to text with the given or <meta> declared charset,
+    falling back to utf-8 and then windows-1252. '''
+    if isinstance(content, str):
+        return content
+    if encoding is None:
+        match = _META_CHARSET.search(content, 0, 2048)
+        if match is not None:
+            encoding = match.group(1).decode("ascii")
+    if encoding is not None:
+        try:
+            return content.decode(codecs.lookup(encoding).name, errors="replace")
+        except LookupError:
+            pass
+    try:
+        return content.decode("utf-8")
+    except UnicodeDecodeError:
+        return content.decode("windows-1252", errors="replace")
+
+
+def soup_extract(url, content):
+    ''' The original extraction: builds a full BeautifulSoup tree, takes its
+    text and the raw href of every <a> tag. Relative links are left as they
+    are. '''
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(content, "lxml")
+    links = list()
+    for anchor in soup.find_all("a"):
+        link = anchor.get("href")
+        if link is not None:
+            links.append(urldefrag(link)[0].strip())
+    canonical = soup.find("link", rel="canonical", href=True)
+    if canonical is not None:
+        canonical = urljoin(url, canonical["href"].strip())
+    return links, soup.get_text(), canonical
+
+
+def stream_extract(url, content):
+    ''' Collects hrefs and visible text in a single pass of parser events,
+    without building a tree. Links are resolved against the <base> tag or
+    the page url. The text matches BeautifulSoup's get_text(). '''
+    collector = _LinkCollector()
+    try:
+        if etree is not None:
+            parser = etree.HTMLParser(target=collector)
+            parser.feed(decode_html(content))
+            parser.close()
+        else:
+            _StdlibParser(collector).feed_content(decode_html(content))
+    except Exception:
+        # Keep whatever was collected from a document the parser gave up on.
+        pass
+    base = urljoin(url, collector.base) if collector.base else url
+    links = list()
+    for href in collector.hrefs:
+        links.append(urldefrag(urljoin(base, href.strip()))[0])
+    canonical = urljoin(base, collector.canonical.strip()) if collector.canonical else None
+    return links, "".join(collector.text), canonical
+
+
+class _LinkCollector(object):
+    ''' Parser target that records <a href>s, the first <base href>, the
+    first <link rel="canonical"> and the text outside of script, style and
+    template tags. '''
+    skipped_tags = frozenset(["script", "style", "template"])
+
+    def __init__(self):
+        self.hrefs = list()
+        self.base = None
+        self.canonical = None
+        self.text = list()
+        self.skip_depth = 0
+
+    def start(self, tag, attrib):
+        if tag == "a":
+            href = attrib.get("href")
+            if href is not None:
+                self.hrefs.append(href)
+        elif tag in self.skipped_tags:
+            self.skip_depth += 1
+        elif tag == "base" and self.base is None:
+            self.base = attrib.get("href")
+        elif (tag == "link" and self.canonical is None
+                and "canonical" in (attrib.get("rel") or "").lower().split()):
+            self.canonical = attrib.get("href")
+
+    def end(self, tag):
+        if tag in self.skipped_tags and self.skip_depth:
+            self.skip_depth -= 1
+
+    def data(self, data):
+        if not self.skip_depth:
+            self.text.append(data)
+
+    def close(self):
+        return self
+
+
+if etree is None:
+    class _StdlibParser(HTMLParser):
+        ''' Feeds html.parser events to a _LinkCollector when lxml is not
+        installed. '''
+        def __init__(self, collector):
+            super().__init__(convert_charrefs=True)
+            self.collector = collector
+
+        def feed_content(self, content):
+            self.feed(content)
+            self.close()
+
+        def handle_starttag(self, tag, attrs):
+            self.collector.start(tag, dict(attrs))
+
+        def handle_endtag(self, tag):
+            self.collector.end(tag)
+
+        def handle_data(self, data):
+            self.collector.data(data)
@@ -0,0 +1,118 @@
+import cbor
+import pickle
+import requests
+
+from threading import Thread, Lock
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from requests.structures import CaseInsensitiveDict
+
+
+class LocalCacheServer(object):
+    ''' Stand-in for the spacetime cache server, for testing the crawler
+    without the network.
+
+    Answers GET /?q=<url>&u=<useragent> like the real server: a cbor encoded
+    dict with the url, the status and, for pages it knows, a pickled
+    requests.Response, plus its headers as a plain dict so utils.response
+    can read them without unpickling the body. pages maps a url to (status, content) or
+    (status, content, headers), and can be any object with a get method,
+    such as a utils.synthetic_web.SyntheticWeb; unknown urls get the cache
+    server's 604 error. fail_next(n) makes the next n requests fail with
+    HTTP 500. '''
+
+    def __init__(self, pages=None, host="127.0.0.1", port=0):
+        self.pages = pages if pages is not None else dict()
+        self.requests = list()
+        self.lock = Lock()
+        self.failures = 0
+        self.server = ThreadingHTTPServer((host, port), _make_handler(self))
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def address(self):
+        host, port = self.server.server_address[:2]
+        return host, port
+
+    def start(self):
+        ''' Serves in a background thread and returns the (host, port) to use
+        as config.cache_server. '''
+        self.thread = Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self.address
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def fail_next(self, count):
+        with self.lock:
+            self.failures = count
+
+    def add_page(self, url, status, content, headers=None):
+        self.pages[url] = (status, content, headers or dict())
+
+    def respond(self, url, user_agent):
+        ''' Returns the HTTP status and body for a request for url. '''
+        with self.lock:
+            self.requests.append((url, user_agent))
+            if self.failures:
+                self.failures -= 1
+                return 500, b""
+        page = self.pages.get(url)
+        if page is None:
+            return 200, cbor.dumps({
+                "url": url, "status": 604,
+                "error": f"{url} is not in the local cache."})
+        status, content, headers = (tuple(page) + (dict(),))[:3]
+        raw_response = make_raw_response(url, status, content, headers)
+        return 200, cbor.dumps({
+            "url": url, "status": status,
+            "headers": dict(raw_response.headers),
+            "response": pickle.dumps(raw_response)})
+
+
+def get_local_cache_server(pages, host="127.0.0.1", port=0):
+    ''' Stand-in for utils.server_registration.get_cache_server: starts a
+    LocalCacheServer serving pages and returns its (host, port) to use as
+    config.cache_server. '''
+    return LocalCacheServer(pages, host, port).start()
+
+
+def load_pages(path):
+    ''' Loads a recorded web for LocalCacheServer: a pickled dict mapping
+    urls to (status, content) or (status, content, headers). '''
+    with open(path, "rb") as pages_file:
+        return pickle.load(pages_file)
+
+
+def make_raw_response(url, status, content, headers=None):
+    ''' Builds the requests.Response the real cache server would pickle. '''
+    resp = requests.Response()
+    resp.url = url
+    resp.status_code = status
+    resp.reason = "OK" if status == 200 else ""
+    resp.headers = CaseInsensitiveDict(headers or {"Content-Type": "text/html"})
+    resp.encoding = "utf-8"
+    resp._content = content
+    return resp
+
+
+def _make_handler(cache):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            query = parse_qs(urlparse(self.path).query)
+            status, body = cache.respond(
+                query.get("q", [""])[0], query.get("u", [""])[0])
+            self.send_response(status)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
@@ -0,0 +1,385 @@
+import os
+import sys
+import json
+import time
+
+from bisect import bisect_left
+from collections import Counter, deque
+from threading import Thread, Lock, Event, get_ident
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse
+
+
+# Upper bounds, in seconds, of the histogram buckets: from a microsecond to
+# about 18 minutes, each twice the one before.
+BUCKETS = [1e-6 * 2 ** i for i in range(31)]
+
+
+class Histogram(object):
+    ''' Counts of timings in exponential buckets, enough for quantiles
+    within a factor of two at constant memory. '''
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def merge(self, other):
+        for i, count in enumerate(other.counts):
+            self.counts[i] += count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def quantile(self, share):
+        rank = share * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return min(BUCKETS[i], self.max) if i < len(BUCKETS) else self.max
+        return 0.0
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "total": self.total,
+            "mean": self.total / self.count if self.count else 0.0,
+            "p50": self.quantile(0.5),
+            "p90": self.quantile(0.9),
+            "p99": self.quantile(0.99),
+            "max": self.max}
+
+
+class Metrics(object):
+    ''' Registry of the crawler's counters, timing histograms, gauges and
+    per host download rates. Thread safe and cheap enough for every url.
+
+    Counters and histograms are named by stage, e.g. "download" or
+    "status.200"; gauges are functions called when a snapshot is taken, so
+    a queue depth costs nothing until it is read. Work done in parser
+    processes is recorded in their own registry and brought back with
+    collect() and merge(). '''
+
+    def __init__(self, rate_window=60.0):
+        self.rate_window = rate_window
+        self.lock = Lock()
+        self.started = time.monotonic()
+        self.counters = Counter()
+        self.histograms = dict()
+        self.gauges = dict()
+        self.host_downloads = Counter()
+        # Download times of each host within the last rate_window seconds
+        self.host_times = dict()
+
+    def increment(self, name, amount=1):
+        with self.lock:
+            self.counters[name] += amount
+
+    def observe(self, name, seconds):
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(seconds)
+
+    def timer(self, name):
+        ''' Context manager observing the time spent in its block as name. '''
+        return Timer(self, name)
+
+    def register_gauge(self, name, gauge):
+        ''' Makes gauge() the value of name in snapshots, replacing any
+        earlier gauge of that name. '''
+        with self.lock:
+            self.gauges[name] = gauge
+
+    def host_download(self, host):
+        now = time.monotonic()
+        with self.lock:
+            self.host_downloads[host] += 1
+            times = self.host_times.get(host)
+            if times is None:
+                times = self.host_times[host] = deque()
+            times.append(now)
+            while times[0] < now - self.rate_window:
+                times.popleft()
+
+    def snapshot(self, hosts=50):
+        ''' Everything recorded so far as a json serializable dict, with the
+        download rates per minute of the hosts busiest over the last
+        rate_window seconds. '''
+        now = time.monotonic()
+        with self.lock:
+            counters = dict(self.counters)
+            histograms = {
+                name: histogram.summary()
+                for name, histogram in sorted(self.histograms.items())}
+            gauges = list(self.gauges.items())
+            rates = list()
+            for host, times in self.host_times.items():
+                recent = len(times) - bisect_left(times, now - self.rate_window)
+                if recent:
+                    rates.append((recent, host))
+            rates.sort(reverse=True)
+            host_rates = {
+                host: {
+                    "downloads": self.host_downloads[host],
+                    "per_minute": 60.0 * recent / self.rate_window}
+                for recent, host in rates[:hosts]}
+        gauge_values = dict()
+        for name, gauge in gauges:
+            try:
+                gauge_values[name] = gauge()
+            except Exception as error:
+                gauge_values[name] = repr(error)
+        return {
+            "time": time.time(),
+            "uptime": now - self.started,
+            "counters": counters,
+            "gauges": gauge_values,
+            "timings": histograms,
+            "hosts": host_rates}
+
+    def take(self):
+        ''' Returns and clears the counters and histograms recorded so far,
+        for merge() in another process. '''
+        with self.lock:
+            taken = (self.counters, self.histograms)
+            self.counters = Counter()
+            self.histograms = dict()
+        return taken
+
+    def merge(self, taken):
+        counters, histograms = taken
+        with self.lock:
+            self.counters.update(counters)
+            for name, other in histograms.items():
+                histogram = self.histograms.get(name)
+                if histogram is None:
+                    self.histograms[name] = other
+                else:
+                    histogram.merge(other)
+
+
+class Timer(object):
+    __slots__ = ("metrics", "name", "start")
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.observe(self.name, time.perf_counter() - self.start)
+
+
+# The crawler's registry, used through the module functions below
+default = Metrics()
+increment = default.increment
+observe = default.observe
+timer = default.timer
+register_gauge = default.register_gauge
+host_download = default.host_download
+snapshot = default.snapshot
+merge = default.merge
+
+
+def collect(function, *args):
+    ''' Runs function(*args) in a parser process and returns its result
+    with what it recorded, to be added to the crawler's registry with
+    merge(). '''
+    return function(*args), default.take()
+
+
+class SamplingProfiler(object):
+    ''' Samples the stacks of every other thread every interval seconds
+    while running, to show where a running crawl spends its time. Cheap
+    enough to switch on in a live crawl and off again; counts stacks of at
+    most max_depth frames, and at most max_stacks distinct stacks. '''
+
+    def __init__(self, interval=0.01, max_depth=40, max_stacks=20000):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.max_stacks = max_stacks
+        self.lock = Lock()
+        self.stacks = Counter()
+        self.samples = 0
+        self.stopped = Event()
+        self.stopped.set()
+        self.thread = None
+
+    @property
+    def running(self):
+        return not self.stopped.is_set()
+
+    def start(self):
+        with self.lock:
+            if self.running:
+                return
+            self.stopped.clear()
+            self.thread = Thread(target=self._sample, daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+
+    def clear(self):
+        with self.lock:
+            self.stacks = Counter()
+            self.samples = 0
+
+    def report(self, limit=30):
+        ''' The functions most often running (self) and on the stack
+        (cumulative), as shares of the samples of all threads. '''
+        with self.lock:
+            stacks = list(self.stacks.items())
+            samples = self.samples
+        own, cumulative = Counter(), Counter()
+        total = 0
+        for stack, count in stacks:
+            total += count
+            own[stack[-1]] += count
+            for frame in set(stack):
+                cumulative[frame] += count
+        total = total or 1
+        return {
+            "running": self.running,
+            "samples": samples,
+            "interval": self.interval,
+            "self": [(frame, count / total) for frame, count in own.most_common(limit)],
+            "cumulative": [
+                (frame, count / total) for frame, count in cumulative.most_common(limit)]}
+
+    def collapsed(self):
+        ''' The sampled stacks in the collapsed format of flame graph tools. '''
+        with self.lock:
+            stacks = list(self.stacks.items())
+        return "".join(f"{';'.join(stack)} {count}\n" for stack, count in stacks)
+
+    def _sample(self):
+        own_thread = get_ident()
+        while not self.stopped.wait(self.interval):
+            stacks = list()
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_thread:
+                    continue
+                stack = list()
+                while frame is not None and len(stack) < self.max_depth:
+                    code = frame.f_code
+                    stack.append(
+                        f"{code.co_name} ({os.path.basename(code.co_filename)}:"
+                        f"{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.reverse()
+                stacks.append(tuple(stack))
+            with self.lock:
+                self.samples += 1
+                for stack in stacks:
+                    if stack in self.stacks or len(self.stacks) < self.max_stacks:
+                        self.stacks[stack] += 1
+
+
+class MetricsMonitor(object):
+    ''' Publishes a registry while the crawler runs, as set in the [METRICS]
+    section of config.ini: a json snapshot written to SNAPSHOT every
+    INTERVAL seconds, and an HTTP endpoint at ADDRESS serving
+      /metrics                the snapshot,
+      /profile                the sampling profiler's report,
+      /profile/collapsed      its stacks, for flame graphs,
+      /profile/start, /stop   switching the profiler on and off. '''
+
+    def __init__(self, config, metrics=default):
+        self.metrics = metrics
+        self.snapshot_file = config.metrics_file
+        self.interval = config.metrics_interval
+        self.profiler = SamplingProfiler(config.profile_interval)
+        self.stopped = Event()
+        self.server = None
+        if config.metrics_address is not None:
+            self.server = ThreadingHTTPServer(
+                config.metrics_address, _make_handler(self))
+            self.server.daemon_threads = True
+        if config.profile:
+            self.profiler.start()
+
+    @property
+    def address(self):
+        host, port = self.server.server_address[:2]
+        return host, port
+
+    def start(self):
+        if self.server is not None:
+            Thread(target=self.server.serve_forever, daemon=True).start()
+        if self.snapshot_file:
+            Thread(target=self._write_snapshots, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        self.profiler.stop()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+        if self.snapshot_file:
+            self.write_snapshot()
+
+    def write_snapshot(self):
+        # Written to a temporary file and renamed, so readers never see half
+        # a snapshot.
+        temporary = f"{self.snapshot_file}.tmp"
+        with open(temporary, "w") as snapshot_file:
+            json.dump(self.metrics.snapshot(), snapshot_file, indent=1)
+        os.replace(temporary, self.snapshot_file)
+
+    def _write_snapshots(self):
+        while not self.stopped.wait(self.interval):
+            self.write_snapshot()
+
+    def respond(self, path):
+        ''' Returns the HTTP status, content type and body for a GET of path. '''
+        if path in ("/", "/metrics"):
+            body = self.metrics.snapshot()
+        elif path == "/profile":
+            body = self.profiler.report()
+        elif path == "/profile/collapsed":
+            return 200, "text/plain", self.profiler.collapsed().encode("utf-8")
+        elif path == "/profile/start":
+            self.profiler.clear()
+            self.profiler.start()
+            body = {"running": True}
+        elif path == "/profile/stop":
+            self.profiler.stop()
+            body = {"running": False}
+        else:
+            return 404, "text/plain", b"Not found.\n"
+        return 200, "application/json", json.dumps(body, indent=1).encode("utf-8")
+
+
+def _make_handler(monitor):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            status, content_type, body = monitor.respond(urlparse(self.path).path)
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
@@ -1,14 +1,73 @@
 import pickle
 
+from requests.structures import CaseInsensitiveDict
+
+from utils.link_extractor import decode_html
+
+
 class Response(object):
+    ''' A response from the cache server.
+
+    The pickled requests.Response in the cache server's reply is only
+    unpickled when raw_response or content is first used, and never for
+    content when the status is an error. A reply that also carries the
+    headers as a plain "headers" dict (utils.local_cache_server's do)
+    serves headers from it, so reading them leaves the body pickled;
+    otherwise headers come from the unpickled response. The body is
+    decoded to text once, by the text property, and shared by everything
+    that reads it. '''
+    __slots__ = (
+        "url", "status", "error", "_payload", "_raw_response", "_headers", "_text")
+
     def __init__(self, resp_dict):
         self.url = resp_dict["url"]
         self.status = resp_dict["status"]
         self.error = resp_dict["error"] if "error" in resp_dict else None
-        try:
-            self.raw_response = (
-                pickle.loads(resp_dict["response"])
-                if "response" in resp_dict else
-                None)
-        except TypeError:
-            self.raw_response = None
+        self._payload = resp_dict["response"] if "response" in resp_dict else None
+        self._raw_response = None
+        self._headers = (
+            CaseInsensitiveDict(resp_dict["headers"]) if "headers" in resp_dict else None)
+        self._text = None
+
+    @property
+    def raw_response(self):
+        if self._payload is not None:
+            try:
+                self._raw_response = pickle.loads(self._payload)
+            except TypeError:
+                self._raw_response = None
+            self._payload = None
+        return self._raw_response
+
+    @property
+    def has_body(self):
+        return self.error is None and 200 <= self.status < 400
+
+    @property
+    def headers(self):
+        if self._headers is None:
+            raw_response = self.raw_response
+            self._headers = (
+                raw_response.headers if raw_response is not None else CaseInsensitiveDict())
+        return self._headers
+
+    @property
+    def content(self):
+        ''' The page body as bytes, empty for error statuses. '''
+        if not self.has_body:
+            return b""
+        raw_response = self.raw_response
+        if raw_response is None or not raw_response.content:
+            return b""
+        return raw_response.content
+
+    @property
+    def text(self):
+        ''' The page body decoded with its declared charset, computed once. '''
+        if self._text is None:
+            charset = None
+            content_type = self.headers.get("Content-Type", "") if self.has_body else ""
+            if "charset=" in content_type:
+                charset = content_type.split("charset=", 1)[1].split(";")[0].strip("\"' ")
+            self._text = decode_html(self.content, charset)
+        return self._text
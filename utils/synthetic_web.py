@@ -0,0 +1,171 @@
+import zlib
+import random
+from itertools import accumulate
+
+
+WORDS = (
+    "research faculty student computer science informatics statistics course "
+    "seminar data systems learning network security software design theory "
+    "algorithm graduate program project lab group paper talk the and of to in "
+    "for with on is are this that from by an as be at or it university campus "
+    "department professor lecture award grant robot vision language model").split()
+
+# The vocabulary of the pages: WORDS and made up words of two to four
+# syllables, VOCABULARY_SIZE (a prime) in all.
+VOCABULARY_SIZE = 20011
+
+
+def _vocabulary(size):
+    rand = random.Random(0)
+    words = list(dict.fromkeys(WORDS))
+    known = set(words)
+    while len(words) < size:
+        word = "".join(
+            rand.choice("bcdfghjklmnprstvwz") + rand.choice("aeiou")
+            for _ in range(rand.randint(2, 4)))
+        if word not in known:
+            known.add(word)
+            words.append(word)
+    return words
+
+
+VOCABULARY = _vocabulary(VOCABULARY_SIZE)
+# Zipf's law: the word of rank r is used in proportion to 1 / r.
+ZIPF_WEIGHTS = list(accumulate(1 / rank for rank in range(1, VOCABULARY_SIZE + 1)))
+
+
+class SyntheticWeb(object):
+    ''' A deterministic synthetic web for LocalCacheServer, generated on
+    request from the url so that any size fits in memory.
+
+    Every host has pages /page/<n> for n < pages_per_host, with text (see
+    _text), links to other pages of the host and links to other hosts. It
+    also has:
+      - traps: an endless /schedule/<day> chain and a /list?page=<n>&sort=<s>
+        listing whose pages barely differ, and a relative link that builds
+        ever deeper /page/<n>/more/more/... paths;
+      - duplicates: a mirror-<host> host serving the same pages;
+      - large pages: about large_share of the pages have 100 times more
+        text;
+      - a robots.txt disallowing the /private/<n> pages some pages link to,
+        and listing a sitemap index whose sitemap lists every page.
+    Every response has an ETag, and every later edition of the web changes
+    the text of about changed_share of the pages, for re-crawls. Unknown
+    urls are None, which the server answers with its 604 error. '''
+
+    def __init__(self, hosts=20, pages_per_host=100, seed=0, large_share=0.02,
+                 domain="ics.uci.edu", edition=0, changed_share=0.1):
+        self.hosts = [f"h{host}.{domain}" for host in range(hosts)]
+        self.host_set = set(self.hosts)
+        self.pages_per_host = pages_per_host
+        self.seed = seed
+        self.large_share = large_share
+        self.domain = domain
+        self.edition = edition
+        self.changed_share = changed_share
+
+    @property
+    def seed_urls(self):
+        return [f"https://{host}/page/0" for host in self.hosts[:4]]
+
+    def __contains__(self, url):
+        return self.get(url) is not None
+
+    def get(self, url, default=None):
+        page = self._page(url)
+        if page is None:
+            return default
+        content_type = "text/html; charset=utf-8"
+        if url.endswith(".txt"):
+            content_type = "text/plain"
+        elif url.endswith(".xml"):
+            content_type = "application/xml"
+        content = page.encode("utf-8")
+        return 200, content, {
+            "Content-Type": content_type, "ETag": f'"{zlib.crc32(content):08x}"'}
+
+    def _page(self, url):
+        scheme, _, rest = url.partition("://")
+        host, _, path = rest.partition("/")
+        if host.startswith("mirror-"):
+            host = host[len("mirror-"):]
+        if scheme != "https" or host not in self.host_set:
+            return None
+        path, _, query = path.partition("?")
+        parts = path.split("/")
+        rand = random.Random(zlib.crc32(f"{self.seed}/{host}/{path}".encode()))
+        if path == "robots.txt":
+            return (
+                f"User-agent: *\nDisallow: /private/\n\n"
+                f"Sitemap: https://{host}/sitemap.xml\n")
+        if path == "sitemap.xml":
+            return _sitemap("sitemapindex", "sitemap", [f"https://{host}/sitemap-pages.xml"])
+        if path == "sitemap-pages.xml":
+            return _sitemap("urlset", "url", [
+                f"https://{host}/page/{number}" for number in range(self.pages_per_host)])
+        if parts[0] == "private" and len(parts) == 2 and parts[1].isdigit():
+            return self._content_page(host, int(parts[1]), rand)
+        if parts[0] == "page" and len(parts) >= 2 and parts[1].isdigit():
+            if int(parts[1]) >= self.pages_per_host:
+                return None
+            if len(parts) > 2 and any(part != "more" for part in parts[2:]):
+                return None
+            return self._content_page(host, int(parts[1]), rand)
+        if parts == ["schedule", parts[-1]] and parts[-1].isdigit():
+            day = int(parts[1])
+            return _html(
+                f"Schedule for day {day}. " + _text(random.Random(self.seed), 300),
+                [f"/schedule/{day + 1}", f"/schedule/{day + 7}", "/page/0"])
+        if parts == ["list"]:
+            params = dict(part.partition("=")[::2] for part in query.split("&") if part)
+            number = int(params.get("page", "0")) if params.get("page", "0").isdigit() else 0
+            sort = params.get("sort", "name")
+            return _html(
+                f"Listing page {number} sorted by {sort}. " + _text(random.Random(self.seed + 1), 300),
+                [f"/list?page={number + 1}&sort={sort}"]
+                + [f"/list?page={number}&sort={other}" for other in ("name", "date", "size", "rank")])
+        return None
+
+    def _content_page(self, host, number, rand):
+        words = rand.randint(200, 1500)
+        if rand.random() < self.large_share:
+            words *= 100
+        links = [f"/page/{rand.randrange(self.pages_per_host)}" for _ in range(rand.randint(3, 15))]
+        links += [
+            f"https://{rand.choice(self.hosts)}/page/{rand.randrange(self.pages_per_host)}"
+            for _ in range(rand.randint(0, 3))]
+        if number % 10 == 0:
+            links += ["/schedule/0", "/list?page=0&sort=name", f"https://mirror-{host}/page/{number}"]
+        if number % 25 == 0:
+            links.append(f"{number}/more/")
+        if number % 10 == 5:
+            links.append(f"/private/{number}")
+        text = f"Page {number} of {host}. " + _text(rand, words)
+        revised = zlib.crc32(f"{self.edition}/{host}/{number}".encode()) % 1000
+        if self.edition and revised < 1000 * self.changed_share:
+            text += f" Revised for edition {self.edition}."
+        return _html(text, links)
+
+
+def _text(rand, words):
+    # Word frequencies follow Zipf's law, but every text ranks the
+    # vocabulary in its own order (a random arithmetic progression modulo
+    # the prime VOCABULARY_SIZE), so that the SimHashes of unrelated pages,
+    # dominated by their most frequent words, are far apart.
+    offset, stride = rand.randrange(VOCABULARY_SIZE), rand.randrange(1, VOCABULARY_SIZE)
+    ranks = rand.choices(range(VOCABULARY_SIZE), cum_weights=ZIPF_WEIGHTS, k=words)
+    return " ".join(VOCABULARY[(offset + rank * stride) % VOCABULARY_SIZE] for rank in ranks)
+
+
+def _html(text, links):
+    anchors = "".join(f'<a href="{link}">link</a> ' for link in links)
+    return (
+        f"<html><head><title>Synthetic page</title></head><body>"
+        f"<p>{text}</p>{anchors}</body></html>")
+
+
+def _sitemap(root, entry, locs):
+    entries = "".join(f"<{entry}><loc>{loc}</loc></{entry}>" for loc in locs)
+    return (
+        f'<?xml version="1.0" encoding="UTF-8"?>'
+        f'<{root} xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{entries}</{root}>')
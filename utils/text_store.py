@@ -0,0 +1,208 @@
+import os
+import mmap
+import time
+import zlib
+import struct
+
+from threading import Lock, local
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+MAGIC = b"PAGETEXT1\n"
+
+# codec, url length, compressed text length, crc32 of the compressed text
+RECORD_HEADER = struct.Struct("<BIII")
+
+RAW, ZLIB, ZSTD = 0, 1, 2
+
+# zstandard compressors are not thread safe, so every thread keeps its own.
+_codecs = local()
+
+
+def compress(text):
+    ''' Returns (codec, data) for text, using zstd when zstandard is installed
+    and zlib otherwise. '''
+    data = text.encode("utf-8", "surrogatepass")
+    if zstandard is not None:
+        if not hasattr(_codecs, "compressor"):
+            _codecs.compressor = zstandard.ZstdCompressor(level=3)
+        return ZSTD, _codecs.compressor.compress(data)
+    return ZLIB, zlib.compress(data, 6)
+
+
+def decompress(codec, data):
+    if codec == ZLIB:
+        data = zlib.decompress(data)
+    elif codec == ZSTD:
+        if zstandard is None:
+            raise ValueError("The page text store was written with zstd, install zstandard to read it.")
+        if not hasattr(_codecs, "decompressor"):
+            _codecs.decompressor = zstandard.ZstdDecompressor()
+        data = _codecs.decompressor.decompress(data)
+    elif codec != RAW:
+        raise ValueError(f"Unknown page text codec {codec}.")
+    return data.decode("utf-8", "surrogatepass")
+
+
+def scan_records(buffer, path):
+    ''' Indexes the records in buffer (the bytes of the store at path).
+    Returns {url: (offset, length, codec)} of each url's latest text, and
+    where the last whole record ends. '''
+    if buffer[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"{path} is not a page text store.")
+    index = dict()
+    offset = len(MAGIC)
+    end = len(buffer)
+    while offset + RECORD_HEADER.size <= end:
+        codec, url_length, length, crc = RECORD_HEADER.unpack_from(buffer, offset)
+        data_offset = offset + RECORD_HEADER.size + url_length
+        if (data_offset + length > end
+                or zlib.crc32(buffer[data_offset:data_offset + length]) != crc):
+            break
+        url = bytes(buffer[offset + RECORD_HEADER.size:data_offset]).decode("utf-8", "surrogatepass")
+        index[url] = (data_offset, length, codec)
+        offset = data_offset + length
+    return index, offset
+
+
+class TextStore(object):
+    ''' The store of each page's text, written by the scraper.
+
+    Every text is compressed into a record appended to a single data file,
+    and an index of where each url's record is kept in memory (rebuilt from
+    the record headers on open). Records are buffered and written out, then
+    fsynced, once buffer_size bytes are pending or flush_interval seconds
+    have passed. A torn record at the end of the file from a crash is cut
+    off on open. Storing a url again replaces its text.
+
+    Thread safe. Readers use TextReader. '''
+
+    def __init__(self, path, buffer_size=1 << 20, flush_interval=1.0):
+        self.path = path
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self.lock = Lock()
+        self.pending = list()
+        self.pending_bytes = 0
+
+        if os.path.exists(path) and os.path.getsize(path):
+            with open(path, "rb") as data_file, mmap.mmap(
+                    data_file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                self.index, self.size = scan_records(buffer, path)
+            self.data_file = open(path, "r+b")
+            # Cut off a torn record left by a crash.
+            self.data_file.truncate(self.size)
+            self.data_file.seek(self.size)
+        else:
+            self.index = dict()
+            self.data_file = open(path, "w+b")
+            self.data_file.write(MAGIC)
+            self.size = len(MAGIC)
+        self.last_flush = time.monotonic()
+
+    def __setitem__(self, url, text):
+        codec, data = compress(text)
+        url_bytes = url.encode("utf-8", "surrogatepass")
+        record = RECORD_HEADER.pack(codec, len(url_bytes), len(data), zlib.crc32(data))
+        with self.lock:
+            data_offset = self.size + self.pending_bytes + len(record) + len(url_bytes)
+            self.pending.extend((record, url_bytes, data))
+            self.pending_bytes += len(record) + len(url_bytes) + len(data)
+            self.index[url] = (data_offset, len(data), codec)
+            if (self.pending_bytes >= self.buffer_size
+                    or time.monotonic() - self.last_flush >= self.flush_interval):
+                self._flush()
+
+    def __getitem__(self, url):
+        with self.lock:
+            offset, length, codec = self.index[url]
+            if offset >= self.size:
+                self._flush()
+            self.data_file.seek(offset)
+            data = self.data_file.read(length)
+            self.data_file.seek(self.size)
+        return decompress(codec, data)
+
+    def __contains__(self, url):
+        return url in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def close(self):
+        with self.lock:
+            self._flush()
+            self.data_file.close()
+
+    def _flush(self):
+        if self.pending:
+            self.data_file.write(b"".join(self.pending))
+            self.data_file.flush()
+            os.fsync(self.data_file.fileno())
+            self.size += self.pending_bytes
+            self.pending.clear()
+            self.pending_bytes = 0
+        self.last_flush = time.monotonic()
+
+
+class TextReader(object):
+    ''' Reads a page text store through a memory map, for reporter.py and
+    longestPage.py. Behaves like a read only dict of url to text; items and
+    values stream the texts in the order they were stored, decompressing
+    one at a time. '''
+
+    def __init__(self, path):
+        self.path = path
+        if not os.path.getsize(path):
+            # Created by a crawl that has not flushed a page yet (empty
+            # files cannot be memory mapped).
+            self.buffer = None
+            self.index = dict()
+            return
+        with open(path, "rb") as data_file:
+            self.buffer = mmap.mmap(data_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.index, _ = scan_records(self.buffer, path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __getitem__(self, url):
+        offset, length, codec = self.index[url]
+        return decompress(codec, self.buffer[offset:offset + length])
+
+    def __contains__(self, url):
+        return url in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def keys(self):
+        return self.index.keys()
+
+    def items(self):
+        # In file order, so that the memory map is read front to back.
+        for url, (offset, length, codec) in sorted(
+                self.index.items(), key=lambda item: item[1][0]):
+            yield url, decompress(codec, self.buffer[offset:offset + length])
+
+    def values(self):
+        for _, text in self.items():
+            yield text
+
+    def close(self):
+        if self.buffer is not None:
+            self.buffer.close()